@@ -0,0 +1,99 @@
+"""
+测试EntropyScanner的吞吐量: 生成一个大文件(默认1GB)，用mmap单次遍历计算整个文件、
+各区间和固定窗口(互不重叠)的熵，输出和目标速度(1s/GB)的差距
+安装了numba时使用编译后的计数，否则使用numpy.bincount，都会输出numpy.bincount本身的速度
+
+python benchmarks/bench_entropy.py [size_mb]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 直接运行脚本时使用仓库中的xanalyzer，而不是已安装的旧版本
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy
+
+from xanalyzer import entropy
+from xanalyzer.config import Config
+from xanalyzer.entropy import EntropyScanner
+from xanalyzer.file_content import FileContent
+
+# 目标速度，每GB的秒数
+target_seconds_per_gb = 1.0
+
+
+def build_sample(sample_path, size):
+    """
+    随机数据和0交替，模拟压缩数据和空白区域
+    """
+    block = os.urandom(8 * 1024 * 1024) + b"\x00" * 8 * 1024 * 1024
+    with open(sample_path, "wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+        f.write(block[: size % len(block)])
+
+
+def scan(file_content):
+    # 模拟PE的几个节区
+    size = file_content.size
+    range_list = [
+        (".text", 0x400, size // 2),
+        (".data", size // 2, size // 4 * 3),
+        (".rsrc", size // 4 * 3, size),
+    ]
+    start = time.perf_counter()
+    result = EntropyScanner(file_content, range_list).run()
+    return time.perf_counter() - start, result
+
+
+def main():
+    size = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 1024 * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = Path(tmp_dir) / "big.bin"
+        build_sample(sample_path, size)
+        Config.mmap_threshold = 1
+        file_content = FileContent(sample_path)
+
+        # 预热，不把numba的编译时间算进去
+        scan(FileContent(data=os.urandom(4 * Config.entropy_window_size)))
+        cost, result = scan(file_content)
+        seconds_per_gb = cost / size * 1024 * 1024 * 1024
+        print(f"size: {size // 1024 // 1024}MB")
+        print(f"file entropy: {result['file']}, windows: {result['windows']['num']}")
+        print(f"cost: {cost:.2f}s, {size / cost / 1024 / 1024:.0f}MB/s")
+        print(
+            f"{seconds_per_gb:.2f}s/GB, target: {target_seconds_per_gb:.2f}s/GB, "
+            f"numba: {entropy.numba is not None}"
+        )
+        # 和目标的差距
+        gap = seconds_per_gb - target_seconds_per_gb
+        if gap > 0:
+            print(
+                f"TARGET NOT MET: {gap:.2f}s/GB over target, "
+                f"{seconds_per_gb / target_seconds_per_gb:.1f}x slower"
+            )
+        else:
+            print(
+                f"target met: {-gap:.2f}s/GB under target, "
+                f"{target_seconds_per_gb / seconds_per_gb:.1f}x faster"
+            )
+
+        # numpy.bincount本身的速度是EntropyScanner的上限
+        data_array = numpy.frombuffer(file_content.data, dtype=numpy.uint8)
+        start = time.perf_counter()
+        for offset in range(0, size, Config.entropy_window_size):
+            numpy.bincount(
+                data_array[offset : offset + Config.entropy_window_size],
+                minlength=256,
+            )
+        bincount_cost = time.perf_counter() - start
+        print(f"numpy.bincount only: {bincount_cost / size * 1024 ** 3:.2f}s/GB")
+        del data_array
+        file_content.data.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+对比逐个资源调用get_memory_mapped_image和按RVA直接读取资源的速度
+在HelloB_resource_pe.exe_后面加一个包含大量图标资源的节区，模拟资源很多的样本
+
+python benchmarks/bench_pe_resource.py [icon_num] [icon_size]
+pefile每层资源目录最多解析4096项，icon_num不要超过这个数
+"""
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 直接运行脚本时使用仓库中的xanalyzer，而不是已安装的旧版本
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pefile
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+
+test_data_path = Path(__file__).parent.parent / "tests" / "test_data"
+
+
+def align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def build_resource_directory(section_rva, icon_list):
+    """
+    生成只有RT_ICON一种类型的资源目录，每个图标一个语言
+    """
+    icon_num = len(icon_list)
+    type_dir_offset = 16 + 8
+    lang_dirs_offset = type_dir_offset + 16 + icon_num * 8
+    data_entries_offset = lang_dirs_offset + icon_num * (16 + 8)
+    data_offset = data_entries_offset + icon_num * 16
+
+    directory = bytearray()
+    # 根目录 -> RT_ICON
+    directory += struct.pack("<IIHHHH", 0, 0, 0, 0, 0, 1)
+    directory += struct.pack("<II", 3, 0x80000000 | type_dir_offset)
+    # RT_ICON -> 每个图标
+    directory += struct.pack("<IIHHHH", 0, 0, 0, 0, 0, icon_num)
+    for i in range(icon_num):
+        lang_dir_offset = lang_dirs_offset + i * (16 + 8)
+        directory += struct.pack("<II", i + 1, 0x80000000 | lang_dir_offset)
+    # 语言 -> 数据
+    for i in range(icon_num):
+        directory += struct.pack("<IIHHHH", 0, 0, 0, 0, 0, 1)
+        directory += struct.pack("<II", 1033, data_entries_offset + i * 16)
+    blob = bytearray()
+    for icon in icon_list:
+        directory += struct.pack(
+            "<IIII", section_rva + data_offset + len(blob), len(icon), 0, 0
+        )
+        blob += icon + b"\x00" * (align(len(icon), 8) - len(icon))
+    return bytes(directory + blob)
+
+
+def build_sample(sample_path, icon_num, icon_size):
+    pe = pefile.PE(test_data_path / "HelloB_resource_pe.exe_")
+    file_alignment = pe.OPTIONAL_HEADER.FileAlignment
+    section_alignment = pe.OPTIONAL_HEADER.SectionAlignment
+    last_section = pe.sections[-1]
+    section_rva = align(
+        last_section.VirtualAddress + last_section.Misc_VirtualSize, section_alignment
+    )
+    section_offset = align(len(pe.__data__), file_alignment)
+
+    icon_list = [
+        b"\x28\x00\x00\x00" + i.to_bytes(4, "little") + b"\x00" * (icon_size - 8)
+        for i in range(icon_num)
+    ]
+    section_data = build_resource_directory(section_rva, icon_list)
+    raw_size = align(len(section_data), file_alignment)
+
+    section_header_offset = last_section.get_file_offset() + 40
+    section_header = struct.pack(
+        "<8sIIIIIIHHI",
+        b".rsrc2",
+        len(section_data),
+        section_rva,
+        raw_size,
+        section_offset,
+        0,
+        0,
+        0,
+        0,
+        0x40000040,
+    )
+    pe.set_bytes_at_offset(section_header_offset, section_header)
+    pe.FILE_HEADER.NumberOfSections += 1
+    pe.OPTIONAL_HEADER.SizeOfImage = align(
+        section_rva + len(section_data), section_alignment
+    )
+    resource_index = pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_RESOURCE"]
+    resource_entry = pe.OPTIONAL_HEADER.DATA_DIRECTORY[resource_index]
+    resource_entry.VirtualAddress = section_rva
+    resource_entry.Size = len(section_data)
+
+    data = pe.write()
+    data += b"\x00" * (section_offset - len(data))
+    data += section_data + b"\x00" * (raw_size - len(section_data))
+    with open(sample_path, "wb") as f:
+        f.write(data)
+
+
+def get_resource_type_dict_by_image(pe_analyzer):
+    """
+    原来的实现: 每个资源都调用一次get_memory_mapped_image，整个资源交给libmagic
+    """
+    resource_type_dict = {}
+    pe_file = pe_analyzer.pe_file
+    pe_analyzer.parse_directory("resource")
+    for resource_entry in pe_file.DIRECTORY_ENTRY_RESOURCE.entries:
+        for d_entry in resource_entry.directory.entries:
+            for dd_entry in d_entry.directory.entries:
+                key = f"{resource_entry.id}_{d_entry.id}_{dd_entry.id}"
+                data_rva = dd_entry.data.struct.OffsetToData
+                size = dd_entry.data.struct.Size
+                data = pe_file.get_memory_mapped_image()[data_rva : data_rva + size]
+                (
+                    data_type,
+                    possible_extension_names,
+                ) = pe_analyzer.file_analyzer.guess_type_and_ext(data)
+                if data_type == "data" and not possible_extension_names:
+                    data_type = "icon"
+                    possible_extension_names = [".ico"]
+                resource_type_dict[key] = [data_type, possible_extension_names]
+    return resource_type_dict
+
+
+def main():
+    icon_num = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    icon_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16 * 1024
+    Config.init(False)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = Path(tmp_dir) / "many_icons.exe_"
+        build_sample(sample_path, icon_num, icon_size)
+        file_analyzer = FileAnalyzer(sample_path)
+        print(f"sample: {icon_num} icons, {file_analyzer.file_size} bytes")
+
+        pe_analyzer = PeAnalyzer(file_analyzer)
+        start = time.perf_counter()
+        image_result = get_resource_type_dict_by_image(pe_analyzer)
+        image_cost = time.perf_counter() - start
+
+        pe_analyzer = PeAnalyzer(file_analyzer)
+        start = time.perf_counter()
+        rva_result = pe_analyzer.get_resource_type_dict()
+        rva_cost = time.perf_counter() - start
+        del pe_analyzer
+
+    same = rva_result == image_result
+    print(f"get_memory_mapped_image: {image_cost * 1000:10.2f}ms")
+    print(f"read by rva:             {rva_cost * 1000:10.2f}ms")
+    print(f"speedup: {image_cost / rva_cost:.1f}x, same result: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+对比PeidSignatures索引和peutils.SignatureDatabase的加载和入口点匹配速度
+
+python benchmarks/bench_peid.py
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 直接运行脚本时使用仓库中的xanalyzer，而不是已安装的旧版本
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pefile
+import peutils
+
+from xanalyzer.config import Config
+from xanalyzer.peid import PeidSignatures
+
+test_data_path = Path(__file__).parent.parent / "tests" / "test_data"
+
+
+def main():
+    start = time.perf_counter()
+    signature_database = peutils.SignatureDatabase(Config.peid_signature_path)
+    peutils_load_cost = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        Config.peid_cache_dir = Path(tmp_dir)
+        start = time.perf_counter()
+        PeidSignatures.load(Config.peid_signature_path)
+        index_build_cost = time.perf_counter() - start
+        start = time.perf_counter()
+        peid_signatures = PeidSignatures.load(Config.peid_signature_path)
+        index_load_cost = time.perf_counter() - start
+
+    print(f"peutils parse:      {peutils_load_cost * 1000:8.2f}ms")
+    print(f"index build:        {index_build_cost * 1000:8.2f}ms")
+    print(f"index cached load:  {index_load_cost * 1000:8.2f}ms")
+
+    total_peutils_cost = 0
+    total_index_cost = 0
+    for file_path in sorted(test_data_path.iterdir()):
+        try:
+            pe = pefile.PE(data=open(file_path, "rb").read())
+        except pefile.PEFormatError:
+            continue
+        start = time.perf_counter()
+        peutils_matches = signature_database.match(pe, ep_only=True)
+        peutils_cost = time.perf_counter() - start
+        start = time.perf_counter()
+        index_matches = peid_signatures.match(pe, ep_only=True)
+        index_cost = time.perf_counter() - start
+        total_peutils_cost += peutils_cost
+        total_index_cost += index_cost
+        same_flag = "same" if peutils_matches == index_matches else "DIFF"
+        print(
+            f"{file_path.name[:40]:<40} peutils {peutils_cost * 1000:8.3f}ms"
+            f" index {index_cost * 1000:8.3f}ms {same_flag} {index_matches}"
+        )
+    print(
+        f"ep match total: peutils {total_peutils_cost * 1000:.2f}ms"
+        f" index {total_index_cost * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+对比单次扫描(StrScanner)和原来四次findall提取字符串的速度
+
+python benchmarks/bench_str_scan.py [synthetic_size_mb]
+"""
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# 直接运行脚本时使用仓库中的xanalyzer，而不是已安装的旧版本
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from xanalyzer.file_content import FileContent
+from xanalyzer.str_scanner import StrScanner
+
+test_data_path = Path(__file__).parent.parent / "tests" / "test_data"
+
+
+def findall_strs(file_content, minstrlen=4):
+    minstrlen_bytes = str(minstrlen).encode()
+    result = []
+    result.extend(re.findall(rb"[\x20-\x7e]{" + minstrlen_bytes + rb",}", file_content))
+    result.extend(
+        re.findall(rb"(?:[\x20-\x7e]\x00){" + minstrlen_bytes + rb",}", file_content)
+    )
+    for base64_re, hex_re in [
+        (rb"[A-Za-z0-9+/]{6,}={1,2}", rb"(?:[A-Fa-f0-9]{2}){4,}"),
+        (
+            rb"(?:[A-Za-z0-9+/]\x00){6,}(?:=\x00){1,2}",
+            rb"(?:(?:[A-Fa-f0-9]\x00){2}){4,}",
+        ),
+    ]:
+        for a_str in re.findall(base64_re, file_content):
+            if not re.match(hex_re, a_str):
+                result.append(a_str)
+        result.extend(re.findall(hex_re, file_content))
+    return result
+
+
+def scanner_strs(file_content, minstrlen=4):
+    return list(StrScanner(minstrlen).scan(file_content))
+
+
+def gen_synthetic_data(size):
+    """
+    随机二进制数据中穿插ASCII、宽字符、base64和hex字符串，近似真实PE的分布
+    """
+    rand = random.Random(0)
+    parts = []
+    cur_size = 0
+    while cur_size < size:
+        part = rand.randbytes(rand.randint(16, 512))
+        kind = rand.randint(0, 3)
+        word = "".join(rand.choice("abcdefghijklmnopqrstuvwxyz ._") for _ in range(rand.randint(4, 40)))
+        if kind == 0:
+            part += word.encode()
+        elif kind == 1:
+            part += word.encode("utf_16_le")
+        elif kind == 2:
+            part += b"aGVsbG8gd29ybGQ="
+        else:
+            part += rand.randbytes(16).hex().encode()
+        parts.append(part)
+        cur_size += len(part)
+    return b"".join(parts)[:size]
+
+
+def bench(name, data):
+    file_content = FileContent(data=data)
+    start = time.perf_counter()
+    findall_num = len(findall_strs(data))
+    findall_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    scanner_num = len(scanner_strs(file_content))
+    scanner_cost = time.perf_counter() - start
+    size_mb = len(data) / 1024 / 1024
+    print(
+        f"{name[:40]:<40} {size_mb:>8.2f}MB"
+        f" findall {size_mb / findall_cost:>8.1f}MB/s ({findall_num})"
+        f" scanner {size_mb / scanner_cost:>8.1f}MB/s ({scanner_num})"
+        f" x{findall_cost / scanner_cost:.2f}"
+    )
+    return findall_cost, scanner_cost
+
+
+def main():
+    synthetic_size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    total_findall_cost = 0
+    total_scanner_cost = 0
+    for file_path in sorted(test_data_path.iterdir()):
+        with open(file_path, "rb") as f:
+            data = f.read()
+        if not data:
+            continue
+        findall_cost, scanner_cost = bench(file_path.name, data)
+        total_findall_cost += findall_cost
+        total_scanner_cost += scanner_cost
+    print(f"tests/test_data total: x{total_findall_cost / total_scanner_cost:.2f}")
+
+    bench(
+        f"synthetic {synthetic_size_mb}MB",
+        gen_synthetic_data(synthetic_size_mb * 1024 * 1024),
+    )
+
+
+if __name__ == "__main__":
+    main()
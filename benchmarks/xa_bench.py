@@ -0,0 +1,342 @@
+"""
+分析热点路径的基准测试: 类型识别、四种字符串提取、hash、PeAnalyzer.run、ElfAnalyzer.run、
+yara/PEiD匹配和整个目录的端到端分析(包括--triage)
+样本使用tests/test_data，以及生成的大PE(扩大最后一个节区)、大ELF(在节区头表前插入数据)和混合数据
+
+每项重复多次取最短耗时，可以保存为基准，之后和基准对比，变慢超过阈值时返回1
+基准和机器相关，换机器后需要重新保存
+
+python benchmarks/xa_bench.py [--size-mb 16] [--repeat 3] [--filter NAME]
+                              [--save-baseline [PATH]] [--baseline [PATH]] [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 直接运行脚本时使用仓库中的xanalyzer，而不是已安装的旧版本
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pefile
+
+from xanalyzer.batch import run_inline
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_process.elf import ElfAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+from xanalyzer.magic_detector import MagicDetector
+from xanalyzer.utils import log
+
+test_data_path = Path(__file__).parent.parent / "tests" / "test_data"
+default_baseline_path = Path(__file__).parent / "xa_bench_baseline.json"
+
+pe_sample_names = [
+    "Hello32.exe_",
+    "Hello64.dll_",
+    "HelloB_resource_pe.exe_",
+    "HelloCSharp.exe_append_data_",
+    "Hello_upx.exe_",
+    "Inno_mysetup.exe_",
+    "nsis_example1.exe_",
+    "pyinstaller_pack.exe_",
+    "java.exe_",
+]
+elf_sample_names = [
+    "hello32_elf",
+    "hello32_elf_append_data_",
+    "hello64_elf",
+    "hello64_elf_shc_",
+    "hello64_elf_static_upx_",
+]
+
+
+def build_blob(size):
+    """
+    随机数据、ascii字符串、宽字符串和url/base64等特殊字符串混合
+    """
+    the_random = random.Random(0)
+    words = [
+        b"http://www.example.com/index.html",
+        b"192.168.100.200",
+        b"SGVsbG8gV29ybGQhIQ==",
+        b"kernel32.dll",
+        b"GetProcAddress",
+        b"C:\\Windows\\System32\\cmd.exe",
+    ]
+    part_list = []
+    part_size = 0
+    random_block = the_random.randbytes(4096)
+    while part_size < size:
+        word = the_random.choice(words)
+        part_list.append(random_block[: the_random.randrange(64, 4096)])
+        part_list.append(word)
+        part_list.append(word.decode().encode("utf-16-le"))
+        part_list.append(b"\x00" * the_random.randrange(0, 512))
+        part_size += sum(len(part) for part in part_list[-4:])
+    return b"".join(part_list)[:size]
+
+
+def build_pe(pe_path, blob):
+    """
+    把blob加到最后一个节区中，文件整体仍是PE，没有附加数据
+    """
+    pe = pefile.PE(test_data_path / "Hello64.exe_")
+    file_alignment = pe.OPTIONAL_HEADER.FileAlignment
+    section_alignment = pe.OPTIONAL_HEADER.SectionAlignment
+    extra_size = len(blob) // file_alignment * file_alignment
+    last_section = pe.sections[-1]
+    last_section.SizeOfRawData += extra_size
+    last_section.Misc_VirtualSize = last_section.SizeOfRawData
+    image_end = last_section.VirtualAddress + last_section.Misc_VirtualSize
+    pe.OPTIONAL_HEADER.SizeOfImage = (
+        (image_end + section_alignment - 1) // section_alignment * section_alignment
+    )
+    pe_data = pe.write()
+    section_end = last_section.PointerToRawData + (
+        last_section.SizeOfRawData - extra_size
+    )
+    pe_path.write_bytes(
+        pe_data[:section_end] + blob[:extra_size] + pe_data[section_end:]
+    )
+    pe.close()
+
+
+def build_elf(elf_path, blob):
+    """
+    在节区头表前插入blob，修改e_shoff，ELF大小和文件大小一致
+    """
+    elf_data = (test_data_path / "hello64_elf").read_bytes()
+    sh_offset = struct.unpack_from("<Q", elf_data, 0x28)[0]
+    elf_data = bytearray(elf_data[:sh_offset] + blob + elf_data[sh_offset:])
+    struct.pack_into("<Q", elf_data, 0x28, sh_offset + len(blob))
+    elf_path.write_bytes(elf_data)
+
+
+class Benchmark:
+    def __init__(self, repeat, name_filter=None):
+        self.repeat = repeat
+        self.name_filter = name_filter
+        # name -> {"seconds": 最短耗时, "bytes": 每次处理的字节数}
+        self.results = {}
+
+    def measure(self, name, func, bytes_num, setup=None):
+        if self.name_filter and self.name_filter not in name:
+            return
+        cost_list = []
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            cost_list.append(time.perf_counter() - start)
+        seconds = min(cost_list)
+        self.results[name] = {"seconds": round(seconds, 6), "bytes": bytes_num}
+        print(
+            f"{name:<36}{seconds * 1000:>12.2f}ms"
+            f"{bytes_num / seconds / 1024 / 1024:>12.1f}MB/s"
+        )
+
+
+def file_size_sum(path_list):
+    return sum(os.path.getsize(path) for path in path_list)
+
+
+def bench_file_type(benchmark, path_list, suffix):
+    file_analyzer_list = [FileAnalyzer(path) for path in path_list]
+
+    def guess_all():
+        for file_analyzer in file_analyzer_list:
+            file_analyzer.guess_type_and_ext(file_analyzer.file_content.data)
+
+    # 每次清空识别结果缓存，测量libmagic本身
+    benchmark.measure(
+        f"guess_type_and_ext[{suffix}]",
+        guess_all,
+        file_size_sum(path_list),
+        MagicDetector.cache.clear,
+    )
+
+
+def bench_strs(benchmark, path_list, suffix):
+    file_analyzer_list = [FileAnalyzer(path) for path in path_list]
+
+    def clear_all_strs():
+        for file_analyzer in file_analyzer_list:
+            file_analyzer.all_strs = None
+
+    # get_strs等共用get_all_strs的一次扫描，每次清空结果，测量扫描本身
+    benchmark.measure(
+        f"get_all_strs[{suffix}]",
+        lambda: [file_analyzer.get_all_strs() for file_analyzer in file_analyzer_list],
+        file_size_sum(path_list),
+        clear_all_strs,
+    )
+
+
+def bench_hash(benchmark, path_list, suffix):
+    file_analyzer_list = [FileAnalyzer(path) for path in path_list]
+    benchmark.measure(
+        f"get_md5_sha256[{suffix}]",
+        lambda: [file_analyzer.get_md5_sha256() for file_analyzer in file_analyzer_list],
+        file_size_sum(path_list),
+    )
+
+
+def bench_analyzer(benchmark, analyzer_class, path_list, suffix):
+    def run_all():
+        for path in path_list:
+            analyzer_class(FileAnalyzer(path)).run()
+
+    benchmark.measure(
+        f"{analyzer_class.__name__}.run[{suffix}]", run_all, file_size_sum(path_list)
+    )
+
+
+def bench_signatures(benchmark, path_list, suffix, section_flag=True):
+    """
+    :param section_flag: 是否测试--deep时在节区中查找非入口点特征，它逐字节匹配，大文件很慢
+    """
+    file_analyzer_list = [FileAnalyzer(path) for path in path_list]
+    pe_analyzer_list = [
+        PeAnalyzer(file_analyzer) for file_analyzer in file_analyzer_list
+    ]
+    size_sum = file_size_sum(path_list)
+    benchmark.measure(
+        f"packer_yara_match[{suffix}]",
+        lambda: [
+            file_analyzer.packer_yara_match() for file_analyzer in file_analyzer_list
+        ],
+        size_sum,
+    )
+    benchmark.measure(
+        f"peid_match_ep[{suffix}]",
+        lambda: [
+            pe_analyzer.peid_signatures.match(pe_analyzer.pe_file, ep_only=True)
+            for pe_analyzer in pe_analyzer_list
+        ],
+        size_sum,
+    )
+    if not section_flag:
+        return
+    benchmark.measure(
+        f"peid_match_sections[{suffix}]",
+        lambda: [
+            pe_analyzer.peid_signatures.match(pe_analyzer.pe_file, ep_only=False)
+            for pe_analyzer in pe_analyzer_list
+        ],
+        size_sum,
+    )
+
+
+def bench_folder(benchmark, folder_path):
+    path_list = sorted(str(path) for path in Path(folder_path).iterdir())
+    benchmark.measure(
+        "run_inline[test_data]",
+        lambda: run_inline(path_list, 4),
+        file_size_sum(path_list),
+    )
+    Config.init(False, triage_flag=True)
+    benchmark.measure(
+        "run_inline_triage[test_data]",
+        lambda: run_inline(path_list, 4),
+        file_size_sum(path_list),
+    )
+    Config.init(False)
+
+
+def compare_baseline(results, baseline, threshold):
+    """
+    :return: 变慢超过阈值的项
+    """
+    slow_name_list = []
+    print(f"\n{'name':<36}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        baseline_seconds = baseline[name]["seconds"]
+        ratio = result["seconds"] / baseline_seconds if baseline_seconds else 1.0
+        flag = ""
+        if ratio > threshold:
+            slow_name_list.append(name)
+            flag = "  SLOWER"
+        print(
+            f"{name:<36}{baseline_seconds * 1000:>10.2f}ms"
+            f"{result['seconds'] * 1000:>10.2f}ms{ratio:>8.2f}{flag}"
+        )
+    return slow_name_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the analysis hot paths")
+    parser.add_argument("--size-mb", type=int, default=16, help="size of the synthetic pe/elf/blob")
+    parser.add_argument("--repeat", type=int, default=3, help="repeat each case, the minimum time is used")
+    parser.add_argument("--filter", help="only run the cases whose name contains FILTER")
+    parser.add_argument("--save-baseline", nargs="?", const=str(default_baseline_path), metavar="PATH", help="save the results as the baseline")
+    parser.add_argument("--baseline", nargs="?", const=str(default_baseline_path), metavar="PATH", help="compare the results with the baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slower than baseline * THRESHOLD is a regression")
+    args = parser.parse_args()
+
+    Config.init(False)
+    # 只测量分析本身，不输出日志
+    log.disabled = True
+    benchmark = Benchmark(args.repeat, args.filter)
+
+    pe_path_list = [test_data_path / name for name in pe_sample_names]
+    elf_path_list = [test_data_path / name for name in elf_sample_names]
+    all_path_list = sorted(test_data_path.iterdir())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        blob = build_blob(args.size_mb * 1024 * 1024)
+        blob_path = Path(tmp_dir) / "big.bin"
+        blob_path.write_bytes(blob)
+        big_pe_path = Path(tmp_dir) / "big.exe"
+        build_pe(big_pe_path, blob)
+        big_elf_path = Path(tmp_dir) / "big_elf"
+        build_elf(big_elf_path, blob)
+        del blob
+
+        bench_file_type(benchmark, all_path_list, "test_data")
+        bench_file_type(benchmark, [big_pe_path, big_elf_path, blob_path], "big")
+        bench_strs(benchmark, all_path_list, "test_data")
+        bench_strs(benchmark, [blob_path], "big")
+        bench_hash(benchmark, all_path_list, "test_data")
+        bench_hash(benchmark, [blob_path], "big")
+        bench_analyzer(benchmark, PeAnalyzer, pe_path_list, "test_data")
+        bench_analyzer(benchmark, PeAnalyzer, [big_pe_path], "big")
+        bench_analyzer(benchmark, ElfAnalyzer, elf_path_list, "test_data")
+        bench_analyzer(benchmark, ElfAnalyzer, [big_elf_path], "big")
+        bench_signatures(benchmark, pe_path_list, "test_data")
+        bench_signatures(benchmark, [big_pe_path], "big", section_flag=False)
+        bench_folder(benchmark, test_data_path)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf8") as f:
+            json.dump(
+                {"size_mb": args.size_mb, "results": benchmark.results}, f, indent=2
+            )
+            f.write("\n")
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf8") as f:
+            baseline = json.load(f)
+        if baseline["size_mb"] != args.size_mb:
+            print(f"baseline size is {baseline['size_mb']}MB, big cases are skipped")
+            baseline["results"] = {
+                name: result
+                for name, result in baseline["results"].items()
+                if not name.endswith("[big]")
+            }
+        slow_name_list = compare_baseline(
+            benchmark.results, baseline["results"], args.threshold
+        )
+        if slow_name_list:
+            print(f"regressions: {slow_name_list}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import pytest
+
+from xanalyzer.config import Config
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_dir(tmp_path_factory):
+    """
+    测试时的缓存保存在临时目录，不写入用户目录
+    """
+    Config.set_cache_dir(tmp_path_factory.mktemp("xanalyzer_cache"))
@@ -0,0 +1,126 @@
+import logging
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from signify.authenticode.signed_pe import SignedPEFile
+from signify.exceptions import CertificateVerificationError
+from signify.x509.context import VerificationContext
+
+from xanalyzer import authenticode
+from xanalyzer.authenticode import CachedVerificationContext
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def get_signed_data():
+    with open(cur_dir_path / "test_data" / "java.exe_", "rb") as f:
+        return list(SignedPEFile(f).signed_datas)[0]
+
+
+def test_chain_cache(monkeypatch):
+    signed_data = get_signed_data()
+    certificate = signed_data.certificates[0]
+    verify_call_list = []
+
+    def fake_verify(self, certificate):
+        verify_call_list.append(self.timestamp)
+        if self.timestamp > certificate.valid_to:
+            raise CertificateVerificationError("expired")
+        return [certificate]
+
+    monkeypatch.setattr(VerificationContext, "verify", fake_verify)
+    CachedVerificationContext.chain_cache.clear()
+    CachedVerificationContext.error_cache.clear()
+    for days in [1, 2, 3]:
+        context = CachedVerificationContext(signed_data.certificates)
+        context.timestamp = certificate.valid_from + timedelta(days=days)
+        assert context.verify(certificate) == [certificate]
+    assert len(verify_call_list) == 1
+
+    # 时间戳超出缓存的链的有效期时重新验证，失败结果也缓存
+    for _ in range(2):
+        context = CachedVerificationContext(signed_data.certificates)
+        context.timestamp = certificate.valid_to + timedelta(days=1)
+        try:
+            context.verify(certificate)
+            assert False
+        except CertificateVerificationError:
+            pass
+    assert len(verify_call_list) == 2
+
+
+def test_cert_scan_in_background():
+    Config.init(False)
+    pe_path = cur_dir_path / "test_data" / "java.exe_"
+    cert_info_list = PeAnalyzer(FileAnalyzer(pe_path)).verify_cert()
+    pe_analyzer = PeAnalyzer(FileAnalyzer(pe_path))
+    result = pe_analyzer.run()
+    assert pe_analyzer.cert_future.done()
+    assert len(result["certificates"]) == len(cert_info_list) == 1
+    for key in ["subject", "issuer", "serial_number", "valid_to"]:
+        assert result["certificates"][0][key] == str(cert_info_list[0][key])
+
+
+def test_cert_stage_deferred(monkeypatch, caplog):
+    Config.init(False)
+    pe_path = cur_dir_path / "test_data" / "java.exe_"
+    caplog.set_level("INFO", logger="xanalyzer")
+    # 同步验证时的日志顺序
+    monkeypatch.setattr(PeAnalyzer, "submit_verify_cert", lambda self: None)
+    expect_result = PeAnalyzer(FileAnalyzer(pe_path)).run()
+    expect_messages = [record.getMessage() for record in caplog.records]
+    monkeypatch.undo()
+    caplog.clear()
+
+    # 签名验证在最后一项扫描执行完之后才完成
+    resource_done = threading.Event()
+    get_cert_info_list = PeAnalyzer.get_cert_info_list
+    run_scan = PeAnalyzer.run_scan
+    stage_name_list = []
+
+    def slow_get_cert_info_list(self):
+        resource_done.wait(10)
+        return get_cert_info_list(self)
+
+    def record_run_scan(self, stage_name, scan):
+        stage_name_list.append(stage_name)
+        run_scan(self, stage_name, scan)
+        if stage_name == "pe.resource":
+            resource_done.set()
+
+    monkeypatch.setattr(PeAnalyzer, "get_cert_info_list", slow_get_cert_info_list)
+    monkeypatch.setattr(PeAnalyzer, "run_scan", record_run_scan)
+    result = PeAnalyzer(FileAnalyzer(pe_path)).run()
+    assert stage_name_list[-2:] == ["pe.resource", "pe.cert"]
+    assert result["certificates"] == expect_result["certificates"]
+    assert [record.getMessage() for record in caplog.records] == expect_messages
+
+
+def test_load_trusted_certificates_error(monkeypatch, caplog):
+    class BrokenStore(list):
+        def __len__(self):
+            raise ValueError("bad certificate")
+
+    Config.init(False)
+    monkeypatch.setattr(authenticode, "TRUSTED_CERTIFICATE_STORE", BrokenStore())
+    # 重新创建线程池时会再次加载可信证书
+    monkeypatch.setattr(PeAnalyzer, "cert_executor", None)
+    caplog.set_level("INFO", logger="xanalyzer")
+    pe_path = cur_dir_path / "test_data" / "java.exe_"
+    pe_analyzer = PeAnalyzer(FileAnalyzer(pe_path))
+    try:
+        result = pe_analyzer.run()
+    finally:
+        PeAnalyzer.cert_executor.shutdown()
+    assert (
+        "xanalyzer",
+        logging.WARNING,
+        "failed to load some trusted certificates: bad certificate",
+    ) in caplog.record_tuples
+    # 部分证书解析失败不影响PE分析
+    assert len(result["certificates"]) == 1
+    assert result["certificates"][0]["verify_result"]
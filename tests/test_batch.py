@@ -0,0 +1,70 @@
+import json
+import os
+from pathlib import Path
+
+from xanalyzer import batch
+from xanalyzer.batch import run_batch
+from xanalyzer.config import Config
+from xanalyzer.output import ResultWriter
+
+cur_dir_path = Path(__file__).parent
+original_analyze_file = batch.analyze_file
+
+
+def crash_analyze_file(file_path, *args):
+    """
+    模拟子进程崩溃: 分析名称中有crash的样本时直接退出进程
+    """
+    if Path(file_path).name == "crash.txt":
+        os._exit(1)
+    return original_analyze_file(file_path, *args)
+
+
+def test_batch_order(caplog):
+    Config.init(False)
+    file_path_list = [
+        str(cur_dir_path / "test_data" / filename)
+        for filename in ["Hello_upx.exe_", "not_exist_file", "hello64_elf", "str.txt"]
+    ]
+    caplog.set_level("INFO", logger="xanalyzer")
+    run_batch(file_path_list, 4, 2)
+
+    processing_list = [
+        record.getMessage()[len("processing ") :]
+        for record in caplog.records
+        if record.getMessage().startswith("processing ")
+    ]
+    assert processing_list == file_path_list
+    messages = [record.getMessage() for record in caplog.records]
+    assert "packer: ['UPX 3.96']" in messages
+    assert any(
+        message.startswith("error while processing") and "not_exist_file" in message
+        for message in messages
+    )
+
+
+def test_batch_worker_crash(tmp_path, monkeypatch, caplog):
+    Config.init(False)
+    # 子进程通过fork继承替换后的analyze_file
+    monkeypatch.setattr(batch, "analyze_file", crash_analyze_file)
+    file_path_list = []
+    for filename in ["a.txt", "b.txt", "crash.txt", "c.txt", "d.txt", "e.txt"]:
+        file_path = tmp_path / filename
+        file_path.write_text(f"hello {filename}")
+        file_path_list.append(str(file_path))
+    output_path = tmp_path / "result.jsonl"
+    result_writer = ResultWriter(str(output_path), "jsonl")
+    caplog.set_level("INFO", logger="xanalyzer")
+    run_batch(file_path_list, 4, 2, result_writer)
+    result_writer.close()
+
+    result_list = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert [result["file_path"] for result in result_list] == file_path_list
+    for file_path, result in zip(file_path_list, result_list):
+        if file_path == file_path_list[2]:
+            assert result["error"] == "worker crashed"
+        else:
+            assert "error" not in result
+            assert result["md5"]
+    messages = [record.getMessage() for record in caplog.records]
+    assert f"worker crashed while processing {file_path_list[2]}" in messages
@@ -0,0 +1,50 @@
+import time
+from pathlib import Path
+
+from xanalyzer.cache import ResultCache
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_result_cache(caplog, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "cache_path", tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(FileAnalyzer, "result_cache", None)
+    Config.init(False, True)
+    caplog.set_level("INFO", logger="xanalyzer")
+    pe_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+    try:
+        FileAnalyzer(pe_path).run()
+        first_messages = [record.getMessage() for record in caplog.records]
+        caplog.clear()
+
+        file_analyzer = FileAnalyzer(pe_path)
+        file_analyzer.run()
+        second_messages = [record.getMessage() for record in caplog.records]
+    finally:
+        FileAnalyzer.result_cache.close()
+        Config.init(False)
+
+    assert "result from cache" in second_messages
+    second_messages.remove("result from cache")
+    assert second_messages == first_messages
+    assert "packer: ['UPX 3.96']" in second_messages
+    assert file_analyzer.packer_list == ["UPX 3.96"]
+
+
+def test_result_cache_evict(tmp_path):
+    result_cache = ResultCache(tmp_path / "cache.sqlite3")
+    for i in range(10):
+        result_cache.put(f"key{i}", {"logs": ["x" * 100]})
+    result_cache.conn.execute(
+        "UPDATE results SET accessed = ? WHERE key = 'key0'", (time.time() - 3600,)
+    )
+    result_cache.evict(max_size=1024 * 1024, max_age=60)
+    assert result_cache.get("key0") is None
+    assert result_cache.get("key1")
+
+    result_cache.evict(max_size=300, max_age=60)
+    remain_num = result_cache.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    assert remain_num == 2
+    result_cache.close()
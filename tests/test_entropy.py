@@ -0,0 +1,86 @@
+import os
+from pathlib import Path
+
+from xanalyzer.config import Config
+import numpy
+
+from xanalyzer.entropy import (
+    ByteHistogram,
+    EntropyScanner,
+    count_windows,
+    count_windows_bincount,
+    count_windows_loop,
+)
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_content import FileContent
+from xanalyzer.file_process.pe import PeAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def scan_entropy(data):
+    file_content = FileContent(data=data)
+    range_list = [("head", 0, 100), ("tail", 4096, len(data) + 100)]
+    return EntropyScanner(file_content, range_list, window_size=1024).run()
+
+
+def test_entropy_scanner(monkeypatch):
+    histogram = ByteHistogram()
+    assert histogram.entropy() == 0.0
+    histogram.update(bytes(range(256)) * 4)
+    assert histogram.entropy() == 8.0
+
+    data = b"\x00" * 4096 + os.urandom(4096) + bytes(range(256)) * 8
+    result = scan_entropy(data)
+    assert [range_result["size"] for range_result in result["ranges"]] == [
+        100,
+        len(data) - 4096,
+    ]
+    assert result["ranges"][0]["entropy"] == 0.0
+    assert result["windows"]["num"] == 10
+    assert result["windows"]["min"] == 0.0
+    assert result["windows"]["max"] == 8.0
+    assert result["windows"]["high_entropy_num"] == 6
+
+    # 区间跨多块、窗口和区间不对齐时，结果和直接统计整个区间相同
+    monkeypatch.setattr(Config, "stream_chunk_size", 3 * 1024)
+    for range_result, (start, end) in zip(
+        scan_entropy(data)["ranges"], [(0, 100), (4096, len(data))]
+    ):
+        histogram = ByteHistogram()
+        histogram.update(data[start:end])
+        assert range_result["entropy"] == round(histogram.entropy(), 4)
+    assert scan_entropy(b"")["windows"] == {
+        "size": 1024,
+        "num": 0,
+        "max": 0.0,
+        "min": 0.0,
+        "high_entropy_num": 0,
+    }
+
+
+def test_count_windows():
+    chunk_array = numpy.frombuffer(os.urandom(3000) + b"\x00" * 1000, numpy.uint8)
+    expect_counts = count_windows_bincount(chunk_array, 1024)
+    assert expect_counts.shape == (4, 256)
+    assert expect_counts[:, 0].sum() >= 1000
+    # 不用numba时直接执行也能得到相同结果
+    assert (count_windows_loop(chunk_array, 1024) == expect_counts).all()
+    assert (count_windows(chunk_array, 1024) == expect_counts).all()
+
+
+def test_entropy_packer_verdict(monkeypatch):
+    Config.init(False)
+    pe_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+    pe_analyzer = PeAnalyzer(FileAnalyzer(pe_path))
+    assert pe_analyzer.get_high_entropy_sections() == ["UPX1"]
+
+    monkeypatch.setattr(PeAnalyzer, "get_packer_result", lambda self: None)
+    pe_analyzer.packer_scan()
+    assert pe_analyzer.result["packer"] == [
+        "unknown packer, high entropy sections: ['UPX1']"
+    ]
+
+    pe_analyzer = PeAnalyzer(FileAnalyzer(cur_dir_path / "test_data" / "Hello32.exe_"))
+    pe_analyzer.packer_scan()
+    assert pe_analyzer.result["packer"] is None
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_process.elf import ElfAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_mmap_file_content():
+    old_mmap_threshold = Config.mmap_threshold
+    Config.mmap_threshold = 1
+    try:
+        pe_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+        file_analyzer = FileAnalyzer(pe_path)
+        assert file_analyzer.file_content.is_mmap
+        assert file_analyzer.get_md5_sha256()[0] == "73aef8d1b4db633dedd5b4b31d607f76"
+        pe_analyzer = PeAnalyzer(file_analyzer)
+        assert pe_analyzer.get_packer_result() == ["UPX 3.96"]
+
+        elf_path = cur_dir_path / "test_data" / "hello32_elf_append_data_"
+        file_analyzer = FileAnalyzer(elf_path)
+        assert file_analyzer.file_content.is_mmap
+        elf_analyzer = ElfAnalyzer(file_analyzer)
+        assert elf_analyzer.get_elf_size() == 0x3ce0
+    finally:
+        Config.mmap_threshold = old_mmap_threshold
@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.magic_detector import MagicDetector
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_magic_detector_deep_type(monkeypatch):
+    data = (cur_dir_path / "test_data" / "office.ppt_").read_bytes()
+    header_type = MagicDetector.detect(data[: Config.magic_header_size])
+    file_type = MagicDetector.from_buffer(data)
+    assert header_type.startswith("Composite Document File")
+    assert file_type != header_type
+    assert file_type == MagicDetector.detect(data)
+    assert MagicDetector.from_buffer(memoryview(data)) == file_type
+
+    # bytes_max不大于magic_header_size时只识别开头部分，不再调用libmagic
+    magic_call_list = []
+    monkeypatch.setattr(
+        MagicDetector,
+        "get_magic",
+        classmethod(lambda cls: magic_call_list.append(cls)),
+    )
+    assert (
+        MagicDetector.from_buffer(data, bytes_max=Config.magic_header_size)
+        == header_type
+    )
+    assert magic_call_list == []
+    monkeypatch.undo()
+
+    # 只读取开头部分
+    data = (cur_dir_path / "test_data" / "hello.gif_").read_bytes()
+    assert len(data) > Config.magic_header_size
+    assert MagicDetector.from_buffer(data).startswith("GIF image data")
+
+
+def test_magic_detector_threads():
+    data_list = [
+        (cur_dir_path / "test_data" / file_name).read_bytes()
+        for file_name in ["Hello32.exe_", "hello.png_", "hello.zip_", "str.txt"]
+    ] * 50
+    MagicDetector.cache.clear()
+    expected_list = [MagicDetector.from_buffer(data) for data in data_list]
+    # Hello32.exe_大于magic_header_size，只缓存开头部分的识别结果
+    assert len(MagicDetector.cache) == 4
+
+    magic_handle_set = set()
+
+    def detect(data):
+        magic_handle_set.add((threading.get_ident(), id(MagicDetector.get_magic())))
+        return MagicDetector.from_buffer(data)
+
+    MagicDetector.cache.clear()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(detect, data_list)) == expected_list
+    handle_id_list = [handle_id for _, handle_id in magic_handle_set]
+    assert len(handle_id_list) == len(set(handle_id_list))
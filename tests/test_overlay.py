@@ -0,0 +1,52 @@
+import os
+from hashlib import sha256
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_content import FileContent
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_overlay_result():
+    Config.init(False)
+    for file_name, analyzer_name, image_size in [
+        ("HelloCSharp.exe_append_data_", "pe", 0x1200),
+        ("hello32_elf_append_data_", "elf", 0x3CE0),
+    ]:
+        file_path = cur_dir_path / "test_data" / file_name
+        overlay_data = file_path.read_bytes()[image_size:]
+        result = FileAnalyzer(file_path).run()
+        overlay_result = result[analyzer_name]["overlay"]
+        assert overlay_result["offset"] == image_size
+        assert overlay_result["size"] == len(overlay_data)
+        assert overlay_result["sha256"] == sha256(overlay_data).hexdigest()
+        assert 0 < overlay_result["entropy"] <= 8
+        assert overlay_result["possible_extension_names"] == [".txt"]
+
+    result = FileAnalyzer(cur_dir_path / "test_data" / "Hello32.exe_").run()
+    assert "overlay" not in result["pe"]
+
+
+def test_save_range(tmp_path, monkeypatch):
+    file_path = cur_dir_path / "test_data" / "HelloCSharp.exe_append_data_"
+    file_data = file_path.read_bytes()
+    for mmap_threshold in [Config.mmap_threshold, 1]:
+        monkeypatch.setattr(Config, "mmap_threshold", mmap_threshold)
+        file_content = FileContent(file_path)
+        assert file_content.is_mmap == (mmap_threshold == 1)
+        file_content.save_range(tmp_path / "stripped", 0, 0x1200)
+        file_content.save_range(tmp_path / "overlay", 0x1200)
+        assert (tmp_path / "stripped").read_bytes() == file_data[:0x1200]
+        assert (tmp_path / "overlay").read_bytes() == file_data[0x1200:]
+
+        chunk_list = list(file_content.iter_chunks(1000, 100, 2500))
+        assert [len(chunk) for chunk in chunk_list] == [900, 1000, 500]
+        assert b"".join(chunk_list) == file_data[100:2500]
+
+    # 不支持内核复制时分块写入
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+    file_content.save_range(tmp_path / "overlay", 0x1200)
+    assert (tmp_path / "overlay").read_bytes() == file_data[0x1200:]
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_pe_lazy_load(caplog):
+    Config.init(False, timing_flag=True)
+    caplog.set_level("INFO", logger="xanalyzer")
+    pe_path = cur_dir_path / "test_data" / "HelloB_resource_pe.exe_"
+    file_analyzer = FileAnalyzer(pe_path)
+    pe_analyzer = PeAnalyzer(file_analyzer)
+    assert not hasattr(pe_analyzer.pe_file, "DIRECTORY_ENTRY_IMPORT")
+    assert not hasattr(pe_analyzer.pe_file, "DIRECTORY_ENTRY_RESOURCE")
+
+    assert pe_analyzer.get_pdb_path()
+    assert pe_analyzer.parsed_directories == {"debug"}
+    assert not hasattr(pe_analyzer.pe_file, "DIRECTORY_ENTRY_RESOURCE")
+
+    result = pe_analyzer.run()
+    assert pe_analyzer.parsed_directories == {"debug", "resource", "import"}
+    assert result["weird_resource_types"] == [".exe"]
+    # 各阶段按开始顺序排列，import目录在exe_import_api扫描中第一次解析
+    stage_name_list = list(file_analyzer.profiler.stages)
+    assert stage_name_list.index("pe.parse_import_directory") == (
+        stage_name_list.index("pe.exe_import_api") + 1
+    )
+    messages = [record.getMessage() for record in caplog.records]
+    timing_messages = messages[messages.index("pe scan timings:") + 1 :]
+    import_api_index = [
+        message.split(":")[0] for message in timing_messages
+    ].index("    exe_import_api")
+    assert timing_messages[import_api_index + 1].startswith(
+        "        parse import directory: "
+    )
@@ -22,3 +22,22 @@ def test_pe_resource_pe():
     pe_analyzer = PeAnalyzer(file_analyzer)
     resource_type_dict = pe_analyzer.get_resource_type_dict()
     assert resource_type_dict["None:HELLOA_102_2052"][1] == [".exe"]
+
+
+def test_pe_resource_data_by_rva():
+    pe_path = cur_dir_path / "test_data" / "HelloB_resource_pe.exe_"
+
+    file_analyzer = FileAnalyzer(pe_path)
+    pe_analyzer = PeAnalyzer(file_analyzer)
+    pe_analyzer.parse_directory("resource")
+    memory_mapped_image = pe_analyzer.pe_file.get_memory_mapped_image()
+    resource_num = 0
+    for resource_entry in pe_analyzer.pe_file.DIRECTORY_ENTRY_RESOURCE.entries:
+        for d_entry in resource_entry.directory.entries:
+            for dd_entry in d_entry.directory.entries:
+                data_rva = dd_entry.data.struct.OffsetToData
+                size = dd_entry.data.struct.Size
+                data = pe_analyzer.get_data_by_rva(data_rva, size)
+                assert data == memory_mapped_image[data_rva : data_rva + size]
+                resource_num += 1
+    assert resource_num == len(list(pe_analyzer.iter_resources()))
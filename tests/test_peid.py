@@ -0,0 +1,29 @@
+from pathlib import Path
+
+import pefile
+import peutils
+
+from xanalyzer.config import Config
+from xanalyzer.peid import PeidSignatures
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_peid_signatures(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "peid_cache_dir", tmp_path / "peid_cache")
+    signature_database = peutils.SignatureDatabase(Config.peid_signature_path)
+    peid_signatures = PeidSignatures.load(Config.peid_signature_path)
+    assert len(list((tmp_path / "peid_cache").iterdir())) == 1
+    cached_peid_signatures = PeidSignatures.load(Config.peid_signature_path)
+
+    for pe_path in (cur_dir_path / "test_data").glob("Hello*"):
+        try:
+            pe = pefile.PE(pe_path)
+        except pefile.PEFormatError:
+            continue
+        matches = signature_database.match(pe, ep_only=True)
+        assert peid_signatures.match(pe) == matches
+        assert cached_peid_signatures.match(pe) == matches
+
+    pe = pefile.PE(cur_dir_path / "test_data" / "Hello_upx.exe_")
+    assert any("UPX" in name for name in peid_signatures.match(pe))
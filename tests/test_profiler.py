@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from xanalyzer.batch import run_batch, run_inline
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.profiler import ProfileAggregator, get_percentile
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_file_profile():
+    Config.init(False)
+    pe_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+    result = FileAnalyzer(pe_path).run()
+    assert "profile" not in result
+
+    Config.init(False, profile_flag=True)
+    file_analyzer = FileAnalyzer(pe_path)
+    result = file_analyzer.run()
+    stages = result["profile"]["stages"]
+    for stage_name in ["total", "hash", "file_type", "strings", "pe", "pe.packer"]:
+        assert stage_name in stages
+    assert stages["hash"]["bytes"] == file_analyzer.file_size
+    assert stages["total"]["wall"] >= stages["pe"]["wall"]
+    assert stages["pe"]["wall"] >= stages["pe.packer"]["wall"]
+
+    elf_path = cur_dir_path / "test_data" / "hello64_elf"
+    result = FileAnalyzer(elf_path).run()
+    assert "elf.entropy" in result["profile"]["stages"]
+
+
+def test_profile_aggregator():
+    assert get_percentile([3, 1, 2], 50) == 2
+    assert get_percentile(list(range(1, 101)), 95) == 95
+    assert get_percentile([5], 95) == 5
+
+    profile_aggregator = ProfileAggregator()
+    for i in range(1, 21):
+        profile_aggregator.add(
+            {
+                "stages": {"hash": {"wall": i / 10, "cpu": i / 20, "bytes": 100}},
+                "process_peak_rss": i * 1024,
+            }
+        )
+    result = profile_aggregator.get_result()
+    assert result["sample_num"] == 20
+    assert result["process_peak_rss"] == 20 * 1024
+    hash_result = result["stages"]["hash"]
+    assert hash_result["count"] == 20
+    assert hash_result["wall_p50"] == 1.0
+    assert hash_result["wall_p95"] == 1.9
+    assert hash_result["cpu_p95"] == 0.95
+    assert hash_result["bytes"] == 2000
+
+
+def test_batch_profile():
+    Config.init(False, profile_flag=True)
+    file_path_list = [
+        str(cur_dir_path / "test_data" / filename)
+        for filename in ["Hello_upx.exe_", "not_exist_file", "str.txt"]
+    ]
+    for run_func, args in [(run_inline, ()), (run_batch, (2,))]:
+        profile_aggregator = ProfileAggregator()
+        run_func(file_path_list, 4, *args, None, profile_aggregator)
+        result = profile_aggregator.get_result()
+        # 出错的样本没有profile
+        assert result["sample_num"] == 2
+        assert result["stages"]["total"]["count"] == 2
+        assert result["stages"]["pe"]["count"] == 1
@@ -0,0 +1,135 @@
+import io
+import zipfile
+from pathlib import Path
+
+from xanalyzer.batch import run_batch, run_inline
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def make_zip(member_dict):
+    zip_io = io.BytesIO()
+    with zipfile.ZipFile(zip_io, "w", zipfile.ZIP_DEFLATED) as the_zip:
+        for member_name, data in member_dict.items():
+            the_zip.writestr(member_name, data)
+    return zip_io.getvalue()
+
+
+def test_recurse_container():
+    Config.init(False, recurse_flag=True)
+    for filename, member_name in [
+        ("hello.zip_", "hello.txt"),
+        ("hello.tar.gz_", "hello.tar"),
+    ]:
+        file_path = cur_dir_path / "test_data" / filename
+        file_analyzer = FileAnalyzer(file_path)
+        file_analyzer.run()
+        assert file_analyzer.result["children"] == [f"{file_path}!{member_name}"]
+
+    # 嵌套的压缩包
+    inner_zip = make_zip({"a.txt": b"hello a", "b.txt": b"hello b"})
+    file_analyzer = FileAnalyzer("outer.zip", data=make_zip({"inner.zip": inner_zip}))
+    file_analyzer.run()
+    assert file_analyzer.result["children"] == ["outer.zip!inner.zip"]
+    child_path, data = file_analyzer.children[0]
+    child_analyzer = FileAnalyzer(child_path, data=data, depth=1)
+    child_analyzer.run()
+    assert child_analyzer.result["children"] == [
+        "outer.zip!inner.zip!a.txt",
+        "outer.zip!inner.zip!b.txt",
+    ]
+
+    Config.init(False)
+    file_analyzer = FileAnalyzer(cur_dir_path / "test_data" / "hello.zip_")
+    file_analyzer.run()
+    assert file_analyzer.children == []
+
+
+def test_recurse_mmap_container(monkeypatch):
+    Config.init(False, recurse_flag=True)
+    for filename in [
+        "hello.zip_",
+        "hello.tar.gz_",
+        "app-debug.apk_",
+        "office.docx_",
+        "wps.xlsx_",
+    ]:
+        file_path = cur_dir_path / "test_data" / filename
+        file_analyzer = FileAnalyzer(file_path)
+        file_analyzer.run()
+        children = file_analyzer.children
+        assert children
+        # 大文件使用mmap时，提取出的子文件相同
+        monkeypatch.setattr(Config, "mmap_threshold", 1)
+        file_analyzer = FileAnalyzer(file_path)
+        assert file_analyzer.file_content.is_mmap
+        file_analyzer.run()
+        assert file_analyzer.children == children
+        monkeypatch.undo()
+
+
+def test_recurse_limit(monkeypatch):
+    Config.init(False, recurse_flag=True)
+    # 高压缩率的文件，解压时超过额度立即停止
+    bomb = make_zip({f"{i}.bin": b"\x00" * 1024 * 1024 for i in range(4)})
+    monkeypatch.setattr(Config, "recurse_max_total_size", 2 * 1024 * 1024 + 1)
+    file_analyzer = FileAnalyzer("bomb.zip", data=bomb)
+    file_analyzer.run()
+    assert file_analyzer.result["children"] == ["bomb.zip!0.bin", "bomb.zip!1.bin"]
+
+    monkeypatch.setattr(Config, "recurse_max_depth", 1)
+    nested_zip = make_zip({"inner.zip": make_zip({"a.txt": b"a"})})
+    file_analyzer = FileAnalyzer("outer.zip", data=nested_zip, depth=1)
+    file_analyzer.run()
+    assert file_analyzer.children == []
+
+
+def test_recurse_order(tmp_path, caplog):
+    Config.init(False, recurse_flag=True)
+    inner_zip = make_zip({"a.txt": b"hello a", "b.txt": b"hello b"})
+    outer_path = tmp_path / "outer.zip"
+    outer_path.write_bytes(make_zip({"inner.zip": inner_zip, "c.txt": b"hello c"}))
+    file_path_list = [str(outer_path), str(cur_dir_path / "test_data" / "str.txt")]
+    expected_list = [
+        str(outer_path),
+        f"{outer_path}!inner.zip",
+        f"{outer_path}!inner.zip!a.txt",
+        f"{outer_path}!inner.zip!b.txt",
+        f"{outer_path}!c.txt",
+        file_path_list[1],
+    ]
+
+    caplog.set_level("INFO", logger="xanalyzer")
+    for run_func, args in [(run_inline, ()), (run_batch, (2,))]:
+        caplog.clear()
+        run_func(file_path_list, 4, *args)
+        processing_list = [
+            record.getMessage()[len("processing ") :]
+            for record in caplog.records
+            if record.getMessage().startswith("processing ")
+        ]
+        assert processing_list == expected_list
+
+
+def test_recurse_pe_payload():
+    Config.init(False, recurse_flag=True)
+    pe_path = cur_dir_path / "test_data" / "HelloB_resource_pe.exe_"
+    file_analyzer = FileAnalyzer(pe_path)
+    file_analyzer.run()
+    assert file_analyzer.result["children"] == [
+        f"{pe_path}!resource_None:HELLOA_102_2052"
+    ]
+    child_path, data = file_analyzer.children[0]
+    child_analyzer = FileAnalyzer(child_path, data=data, depth=1, parent_path=pe_path)
+    child_result = child_analyzer.run()
+    assert child_result["parent"] == str(pe_path)
+    assert child_result["file_type"].startswith("PE")
+
+    pe_path = cur_dir_path / "test_data" / "HelloCSharp.exe_append_data_"
+    file_analyzer = FileAnalyzer(pe_path)
+    file_analyzer.run()
+    assert file_analyzer.result["children"] == [f"{pe_path}!overlay"]
+    pe_size = file_analyzer.result["pe"]["pe_size"]
+    assert file_analyzer.children[0][1] == pe_path.read_bytes()[pe_size:]
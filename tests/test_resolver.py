@@ -0,0 +1,52 @@
+import threading
+import time
+
+from xanalyzer.resolver import DnsResolver
+
+
+class StubResolver:
+    """
+    不访问网络的解析函数，记录每个域名被解析的次数
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.resolve_count = {}
+
+    def __call__(self, domain):
+        with self.lock:
+            self.resolve_count[domain] = self.resolve_count.get(domain, 0) + 1
+        time.sleep(self.delay)
+        if domain.startswith("bad."):
+            return None
+        return [f"10.0.0.{len(domain)}"]
+
+
+def test_resolver_cache():
+    stub_resolver = StubResolver()
+    resolver = DnsResolver(stub_resolver, ttl=60)
+    assert resolver.resolve("www.example.com") == ["10.0.0.15"]
+    assert resolver.resolve("WWW.example.com") == ["10.0.0.15"]
+    assert resolver.resolve("bad.example.com") is None
+    assert resolver.resolve("bad.example.com") is None
+    assert stub_resolver.resolve_count == {"www.example.com": 1, "bad.example.com": 1}
+
+    # 过期后重新解析
+    resolver.ttl = 0
+    resolver.resolve("new.example.com")
+    resolver.resolve("new.example.com")
+    assert stub_resolver.resolve_count["new.example.com"] == 2
+    resolver.close()
+
+
+def test_resolver_concurrent():
+    stub_resolver = StubResolver(delay=0.2)
+    resolver = DnsResolver(stub_resolver, concurrency=20)
+    domain_list = [f"s{i}.example.com" for i in range(20)]
+    start_time = time.monotonic()
+    ip_dict = resolver.resolve_many(domain_list + domain_list)
+    assert time.monotonic() - start_time < 1
+    assert list(ip_dict) == domain_list
+    assert all(count == 1 for count in stub_resolver.resolve_count.values())
+    resolver.close()
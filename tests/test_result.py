@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.output import ResultWriter
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_file_result():
+    Config.init(False)
+    pe_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+    result = FileAnalyzer(pe_path).run()
+    assert result["md5"] == "73aef8d1b4db633dedd5b4b31d607f76"
+    assert result["possible_extension_names"] == [".exe"]
+    assert result["pe"]["packer"] == ["UPX 3.96"]
+    assert result["pe"]["section_names"] == ["UPX0", "UPX1", ".rsrc"]
+
+    elf_path = cur_dir_path / "test_data" / "hello32_elf_append_data_"
+    result = FileAnalyzer(elf_path).run()
+    assert result["elf"]["elf_size"] == 0x3CE0
+
+
+def test_result_writer(tmp_path):
+    results = [{"file_path": "a", "md5": "1"}, {"file_path": "b", "md5": "2"}]
+
+    jsonl_path = tmp_path / "result.jsonl"
+    result_writer = ResultWriter(jsonl_path, "jsonl")
+    for result in results:
+        result_writer.write(result)
+    result_writer.close()
+    with open(jsonl_path, "r", encoding="utf8") as f:
+        assert [json.loads(line) for line in f] == results
+
+    json_path = tmp_path / "result.json"
+    result_writer = ResultWriter(json_path, "json")
+    for result in results:
+        result_writer.write(result)
+    result_writer.close()
+    with open(json_path, "r", encoding="utf8") as f:
+        assert json.load(f) == results
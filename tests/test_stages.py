@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import pytest
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.stages import COST_LOW, Stage, StageRegistry
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_stage_select():
+    stage_registry = FileAnalyzer.stage_registry
+    assert stage_registry.select(only=["cert"]) == {"pe", "pe.cert"}
+    assert stage_registry.select(only=["packer"]) == {
+        "pe",
+        "pe.packer",
+        "elf",
+        "elf.packer",
+    }
+    assert stage_registry.select(only=["elf"]) == {
+        "elf",
+        "elf.elf_size",
+        "elf.entropy",
+        "elf.packer",
+    }
+
+    selected_stages = stage_registry.select(skip=["strings", "pe.cert"])
+    assert "strings" not in selected_stages
+    assert "pe.cert" not in selected_stages
+    assert "pe.packer" in selected_stages
+
+    # 依赖的阶段不受max_cost限制
+    selected_stages = stage_registry.select(max_cost=COST_LOW)
+    assert "strings" not in selected_stages
+    assert "pe.cert" not in selected_stages
+    assert "pe.entropy" not in selected_stages
+    assert {"pe.compile_time", "pe.packer", "tool_recommendations"} <= selected_stages
+
+    # skip优先于依赖
+    selected_stages = stage_registry.select(only=["tool_recommendations"], skip=["pe"])
+    assert selected_stages == {"tool_recommendations", "elf", "elf.packer"}
+
+    with pytest.raises(ValueError):
+        stage_registry.select(only=["not_exist"])
+    with pytest.raises(ValueError):
+        stage_registry.register(Stage("strings", None))
+    with pytest.raises(ValueError):
+        StageRegistry([Stage("a", None, depends=["b"])]).select()
+
+
+def test_file_analyzer_stages():
+    pe_path = cur_dir_path / "test_data" / "java.exe_"
+    Config.init(False, skip_stages=["strings", "cert"])
+    result = FileAnalyzer(pe_path).run()
+    assert "str_num" not in result
+    assert "certificates" not in result["pe"]
+    assert "compile_time" in result["pe"]
+    assert "tool_recommendations" in result
+
+    Config.init(False, only_stages=["compile_time"])
+    result = FileAnalyzer(pe_path).run()
+    assert list(result["pe"]) == ["compile_time"]
+    assert "yara_matches" not in result
+    assert "tool_recommendations" not in result
+
+    # 不适用的阶段不执行
+    Config.init(False, only_stages=["pe"])
+    result = FileAnalyzer(cur_dir_path / "test_data" / "hello64_elf").run()
+    assert "pe" not in result
+    assert "elf" not in result
+    Config.init(False)
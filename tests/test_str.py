@@ -1,3 +1,4 @@
+import re
 from pathlib import Path
 
 from xanalyzer.file import FileAnalyzer
@@ -45,6 +46,27 @@ def test_special_str():
     assert file_analyzer.get_special_strs() == [b"aGVsbG8=", b"68656c6c6f"]
 
 
+def test_special_str_order(tmp_path):
+    # base64和hex字符串按在文件中的偏移交错排列
+    file_path = tmp_path / "special_str_order.txt"
+    file_path.write_bytes(
+        b"68656c6c6f aGVsbG8= 776f726c64\x00\x00"
+        + "d29ybGQ= 68656c6c6f".encode("utf-16-le")
+    )
+    file_analyzer = FileAnalyzer(file_path=file_path)
+    assert file_analyzer.get_special_strs() == [
+        b"68656c6c6f",
+        b"aGVsbG8=",
+        b"776f726c64",
+    ]
+    assert file_analyzer.get_special_wide_strs() == [
+        "d29ybGQ=".encode("utf-16-le"),
+        "68656c6c6f".encode("utf-16-le"),
+    ]
+    # 几个get_*_strs共用一次扫描
+    assert file_analyzer.get_all_strs() is file_analyzer.get_all_strs()
+
+
 def test_special_wide_str():
     pe_path = cur_dir_path / "test_data" / "special_wide_str.txt"
 
@@ -53,3 +75,53 @@ def test_special_wide_str():
         b"a\x00G\x00V\x00s\x00b\x00G\x008\x00=\x00",
         b"6\x008\x006\x005\x006\x00c\x006\x00c\x006\x00f\x00",
     ]
+
+
+def get_strs_by_findall(file_content, minstrlen):
+    """
+    原来对整个文件分别做findall的结果，用于对比
+    """
+    minstrlen_bytes = str(minstrlen).encode()
+    all_strs = {}
+    all_strs["str"] = re.findall(rb"[\x20-\x7e]{" + minstrlen_bytes + rb",}", file_content)
+    all_strs["wide_str"] = re.findall(
+        rb"(?:[\x20-\x7e]\x00){" + minstrlen_bytes + rb",}", file_content
+    )
+    for str_type, base64_re, hex_re in [
+        ("special_str", rb"[A-Za-z0-9+/]{6,}={1,2}", rb"(?:[A-Fa-f0-9]{2}){4,}"),
+        (
+            "special_wide_str",
+            rb"(?:[A-Za-z0-9+/]\x00){6,}(?:=\x00){1,2}",
+            rb"(?:(?:[A-Fa-f0-9]\x00){2}){4,}",
+        ),
+    ]:
+        base64_strs = [
+            a_str
+            for a_str in re.findall(base64_re, file_content)
+            if not re.match(hex_re, a_str)
+        ]
+        all_strs[str_type] = sorted(base64_strs + re.findall(hex_re, file_content))
+    return all_strs
+
+
+def test_single_pass_strs():
+    for filename in ["java.exe_", "HelloB_resource_pe.exe_", "SetupTest.msi_"]:
+        file_path = cur_dir_path / "test_data" / filename
+        for minstrlen in [2, 4, 10]:
+            file_analyzer = FileAnalyzer(file_path=file_path, minstrlen=minstrlen)
+            file_content = file_analyzer.file_content
+            expect_strs = get_strs_by_findall(file_content.data, minstrlen)
+            for chunk_size in [5000, None]:
+                all_strs = {str_type: [] for str_type in expect_strs}
+                for str_type, offset, the_str in file_analyzer.str_scanner.scan(
+                    file_content, chunk_size
+                ):
+                    assert file_content.data[offset : offset + len(the_str)] == the_str
+                    all_strs[str_type].append(the_str)
+                assert all_strs["str"] == expect_strs["str"]
+                assert all_strs["wide_str"] == expect_strs["wide_str"]
+                assert sorted(all_strs["special_str"]) == expect_strs["special_str"]
+                assert (
+                    sorted(all_strs["special_wide_str"])
+                    == expect_strs["special_wide_str"]
+                )
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_triage():
+    Config.init(False, triage_flag=True)
+    pe_path = cur_dir_path / "test_data" / "Hello32.exe_"
+    file_analyzer = FileAnalyzer(pe_path)
+    result = file_analyzer.run()
+    assert result["triage"] == {
+        "escalated": False,
+        "rules": [],
+        "real_size": file_analyzer.file_size,
+    }
+    assert result["file_type"].startswith("PE32 executable")
+    assert result["possible_extension_names"] == [".exe"]
+    assert "pe" not in result
+    assert "str_num" not in result
+
+    # 有附加数据，完整分析
+    result = FileAnalyzer(
+        cur_dir_path / "test_data" / "HelloCSharp.exe_append_data_"
+    ).run()
+    assert result["triage"]["escalated"]
+    assert result["triage"]["rules"] == ["size_anomaly"]
+    assert "overlay" in result["pe"]
+    assert "str_num" in result
+
+    Config.init(False, triage_flag=True, triage_escalate_rules=["executable", "script"])
+    for filename, escalated_flag in [
+        ("Hello32.exe_", True),
+        ("hello64_elf", True),
+        ("hello_bash.sh_", True),
+        ("str.txt", False),
+    ]:
+        result = FileAnalyzer(cur_dir_path / "test_data" / filename).run()
+        assert result["triage"]["escalated"] == escalated_flag
+    Config.init(False)
+
+
+def test_triage_known_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "cache_path", tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(FileAnalyzer, "result_cache", None)
+    pe_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+    try:
+        Config.init(False, True, triage_flag=True, triage_escalate_rules=["executable"])
+        first_result = FileAnalyzer(pe_path).run()
+        assert first_result["triage"]["escalated"]
+
+        # 已知样本使用缓存的完整结果，即使不会命中升级规则
+        Config.init(False, True, triage_flag=True, triage_escalate_rules=["script"])
+        second_result = FileAnalyzer(pe_path).run()
+    finally:
+        FileAnalyzer.result_cache.close()
+        Config.init(False)
+    assert second_result["triage"] == {"known": True, "escalated": False, "rules": []}
+    assert second_result["pe"] == first_result["pe"]
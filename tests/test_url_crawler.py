@@ -0,0 +1,232 @@
+import json
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from xanalyzer.batch import run_url_batch
+from xanalyzer.config import Config
+from xanalyzer.crawler import CrawlFrontier, Crawler, LinkExtractor, normalize_url
+from xanalyzer.output import ResultWriter
+from xanalyzer.resolver import DnsResolver
+from xanalyzer.url import UrlAnalyzer
+
+site_pages = {
+    "index.html": """
+        <a href="a.html">a</a>
+        <a href='b/'>b</a>
+        <img src="logo.png">
+        <a href="javascript:void(0)">js</a>
+        <a href="http://sub1.example.com/hello">sub1</a>
+        """,
+    "a.html": """
+        <a href="c.html">c</a>
+        <a href="/">home</a>
+        <form action="a.html"></form>
+        """,
+    "b/index.html": """
+        <a href="../a.html">a</a>
+        <a href="d.html">d</a>
+        <script src="https://sub2.example.com/x.js"></script>
+        """,
+    "c.html": '<a href="http://www.example.org/">other</a>',
+    "b/d.html": '<a href="e.html">e</a>',
+    "b/e.html": "end",
+}
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site_url(tmp_path):
+    for page_path, content in site_pages.items():
+        page_path = tmp_path / page_path
+        page_path.parent.mkdir(parents=True, exist_ok=True)
+        page_path.write_text(content)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(QuietHandler, directory=str(tmp_path))
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_link_and_subdomain_scan(site_url, monkeypatch):
+    monkeypatch.setattr(
+        UrlAnalyzer, "resolver", DnsResolver(lambda domain: ["127.0.0.1"])
+    )
+    Config.init(False)
+    url_analyzer = UrlAnalyzer(f"{site_url}/index.html", True)
+    # 本地服务没有域名，手动指定以测试子域名提取
+    url_analyzer.hostname_type = "domain"
+    url_analyzer.basic_domain = "example.com"
+    url_analyzer.link_and_subdomain_scan()
+
+    assert url_analyzer.result["links"] == [
+        f"{site_url}",
+        f"{site_url}/a.html",
+        f"{site_url}/b",
+        f"{site_url}/logo.png",
+        "http://sub1.example.com/hello",
+        f"{site_url}/c.html",
+        f"{site_url}/b/d.html",
+        "https://sub2.example.com/x.js",
+        "http://www.example.org",
+        f"{site_url}/b/e.html",
+    ]
+    assert url_analyzer.result["subdomain_list"] == [
+        "sub1.example.com",
+        "sub2.example.com",
+    ]
+    assert url_analyzer.result["subdomain_ip_dict"] == {
+        "sub1.example.com": ["127.0.0.1"],
+        "sub2.example.com": ["127.0.0.1"],
+    }
+
+
+def test_crawler_budget(site_url):
+    requested_url_list = []
+
+    def handle_response(url, res, parsed):
+        requested_url_list.append(url)
+        assert not isinstance(res, Exception)
+        return [f"{url}/x{i}" for i in range(3)]
+
+    crawler = Crawler(max_pages=5, host_interval=0)
+    crawler.crawl([site_url], handle_response)
+    crawler.close()
+    assert len(requested_url_list) == 5
+
+    requested_url_list = []
+    crawler = Crawler(max_depth=1, host_interval=0)
+    crawler.crawl([site_url], handle_response)
+    crawler.close()
+    assert len(requested_url_list) == 4
+
+
+def test_crawl_frontier():
+    assert normalize_url("HTTP://WWW.Example.com:80/a/?x=1#top") == (
+        "http://www.example.com/a/?x=1"
+    )
+    assert normalize_url("https://example.com:8443/a/") == "https://example.com:8443/a"
+
+    frontier = CrawlFrontier()
+    assert frontier.add("http://example.com/", 0)
+    assert not frontier.add("http://EXAMPLE.com#top", 0)
+    for i in range(100000):
+        frontier.add(f"http://example.com/{i % 50000}", 1)
+    assert frontier.pop_level() == (0, ["http://example.com"])
+    depth, url_list = frontier.pop_level()
+    assert depth == 1 and len(url_list) == 50000
+    assert not frontier
+
+
+def test_url_analyzer_instance_state(site_url):
+    Config.init(False)
+    url_analyzer = UrlAnalyzer(f"{site_url}/b/", True)
+    url_analyzer.link_and_subdomain_scan()
+    other_url_analyzer = UrlAnalyzer(f"{site_url}/b/", True)
+    assert other_url_analyzer.links == []
+    other_url_analyzer.link_and_subdomain_scan()
+    assert other_url_analyzer.links == url_analyzer.links
+
+
+def test_link_extractor(site_url):
+    content = b"".join(
+        b'<a href="/p%d">x</a> <img src=\'/i%d.png\'> http://s%d.example.com/ ' % (i, i, i)
+        for i in range(1000)
+    )
+    half_links, possible_subdomains = LinkExtractor.extract([content])
+    assert half_links[:3] == [b"/p0", b"/i0.png", b"/p1"]
+    assert len(half_links) == 2000
+    assert len(possible_subdomains) == 1000
+    chunk_list = [content[i : i + 7] for i in range(0, len(content), 7)]
+    assert LinkExtractor.extract(chunk_list) == (half_links, possible_subdomains)
+
+    # 属性值跨块时，其中的url不会先按子域名匹配而丢掉整个链接
+    chunk_size = 64 * 1024
+    for link_offset in [80, 60, 30, 10]:
+        content = (
+            b"x" * (chunk_size - link_offset)
+            + b'<a href="https://www.example.com/'
+            + b"a" * 100
+            + b'">x</a> <img src=\'//cdn.example.com/i.png\'>'
+        )
+        expect_result = LinkExtractor.extract([content])
+        assert expect_result[0][0].startswith(b"https://www.example.com/")
+        chunk_list = [
+            content[i : i + chunk_size] for i in range(0, len(content), chunk_size)
+        ]
+        assert LinkExtractor.extract(chunk_list) == expect_result
+
+    crawler = Crawler(max_body_size=10, host_interval=0)
+    res, parsed = crawler.fetch(
+        f"{site_url}/a.html", lambda res: b"".join(crawler.iter_body(res))
+    )
+    crawler.close()
+    assert res.status_code == 200
+    assert parsed == site_pages["a.html"].encode()[:10]
+
+
+def test_url_batch(site_url, tmp_path, caplog):
+    Config.init(False)
+    url_list = [
+        f"{site_url}/index.html",
+        "http://127.0.0.1:1/refused",
+        f"{site_url}/b/d.html",
+        f"{site_url}/not_exist.html",
+    ]
+    output_path = tmp_path / "result.jsonl"
+    result_writer = ResultWriter(str(output_path), "jsonl")
+    caplog.set_level("INFO", logger="xanalyzer")
+    run_url_batch(iter(url_list), False, 3, result_writer)
+    result_writer.close()
+
+    result_list = [json.loads(line) for line in output_path.read_text().splitlines()]
+    assert [result["url"] for result in result_list] == url_list
+    assert [result.get("status_code") for result in result_list] == [
+        200,
+        None,
+        200,
+        404,
+    ]
+    assert "error" in result_list[1]
+
+    messages = [record.getMessage() for record in caplog.records]
+    processing_index_list = [
+        messages.index(f"processing {url}") for url in url_list
+    ]
+    assert processing_index_list == sorted(processing_index_list)
+    # 每个url的日志在它的processing之后输出
+    assert messages[processing_index_list[2] + 1] == "url status code: 200"
+
+
+def test_url_batch_crawl_worker_log(site_url, caplog, monkeypatch):
+    Config.init(False)
+    # 截断警告在crawler的工作线程中输出
+    crawler = Crawler(max_body_size=10, host_interval=0)
+    monkeypatch.setattr(UrlAnalyzer, "crawler", crawler)
+    url_list = [f"{site_url}/a.html", f"{site_url}/b/d.html", f"{site_url}/c.html"]
+    caplog.set_level("INFO", logger="xanalyzer")
+    run_url_batch(iter(url_list), True, 3, None)
+    crawler.close()
+
+    messages = [record.getMessage() for record in caplog.records]
+    processing_index_list = [
+        messages.index(f"processing {url}") for url in url_list
+    ] + [len(messages)]
+    # 每个url的截断警告都在它的processing之后输出
+    for i in range(len(url_list)):
+        url_messages = messages[processing_index_list[i] : processing_index_list[i + 1]]
+        warning_list = [
+            message
+            for message in url_messages
+            if message.startswith("response body is larger than")
+        ]
+        assert len(warning_list) == 1
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.yara_rules import load_yara_rules
+
+cur_dir_path = Path(__file__).parent
+
+
+def test_compiled_yara_rules_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "yara_cache_dir", tmp_path / "yara_cache")
+    upxed_path = cur_dir_path / "test_data" / "Hello_upx.exe_"
+    the_content = open(upxed_path, "rb").read()
+
+    yara_rules = load_yara_rules([Config.packer_yara_rules_path])
+    compiled_path_list = list((tmp_path / "yara_cache").iterdir())
+    assert len(compiled_path_list) == 1
+
+    cached_yara_rules = load_yara_rules([Config.packer_yara_rules_path])
+    assert [m.rule for m in cached_yara_rules.match(data=the_content)] == [
+        m.rule for m in yara_rules.match(data=the_content)
+    ]
+    assert list((tmp_path / "yara_cache").iterdir()) == compiled_path_list
+
+
+def test_user_yara_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "yara_cache_dir", tmp_path / "yara_cache")
+    monkeypatch.setattr(FileAnalyzer, "user_yara_rules", None)
+    yara_dir = tmp_path / "my_rules"
+    yara_dir.mkdir()
+    with open(yara_dir / "hello.yar", "w") as f:
+        f.write('rule Hello { strings: $a = "55555" condition: $a }')
+
+    Config.init(False, yara_dir_list=[str(yara_dir)])
+    try:
+        file_analyzer = FileAnalyzer(cur_dir_path / "test_data" / "str.txt")
+        result = file_analyzer.run()
+    finally:
+        Config.init(False)
+    assert result["yara_matches"] == ["hello.yar:Hello"]
+
+    # 规则修改后重新编译
+    with open(yara_dir / "hello.yar", "w") as f:
+        f.write('rule Hello2 { strings: $a = "4444" condition: $a }')
+    yara_rules = load_yara_rules([yara_dir])
+    assert [m.rule for m in yara_rules.match(data=b"4444")] == ["Hello2"]
+    assert len(list((tmp_path / "yara_cache").iterdir())) == 2
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from signify.authenticode.structures import TRUSTED_CERTIFICATE_STORE
+from signify.exceptions import VerificationError
+from signify.x509.context import VerificationContext
+
+from xanalyzer.config import Config
+from xanalyzer.utils import log
+
+
+class CachedVerificationContext(VerificationContext):
+    """
+    缓存证书链的验证结果
+    同一厂商签名的文件证书链相同，只需要用certvalidator验证一次
+    验证成功的链在链上所有证书的有效期内都成立，时间戳在这个范围内时直接复用
+    验证失败的结果只在验证条件(包括时间戳)完全相同时复用
+    """
+
+    cache_lock = threading.Lock()
+    # cache_key -> (valid_from, valid_to, chain)
+    chain_cache = OrderedDict()
+    # (cache_key, timestamp) -> 异常
+    error_cache = OrderedDict()
+
+    def get_cache_key(self, certificate):
+        intermediate_fingerprints = set()
+        trusted_store_ids = []
+        for store in self.stores:
+            if store.trusted:
+                # 可信证书库是全局对象，内容不变
+                trusted_store_ids.append(id(store))
+                continue
+            for cert in store:
+                intermediate_fingerprints.add(cert.sha256_fingerprint)
+        return (
+            certificate.sha256_fingerprint,
+            frozenset(intermediate_fingerprints),
+            tuple(trusted_store_ids),
+            tuple(self.key_usages or []),
+            tuple(self.extended_key_usages or []),
+            self.optional_eku,
+            self.allow_legacy,
+            self.revocation_mode,
+        )
+
+    @classmethod
+    def put_cache(cls, the_cache, key, value):
+        with cls.cache_lock:
+            the_cache[key] = value
+            if len(the_cache) > Config.cert_chain_cache_size:
+                the_cache.popitem(last=False)
+
+    def verify(self, certificate):
+        cache_key = self.get_cache_key(certificate)
+        moment = self.timestamp or datetime.now(timezone.utc)
+        with self.cache_lock:
+            cached_chain = self.chain_cache.get(cache_key)
+            cached_error = self.error_cache.get((cache_key, self.timestamp))
+        if cached_chain:
+            valid_from, valid_to, chain = cached_chain
+            if valid_from <= moment <= valid_to:
+                return chain
+        if cached_error:
+            raise cached_error
+
+        try:
+            chain = super().verify(certificate)
+        except VerificationError as e:
+            self.put_cache(self.error_cache, (cache_key, self.timestamp), e)
+            raise
+        valid_from = max(cert.valid_from for cert in chain)
+        valid_to = min(cert.valid_to for cert in chain)
+        self.put_cache(self.chain_cache, cache_key, (valid_from, valid_to, chain))
+        return chain
+
+
+def get_authenticode_hashes(signed_pe, signed_data_list):
+    """
+    一次遍历文件计算所有签名用到的Authenticode摘要
+    signify按签名逐个计算，双签名的文件会完整读取两遍
+    :return: {hash_name: digest}
+    """
+    fingerprinter = signed_pe.get_fingerprinter()
+    fingerprinter.add_authenticode_hashers(
+        *{signed_data.digest_algorithm for signed_data in signed_data_list}
+    )
+    return fingerprinter.hashes()["authentihash"]
+
+
+def verify_signed_data(signed_data, expected_hash):
+    """
+    和signed_data.verify()相同，只是证书链验证使用CachedVerificationContext
+    """
+    verification_context = CachedVerificationContext(
+        TRUSTED_CERTIFICATE_STORE,
+        signed_data.certificates,
+        extended_key_usages=["code_signing"],
+    )
+    cs_verification_context = None
+    countersigner = signed_data.signer_info.countersigner
+    if countersigner:
+        cs_verification_context = CachedVerificationContext(
+            TRUSTED_CERTIFICATE_STORE,
+            signed_data.certificates,
+            extended_key_usages=["time_stamping"],
+        )
+        if hasattr(countersigner, "certificates"):
+            cs_verification_context.add_store(countersigner.certificates)
+    signed_data.verify(
+        expected_hash=expected_hash,
+        verification_context=verification_context,
+        cs_verification_context=cs_verification_context,
+    )
+
+
+def load_trusted_certificates():
+    """
+    可信证书库第一次使用时才从磁盘加载，并且加载过程不是线程安全的，
+    在使用线程池验证之前先加载
+    """
+    try:
+        len(TRUSTED_CERTIFICATE_STORE)
+    except Exception as e:
+        # 有证书解析失败时signify也会标记为已加载，之后使用已解析出的证书验证
+        log.warning(f"failed to load some trusted certificates: {e}")
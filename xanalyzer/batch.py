@@ -0,0 +1,311 @@
+import contextvars
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from xanalyzer.config import Config
+from xanalyzer.file import FileAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+from xanalyzer.url import UrlAnalyzer
+from xanalyzer.utils import LogCollector, log
+
+
+def init_worker(conf):
+    """
+    子进程初始化: 同步配置，预先加载yara规则和PEiD特征，之后的样本直接复用
+    """
+    Config.conf.update(conf)
+    log.handlers = []
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    FileAnalyzer.init_packer_yara_rules()
+    FileAnalyzer.init_user_yara_rules()
+    PeAnalyzer.init_peid_signatures()
+
+
+class RecurseBudget:
+    """
+    一个样本及其所有子文件共用的提取额度，防止解压炸弹
+    """
+
+    def __init__(self):
+        self.remaining_size = Config.recurse_max_total_size
+
+    def accept_children(self, children):
+        """
+        :return: 额度内的子文件
+        """
+        accepted_children = []
+        for child_path, data in children:
+            if len(data) > self.remaining_size:
+                log.warning(f"recurse total size limit reached, skip {child_path}")
+                continue
+            self.remaining_size -= len(data)
+            accepted_children.append((child_path, data))
+        return accepted_children
+
+
+def analyze_file(
+    file_path,
+    minstrlen,
+    data=None,
+    depth=0,
+    recurse_max_size=None,
+    parent_path=None,
+):
+    """
+    分析单个样本，返回该样本产生的日志、分析结果和--recurse时提取出的子文件
+    """
+    log_collector = LogCollector()
+    log.addHandler(log_collector)
+    children = []
+    try:
+        file_analyzer = FileAnalyzer(
+            file_path, minstrlen, data, depth, recurse_max_size, parent_path
+        )
+        result = file_analyzer.run()
+        children = file_analyzer.children
+    except Exception as e:
+        log.error(f"error while processing {file_path}: {e}", exc_info=True)
+        result = {"file_path": str(file_path), "error": str(e)}
+    finally:
+        log.removeHandler(log_collector)
+    return log_collector.records, result, children
+
+
+def new_executor(jobs):
+    return ProcessPoolExecutor(
+        max_workers=jobs, initializer=init_worker, initargs=(dict(Config.conf),)
+    )
+
+
+def submit_task(executor, task_args):
+    """
+    进程池已经崩溃时submit会直接抛出BrokenProcessPool，这里改为返回一个失败的future，
+    统一在取结果时处理
+    """
+    try:
+        return executor.submit(analyze_file, *task_args)
+    except BrokenProcessPool as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+def analyze_file_isolated(*task_args):
+    """
+    子进程崩溃后，单独用一个新进程重新分析该样本，确认是否是它导致的崩溃
+    """
+    executor = new_executor(1)
+    try:
+        return executor.submit(analyze_file, *task_args).result()
+    except BrokenProcessPool:
+        return None
+    finally:
+        executor.shutdown()
+
+
+def run_inline(
+    file_path_list, minstrlen, result_writer=None, profile_aggregator=None
+):
+    """
+    在当前进程中逐个分析样本，--recurse提取出的子文件紧跟在所属样本之后分析
+    :param profile_aggregator: --profile时汇总各样本的profile
+    """
+    for file_path in file_path_list:
+        budget = RecurseBudget()
+        # 深度优先，保证输出顺序和run_batch相同
+        stack = [(file_path, None, 0, None)]
+        while stack:
+            file_path, data, depth, parent_path = stack.pop()
+            log.info("processing {}".format(file_path))
+            try:
+                file_analyzer = FileAnalyzer(
+                    file_path,
+                    minstrlen,
+                    data,
+                    depth,
+                    budget.remaining_size,
+                    parent_path,
+                )
+                result = file_analyzer.run()
+                children = budget.accept_children(file_analyzer.children)
+            except Exception as e:
+                log.error(f"error while processing {file_path}: {e}", exc_info=True)
+                result = {"file_path": str(file_path), "error": str(e)}
+                children = []
+            if result_writer:
+                result_writer.write(result)
+            if profile_aggregator and "profile" in result:
+                profile_aggregator.add(result["profile"])
+            log.info("-" * 80)
+            for child_path, child_data in reversed(children):
+                stack.append((child_path, child_data, depth + 1, file_path))
+
+
+def run_batch(
+    file_path_list, minstrlen, jobs, result_writer=None, profile_aggregator=None
+):
+    """
+    使用多进程分析多个样本，按file_path_list的顺序输出日志和结果
+    --recurse提取出的子文件也提交到进程池并行分析，紧跟在所属样本之后输出
+    单个样本异常或导致子进程崩溃，不影响其它样本
+    :param profile_aggregator: --profile时汇总各样本的profile
+    """
+    file_path_iter = iter(file_path_list)
+    # 限制提交的任务数，避免大量样本的结果堆积在内存中
+    max_pending = jobs * 2
+    # 元素为(task_args, future, budget)
+    pending = deque()
+    executor = new_executor(jobs)
+    try:
+        while True:
+            while len(pending) < max_pending:
+                file_path = next(file_path_iter, None)
+                if file_path is None:
+                    break
+                budget = RecurseBudget()
+                task_args = (file_path, minstrlen, None, 0, budget.remaining_size)
+                future = submit_task(executor, task_args)
+                pending.append((task_args, future, budget))
+            if not pending:
+                break
+
+            task_args, future, budget = pending.popleft()
+            try:
+                analyze_result = future.result()
+            except BrokenProcessPool:
+                executor.shutdown(wait=False)
+                executor = new_executor(jobs)
+                pending = deque(
+                    (tmp_args, submit_task(executor, tmp_args), tmp_budget)
+                    for tmp_args, _, tmp_budget in pending
+                )
+                analyze_result = analyze_file_isolated(*task_args)
+
+            file_path = task_args[0]
+            depth = task_args[3]
+            log.info("processing {}".format(file_path))
+            children = []
+            if analyze_result is None:
+                log.error(f"worker crashed while processing {file_path}")
+                result = {"file_path": str(file_path), "error": "worker crashed"}
+            else:
+                records, result, children = analyze_result
+                for record in records:
+                    log.handle(record)
+            if result_writer:
+                result_writer.write(result)
+            if profile_aggregator and "profile" in result:
+                profile_aggregator.add(result["profile"])
+            log.info("-" * 80)
+
+            # 子文件放在队列最前面，保证紧跟在所属样本之后输出
+            child_task_list = []
+            for child_path, data in budget.accept_children(children):
+                child_args = (
+                    child_path,
+                    minstrlen,
+                    data,
+                    depth + 1,
+                    budget.remaining_size,
+                    file_path,
+                )
+                child_future = submit_task(executor, child_args)
+                child_task_list.append((child_args, child_future, budget))
+            pending.extendleft(reversed(child_task_list))
+    finally:
+        executor.shutdown()
+
+
+# 当前url的LogCollector，crawler和DnsResolver的工作线程中执行的任务也会带上提交时的值
+current_log_collector = contextvars.ContextVar("current_log_collector", default=None)
+
+
+class ThreadLogRouter(logging.Handler):
+    """
+    多线程分析url时按url收集日志，之后按url顺序输出
+    正在分析url的线程(及其提交到crawler、DnsResolver线程池的任务)的日志交给该url的LogCollector，
+    其它日志直接输出
+    """
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.output_handlers = handlers
+
+    def emit(self, record):
+        log_collector = current_log_collector.get()
+        if log_collector is not None:
+            log_collector.handle(record)
+        else:
+            self.output(record)
+
+    def output(self, record):
+        for handler in self.output_handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def analyze_url(url, deep_flag):
+    """
+    在线程中分析单个url，返回该url产生的日志和分析结果
+    """
+    log_collector = LogCollector()
+    token = current_log_collector.set(log_collector)
+    try:
+        url_analyzer = UrlAnalyzer(url, deep_flag)
+        result = url_analyzer.run()
+    except Exception as e:
+        log.error(f"error while processing {url}: {e}", exc_info=True)
+        result = {"url": url, "error": str(e)}
+    finally:
+        current_log_collector.reset(token)
+    return log_collector.records, result
+
+
+def run_url_batch(url_list, deep_flag, jobs, result_writer=None):
+    """
+    使用多线程分析多个url，按url_list的顺序输出日志和结果
+    所有url共用一个连接池和域名解析缓存
+    """
+    UrlAnalyzer.init_crawler(pool_size=jobs * Config.crawl_concurrency)
+    UrlAnalyzer.init_resolver()
+
+    # 分析期间的日志先交给log_router，不直接输出
+    output_handlers = list(log.handlers)
+    if log.propagate:
+        output_handlers.extend(logging.getLogger().handlers)
+    log_router = ThreadLogRouter(output_handlers)
+    old_handlers = log.handlers
+    old_propagate = log.propagate
+    log.handlers = [log_router]
+    log.propagate = False
+
+    url_iter = iter(url_list)
+    # 限制提交的任务数，避免大量url的结果堆积在内存中
+    max_pending = jobs * 2
+    pending = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                while len(pending) < max_pending:
+                    url = next(url_iter, None)
+                    if url is None:
+                        break
+                    future = executor.submit(analyze_url, url, deep_flag)
+                    pending.append((url, future))
+                if not pending:
+                    break
+
+                url, future = pending.popleft()
+                records, result = future.result()
+                log.info("processing {}".format(url))
+                for record in records:
+                    log_router.output(record)
+                if result_writer:
+                    result_writer.write(result)
+                log.info("-" * 80)
+    finally:
+        log.handlers = old_handlers
+        log.propagate = old_propagate
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import time
+from hashlib import sha256
+
+from xanalyzer.config import Config
+from xanalyzer.yara_rules import get_yara_filepaths, get_yara_source_hash
+
+
+class ResultCache:
+    """
+    分析结果缓存，保存在sqlite中
+    key由样本sha256、xanalyzer版本、规则hash和影响结果的参数组成，任何一项变化都会重新分析
+    """
+
+    rule_hash = None
+    # 缓存内容的格式变化时修改，旧格式的缓存自动失效
+    result_format = 2
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or Config.cache_path
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        # 多进程同时写入时等待锁
+        self.conn = sqlite3.connect(self.cache_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, result TEXT, size INTEGER, "
+            "created REAL, accessed REAL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)"
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    @classmethod
+    def get_rule_hash(cls):
+        """
+        所有规则和数据文件的hash，规则更新后旧缓存自动失效
+        """
+        if cls.rule_hash:
+            return cls.rule_hash
+        rule_paths = [Config.peid_signature_path, Config.tools_info_path]
+        sha256_hash = sha256()
+        for rule_path in rule_paths:
+            sha256_hash.update(os.path.basename(rule_path).encode())
+            with open(rule_path, "rb") as f:
+                sha256_hash.update(f.read())
+        for rule_dir_list in [
+            [Config.packer_yara_rules_path],
+            Config.conf.get("yara_dir_list", []),
+        ]:
+            yara_filepaths = get_yara_filepaths(rule_dir_list)
+            sha256_hash.update(get_yara_source_hash(yara_filepaths).encode())
+        cls.rule_hash = sha256_hash.hexdigest()
+        return cls.rule_hash
+
+    def make_key(self, sha256_value, *params):
+        key_items = [
+            sha256_value,
+            Config.VERSION,
+            str(self.result_format),
+            self.get_rule_hash(),
+        ]
+        key_items.extend(str(param) for param in params)
+        return ":".join(key_items)
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT result FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        self.conn.execute(
+            "UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key)
+        )
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        result_str = json.dumps(result, default=str)
+        cur_time = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+            (key, result_str, len(result_str), cur_time, cur_time),
+        )
+        self.conn.commit()
+
+    def evict(self, max_size=None, max_age=None):
+        """
+        删除超过max_age秒未使用的结果，总大小超过max_size字节时再删除最久未使用的结果
+        """
+        if max_size is None:
+            max_size = Config.cache_max_size
+        if max_age is None:
+            max_age = Config.cache_max_age
+        self.conn.execute(
+            "DELETE FROM results WHERE accessed < ?", (time.time() - max_age,)
+        )
+        total_size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+        if total_size > max_size:
+            rows = self.conn.execute(
+                "SELECT key, size FROM results ORDER BY accessed"
+            ).fetchall()
+            evict_keys = []
+            for key, size in rows:
+                if total_size <= max_size:
+                    break
+                evict_keys.append((key,))
+                total_size -= size
+            self.conn.executemany("DELETE FROM results WHERE key = ?", evict_keys)
+        self.conn.commit()
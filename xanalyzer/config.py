@@ -10,12 +10,124 @@ class Config:
     packer_yara_rules_path = home_dir / "data" / "yara_rules" / "packers"
     tools_info_path = home_dir / "data" / "tools_info.json"
     VERSION = open(home_dir / "VERSION", "r").read().strip()
+    # 大于该值的文件使用mmap映射，不整体读入内存
+    mmap_threshold = 64 * 1024 * 1024
+    # libmagic默认最多检查7MB(MAGIC_PARAM_BYTES_MAX)，mmap的内容只取这么多传给libmagic
+    magic_bytes_max = 7 * 1024 * 1024
+    # 默认只把开头这么多字节交给libmagic，部分格式再读取到magic_bytes_max
+    magic_header_size = 64 * 1024
+    # 最多缓存的libmagic识别结果数
+    magic_cache_size = 4096
+    # PE资源只取开头部分判断类型，资源数量多时不会逐个复制整个资源
+    resource_magic_bytes_max = 64 * 1024
+    # 分块计算hash和提取字符串，内存占用和文件大小无关
+    stream_chunk_size = 16 * 1024 * 1024
+    # 块末尾未确定的内容保留到下一块，字符串跨块时不会被截断
+    stream_overlap = 4096
+    # 超过该长度的字符串不再等待后续块，直接输出，避免无限制占用内存
+    stream_max_str_len = 1024 * 1024
+    # 按固定窗口(互不重叠，不是滑动窗口)计算熵，可执行节区/段的熵不低于entropy_packed_threshold时认为可能加壳
+    entropy_window_size = 64 * 1024
+    entropy_packed_threshold = 7.0
+    # 小于该大小的节区/段熵值波动大，不参与加壳判断
+    entropy_min_range_size = 1024
+
+    # --triage时识别类型只用开头这么多字节，命中这些规则时才完整分析(可用--escalate修改)
+    triage_header_size = 64 * 1024
+    triage_escalate_rules = ["size_anomaly", "unknown_type"]
+
+    # 缓存目录，默认在用户目录下，可用set_cache_dir修改
+    cache_dir = Path.home() / ".xanalyzer"
+    # 编译后的yara规则缓存目录
+    yara_cache_dir = cache_dir / "yara_cache"
+    # PEiD特征索引缓存目录
+    peid_cache_dir = cache_dir / "peid_cache"
+    # 分析结果缓存，默认开启(--no-cache关闭)
+    cache_path = cache_dir / "cache.sqlite3"
+    cache_max_size = 512 * 1024 * 1024
+    cache_max_age = 30 * 24 * 3600
+
+    # url深度扫描时的并发数、超时(秒)、同一主机的请求间隔(秒)、最大深度和最大页面数
+    crawl_concurrency = 8
+    crawl_timeout = 10
+    crawl_host_interval = 0.05
+    crawl_max_depth = 10
+    crawl_max_pages = 1000
+    # 响应内容分块下载，最多下载crawl_max_body_size字节
+    crawl_chunk_size = 64 * 1024
+    crawl_max_body_size = 5 * 1024 * 1024
+    # --recurse时最多递归提取的层数、每个样本提取出的文件总大小和每个压缩包最多提取的文件数
+    recurse_max_depth = 3
+    recurse_max_total_size = 256 * 1024 * 1024
+    recurse_max_member_num = 1000
+
+    # 同时验证签名的线程数、最多缓存的证书链验证结果数
+    cert_verify_concurrency = 4
+    cert_chain_cache_size = 1024
+    # 批量分析url时同时分析的url数
+    url_batch_jobs = 8
+    # 域名解析结果缓存时间(秒)、最多缓存的域名数、并发解析数
+    dns_ttl = 300
+    dns_cache_size = 10000
+    dns_concurrency = 16
 
     conf = {}
 
     @classmethod
-    def init(cls, save_flag):
+    def set_cache_dir(cls, cache_dir):
+        """
+        修改缓存目录，yara规则、PEiD特征索引和分析结果缓存都保存在这里
+        """
+        cls.cache_dir = Path(cache_dir)
+        cls.yara_cache_dir = cls.cache_dir / "yara_cache"
+        cls.peid_cache_dir = cls.cache_dir / "peid_cache"
+        cls.cache_path = cls.cache_dir / "cache.sqlite3"
+
+    @classmethod
+    def init(
+        cls,
+        save_flag,
+        cache_flag=False,
+        yara_dir_list=None,
+        deep_flag=False,
+        timing_flag=False,
+        recurse_flag=False,
+        profile_flag=False,
+        only_stages=None,
+        skip_stages=None,
+        max_stage_cost=None,
+        triage_flag=False,
+        triage_escalate_rules=None,
+    ):
         cls.conf["save_flag"] = save_flag
+        cls.conf["deep_flag"] = deep_flag
+        # 输出各项扫描的耗时
+        cls.conf["timing_flag"] = timing_flag
+        # 递归分析压缩包/容器中的文件
+        cls.conf["recurse_flag"] = recurse_flag
+        # 输出各阶段的耗时、处理的字节数和进程的内存峰值
+        cls.conf["profile_flag"] = profile_flag
+        # 只执行/跳过的分析阶段，以及执行的阶段的最高耗时级别
+        cls.conf["only_stages"] = only_stages or []
+        cls.conf["skip_stages"] = skip_stages or []
+        cls.conf["max_stage_cost"] = max_stage_cost
+        # 快速分诊，命中升级规则的样本才完整分析
+        cls.conf["triage_flag"] = triage_flag
+        cls.conf["triage_escalate_rules"] = (
+            triage_escalate_rules or cls.triage_escalate_rules
+        )
+        # 用户额外指定的yara规则目录
+        cls.conf["yara_dir_list"] = yara_dir_list or []
+        # 保存数据时需要重新生成数据文件，统计耗时需要实际分析，都不使用缓存
+        # 只执行部分阶段时结果不完整，也不使用缓存
+        stage_select_flag = bool(only_stages or skip_stages or max_stage_cost)
+        cls.conf["cache_flag"] = (
+            cache_flag
+            and not save_flag
+            and not timing_flag
+            and not profile_flag
+            and not stage_select_flag
+        )
         if save_flag:
             cur_time = time.strftime("%Y%m%d_%H%M%S")
             analyze_path = f"xanalyzer_{cur_time}"
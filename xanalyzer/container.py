@@ -0,0 +1,162 @@
+import gzip
+import tarfile
+from pathlib import PurePosixPath
+from zipfile import ZipFile
+
+from xanalyzer.utils import log
+
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+try:
+    import rarfile
+except ImportError:
+    rarfile = None
+
+
+class ContainerExtractor:
+    """
+    在内存中提取压缩包/容器内的文件，供--recurse继续分析，不写入磁盘
+    每个文件都边解压边检查大小，超过剩余额度就放弃，防止解压炸弹
+    """
+
+    def __init__(self, file_content, file_name, max_total_size, max_member_num):
+        self.file_content = file_content
+        self.file_name = file_name
+        # 所有提取出的文件的总大小上限
+        self.remaining_size = max_total_size
+        self.max_member_num = max_member_num
+        self.member_num = 0
+        self.limit_flag = False
+
+    @staticmethod
+    def get_container_type(data):
+        """
+        根据文件头判断容器类型，不依赖libmagic的描述(不同版本描述不同)
+        """
+        if data[:4] in [b"PK\x03\x04", b"PK\x05\x06"]:
+            return "zip"
+        if data[:2] == b"\x1f\x8b":
+            return "gzip"
+        if data[257:262] == b"ustar":
+            return "tar"
+        if data[:6] == b"7z\xbc\xaf\x27\x1c":
+            return "7z"
+        if data[:7] == b"Rar!\x1a\x07\x00" or data[:8] == b"Rar!\x1a\x07\x01\x00":
+            return "rar"
+        return None
+
+    def read_member(self, the_file, member_name):
+        """
+        读取一个文件，最多读取剩余额度+1字节，超过额度返回None
+        """
+        if self.member_num >= self.max_member_num:
+            self.set_limit_flag(f"member num limit {self.max_member_num} reached")
+            return None
+        data = the_file.read(self.remaining_size + 1)
+        if len(data) > self.remaining_size:
+            self.set_limit_flag(f"total size limit reached at {member_name}")
+            return None
+        self.member_num += 1
+        self.remaining_size -= len(data)
+        return data
+
+    def set_limit_flag(self, reason):
+        if not self.limit_flag:
+            log.warning(f"stop extracting {self.file_name}: {reason}")
+        self.limit_flag = True
+
+    def iter_members(self):
+        """
+        :return: 迭代器，元素为(member_name, data)
+        """
+        container_type = self.get_container_type(self.file_content.data[:512])
+        if not container_type:
+            return
+        iter_func = getattr(self, f"iter_{container_type}_members")
+        try:
+            yield from iter_func()
+        except Exception as e:
+            # 样本中的压缩包经常是损坏或故意构造的
+            log.warning(f"failed to extract {self.file_name}: {e}")
+
+    def iter_zip_members(self):
+        with self.file_content.stream() as the_file, ZipFile(the_file) as the_zip:
+            for zip_info in the_zip.infolist():
+                if self.limit_flag:
+                    return
+                if zip_info.is_dir():
+                    continue
+                if zip_info.flag_bits & 0x1:
+                    log.warning(f"encrypted member skipped: {zip_info.filename}")
+                    continue
+                with the_zip.open(zip_info) as member_file:
+                    data = self.read_member(member_file, zip_info.filename)
+                if data is not None:
+                    yield zip_info.filename, data
+
+    def iter_gzip_members(self):
+        member_name = PurePosixPath(self.file_name).name
+        if member_name.endswith((".gz", ".gz_")):
+            member_name = member_name.rsplit(".gz", 1)[0]
+        elif member_name.endswith((".tgz", ".tgz_")):
+            member_name = member_name.rsplit(".tgz", 1)[0] + ".tar"
+        else:
+            member_name = f"{member_name}.gunzip"
+        with self.file_content.stream() as the_file, gzip.GzipFile(
+            fileobj=the_file
+        ) as gzip_file:
+            data = self.read_member(gzip_file, member_name)
+        if data is not None:
+            yield member_name, data
+
+    def iter_tar_members(self):
+        with self.file_content.stream() as the_file, tarfile.open(
+            fileobj=the_file, mode="r:"
+        ) as the_tar:
+            for tar_info in the_tar:
+                if self.limit_flag:
+                    return
+                if not tar_info.isfile():
+                    continue
+                member_file = the_tar.extractfile(tar_info)
+                data = self.read_member(member_file, tar_info.name)
+                if data is not None:
+                    yield tar_info.name, data
+
+    def iter_7z_members(self):
+        if not py7zr:
+            log.warning("py7zr is not installed, can not extract 7z")
+            return
+        with self.file_content.stream() as the_file, py7zr.SevenZipFile(
+            the_file
+        ) as the_7z:
+            # py7zr只能一次解压到内存，先用声明的大小检查额度
+            if sum(info.uncompressed for info in the_7z.list()) > self.remaining_size:
+                self.set_limit_flag("total size limit reached")
+                return
+            for member_name, member_file in the_7z.readall().items():
+                if self.limit_flag:
+                    return
+                data = self.read_member(member_file, member_name)
+                if data is not None:
+                    yield member_name, data
+
+    def iter_rar_members(self):
+        if not rarfile:
+            log.warning("rarfile is not installed, can not extract rar")
+            return
+        with self.file_content.stream() as the_file, rarfile.RarFile(
+            the_file
+        ) as the_rar:
+            for rar_info in the_rar.infolist():
+                if self.limit_flag:
+                    return
+                if rar_info.is_dir():
+                    continue
+                with the_rar.open(rar_info) as member_file:
+                    data = self.read_member(member_file, rar_info.filename)
+                if data is not None:
+                    yield rar_info.filename, data
@@ -0,0 +1,251 @@
+import contextvars
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlparse, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from xanalyzer.config import Config
+from xanalyzer.file_content import iter_regex_chunks
+from xanalyzer.utils import log
+
+
+def normalize_url(url):
+    """
+    规范化url用于去重
+    scheme和主机名转小写，去掉默认端口、片段(#后面的部分)和末尾的"/"
+    """
+    parsed_url = urlsplit(url)
+    scheme = parsed_url.scheme.lower()
+    netloc = parsed_url.netloc
+    if parsed_url.hostname:
+        netloc = parsed_url.hostname
+        if ":" in netloc:
+            netloc = f"[{netloc}]"
+        try:
+            port = parsed_url.port
+        except ValueError:
+            port = None
+        if port and (scheme, port) not in [("http", 80), ("https", 443)]:
+            netloc += f":{port}"
+        userinfo = parsed_url.netloc.rpartition("@")[0]
+        if userinfo:
+            netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parsed_url.path, parsed_url.query, "")).rstrip(
+        "/"
+    )
+
+
+class CrawlFrontier:
+    """
+    待请求的链接队列
+    seen记录所有加入过的链接(规范化后)，判断是否重复是O(1)，queue保持加入顺序
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.queue = deque()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __contains__(self, url):
+        return normalize_url(url) in self.seen
+
+    def add(self, url, depth):
+        """
+        :return: 是否是新链接
+        """
+        url = normalize_url(url)
+        if url in self.seen:
+            return False
+        self.seen.add(url)
+        self.queue.append((url, depth))
+        return True
+
+    def pop_level(self):
+        """
+        取出队列开头同一深度的所有链接
+        :return: depth, url_list
+        """
+        depth = self.queue[0][1]
+        url_list = []
+        while self.queue and self.queue[0][1] == depth:
+            url_list.append(self.queue.popleft()[0])
+        return depth, url_list
+
+
+class LinkExtractor:
+    """
+    单次扫描提取链接(href/src/action的属性值)和可能的子域名(https?://后面的主机名)
+    可以直接处理分块的内容，边下载边提取
+    """
+
+    link_re = re.compile(
+        rb"(?:href|src|action)\s?=\s?(?:\"(?P<dq_link>.*?)\"|'(?P<sq_link>.*?)')"
+        rb"|https?://(?P<subdomain>(?:[-a-zA-Z0-9]+\.){2,}[a-zA-Z]+)"
+    )
+    subdomain_re = re.compile(rb"https?://((?:[-a-zA-Z0-9]+\.){2,}[a-zA-Z]+)")
+    # 块末尾还没有结束引号的属性值，其中的url不能先按子域名匹配，要等后续内容
+    unterminated_link_re = re.compile(
+        rb"(?:href|src|action)\s?=\s?(?:\"[^\"\n]*|'[^'\n]*)\Z"
+    )
+
+    @classmethod
+    def extract(cls, chunk_iter):
+        """
+        :return: half_links, possible_subdomains，都是按出现顺序排列的bytes列表
+        """
+        half_links = []
+        possible_subdomains = []
+        for _, match in iter_regex_chunks(
+            cls.link_re, chunk_iter, cls.unterminated_link_re
+        ):
+            if match.lastgroup == "subdomain":
+                possible_subdomains.append(match.group("subdomain"))
+                continue
+            half_link = match.group(match.lastgroup)
+            half_links.append(half_link)
+            # 属性值中的url也可能包含子域名
+            possible_subdomains.extend(cls.subdomain_re.findall(half_link))
+        return half_links, possible_subdomains
+
+
+class Crawler:
+    """
+    并发抓取页面
+    所有请求共用一个Session，复用连接；同一主机的请求之间至少间隔host_interval秒
+    按层(深度)抓取，每层的页面并发请求，再按请求顺序交给调用方处理，
+    得到的链接顺序和逐个请求时相同
+    """
+
+    def __init__(
+        self,
+        headers=None,
+        concurrency=None,
+        timeout=None,
+        host_interval=None,
+        max_depth=None,
+        max_pages=None,
+        max_body_size=None,
+        pool_size=None,
+    ):
+        self.headers = headers or {}
+        self.concurrency = concurrency or Config.crawl_concurrency
+        self.timeout = timeout or Config.crawl_timeout
+        if host_interval is None:
+            host_interval = Config.crawl_host_interval
+        self.host_interval = host_interval
+        if max_depth is None:
+            max_depth = Config.crawl_max_depth
+        self.max_depth = max_depth
+        self.max_pages = max_pages or Config.crawl_max_pages
+        self.max_body_size = max_body_size or Config.crawl_max_body_size
+
+        self.session = requests.Session()
+        # 多个线程同时使用时，pool_size应不小于同时请求的数量
+        pool_size = pool_size or self.concurrency
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.host_lock = threading.Lock()
+        # 每个主机下一次可以发起请求的时间
+        self.host_next_time = {}
+
+    def close(self):
+        self.session.close()
+
+    def wait_host(self, url):
+        """
+        限制同一主机的请求频率
+        """
+        if not self.host_interval:
+            return
+        host = urlparse(url).netloc
+        with self.host_lock:
+            cur_time = time.monotonic()
+            request_time = max(cur_time, self.host_next_time.get(host, 0))
+            self.host_next_time[host] = request_time + self.host_interval
+        if request_time > cur_time:
+            time.sleep(request_time - cur_time)
+
+    def get(self, url, **kwargs):
+        self.wait_host(url)
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def iter_body(self, res):
+        """
+        分块读取响应内容，超过max_body_size的部分不再下载
+        """
+        body_size = 0
+        for chunk in res.iter_content(Config.crawl_chunk_size):
+            remaining_size = self.max_body_size - body_size
+            if len(chunk) > remaining_size:
+                if remaining_size:
+                    yield chunk[:remaining_size]
+                log.warning(
+                    f"response body is larger than {self.max_body_size} bytes, truncated: {res.url}"
+                )
+                return
+            body_size += len(chunk)
+            yield chunk
+
+    def fetch(self, url, parse_response=None):
+        """
+        请求一个页面，异常作为结果返回，交给调用方处理
+        指定parse_response时流式下载，在工作线程中边下载边解析
+        :return: (res, parsed)
+        """
+        try:
+            if not parse_response:
+                return self.get(url, headers=self.headers), None
+            with self.get(url, headers=self.headers, stream=True) as res:
+                return res, parse_response(res)
+        except Exception as e:
+            return e, None
+
+    def crawl(self, start_url_list, handle_response, parse_response=None):
+        """
+        从start_url_list开始抓取
+        :param parse_response: parse_response(res)，在工作线程中读取并解析响应内容，
+            可以使用iter_body分块读取
+        :param handle_response: handle_response(url, res, parsed)，按请求顺序调用，
+            res是响应或异常，parsed是parse_response的返回值，
+            返回需要继续请求的链接列表，重复的链接由CrawlFrontier去掉
+        """
+        fetch = partial(self.fetch, parse_response=parse_response)
+        frontier = CrawlFrontier()
+        for url in start_url_list:
+            frontier.add(url, 0)
+        page_num = 0
+        max_depth_flag = False
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while frontier:
+                depth, url_list = frontier.pop_level()
+                remaining_page_num = self.max_pages - page_num
+                if len(url_list) > remaining_page_num:
+                    log.warning(f"reach max pages: {self.max_pages}")
+                    url_list = url_list[:remaining_page_num]
+                    frontier.queue.clear()
+                page_num += len(url_list)
+                # 在提交时的上下文中执行，批量分析url时日志归属正确的url
+                future_list = [
+                    executor.submit(contextvars.copy_context().run, fetch, url)
+                    for url in url_list
+                ]
+                for url, future in zip(url_list, future_list):
+                    res, parsed = future.result()
+                    for new_url in handle_response(url, res, parsed):
+                        if depth < self.max_depth:
+                            frontier.add(new_url, depth + 1)
+                        elif new_url not in frontier:
+                            max_depth_flag = True
+        if max_depth_flag:
+            log.warning(f"reach max depth: {self.max_depth}")
@@ -0,0 +1,203 @@
+import numpy
+
+from xanalyzer.config import Config
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def calc_entropy(counts):
+    """
+    香农熵，范围0~8
+    :param counts: 字节直方图，二维时每行是一个直方图，返回每行的熵
+    """
+    totals = counts.sum(axis=-1, keepdims=True)
+    probabilities = numpy.divide(
+        counts, totals, out=numpy.zeros(counts.shape), where=totals > 0
+    )
+    log_probabilities = numpy.log2(
+        probabilities,
+        out=numpy.zeros(counts.shape),
+        where=probabilities > 0,
+    )
+    return -(probabilities * log_probabilities).sum(axis=-1)
+
+
+def count_windows_bincount(chunk_array, window_size):
+    """
+    :return: 二维数组，每行是一个窗口的字节直方图
+    """
+    window_num = -(-len(chunk_array) // window_size)
+    window_counts = numpy.empty((window_num, 256), dtype=numpy.int64)
+    for i in range(window_num):
+        window_counts[i] = numpy.bincount(
+            chunk_array[i * window_size : (i + 1) * window_size], minlength=256
+        )
+    return window_counts
+
+
+def count_windows_loop(chunk_array, window_size):
+    """
+    结果和count_windows_bincount相同，逐字节计数，只在用numba编译后使用
+    numpy.bincount要先把每个字节转换为int64，编译后直接计数快约2倍
+    连续相同的字节会反复累加同一个计数，分成4组交替计数，最后再相加
+    """
+    window_num = (len(chunk_array) + window_size - 1) // window_size
+    window_counts = numpy.zeros((window_num, 256), dtype=numpy.int64)
+    sub_counts = numpy.zeros((4, 256), dtype=numpy.int64)
+    for window_index in range(window_num):
+        start = window_index * window_size
+        end = min(len(chunk_array), start + window_size)
+        sub_counts[:] = 0
+        i = start
+        while i + 4 <= end:
+            sub_counts[0, chunk_array[i]] += 1
+            sub_counts[1, chunk_array[i + 1]] += 1
+            sub_counts[2, chunk_array[i + 2]] += 1
+            sub_counts[3, chunk_array[i + 3]] += 1
+            i += 4
+        while i < end:
+            sub_counts[0, chunk_array[i]] += 1
+            i += 1
+        window_counts[window_index] = sub_counts.sum(axis=0)
+    return window_counts
+
+
+# 安装了numba时使用编译后的计数，编译结果缓存在__pycache__中
+if numba is not None:
+    count_windows = numba.njit(nogil=True, cache=True)(count_windows_loop)
+else:
+    count_windows = count_windows_bincount
+
+
+class ByteHistogram:
+    """
+    字节直方图，使用numpy.bincount统计
+    """
+
+    def __init__(self):
+        self.counts = numpy.zeros(256, dtype=numpy.int64)
+        self.total = 0
+
+    def update(self, chunk):
+        """
+        :param chunk: bytes、memoryview或numpy.uint8数组
+        """
+        if not len(chunk):
+            return
+        if not isinstance(chunk, numpy.ndarray):
+            chunk = numpy.frombuffer(chunk, dtype=numpy.uint8)
+        self.counts += numpy.bincount(chunk, minlength=256)
+        self.total += len(chunk)
+
+    def merge(self, other):
+        self.add_counts(other.counts)
+
+    def add_counts(self, counts):
+        self.counts += counts
+        self.total += int(counts.sum())
+
+    def entropy(self):
+        return float(calc_entropy(self.counts))
+
+
+class EntropyScanner:
+    """
+    单次遍历样本内容，同时计算整个文件、各区间(PE节区/ELF段)和固定窗口的熵
+    窗口是固定的、互不重叠的: [0, window_size), [window_size, 2 * window_size)...，
+    不是逐字节滑动的窗口，最后一个窗口可能不满window_size
+    每个字节只统计一次，整个文件和各区间的直方图由窗口的直方图相加得到
+    """
+
+    def __init__(self, file_content, range_list=None, window_size=None):
+        """
+        :param range_list: [(name, start, end), ...]，文件中的区间
+        """
+        self.file_content = file_content
+        self.range_list = range_list or []
+        self.window_size = window_size or Config.entropy_window_size
+
+    def iter_chunks(self):
+        """
+        :return: 迭代器，元素为(offset, chunk)，块大小是窗口大小的整数倍
+        """
+        chunk_size = max(
+            Config.stream_chunk_size // self.window_size * self.window_size,
+            self.window_size,
+        )
+        offset = 0
+        for chunk in self.file_content.iter_chunks(chunk_size):
+            yield offset, chunk
+            offset += len(chunk)
+
+    def run(self):
+        """
+        :return: {"file": 熵, "ranges": [...], "windows": {...}}
+        """
+        file_histogram = ByteHistogram()
+        range_histogram_list = [ByteHistogram() for _ in self.range_list]
+        window_entropy_list = []
+        for chunk_offset, chunk in self.iter_chunks():
+            chunk_array = numpy.frombuffer(chunk, dtype=numpy.uint8)
+            # 一块中所有窗口的直方图放在一个二维数组中，熵和求和都整块计算
+            window_counts = count_windows(chunk_array, self.window_size)
+            window_entropy_list.append(calc_entropy(window_counts))
+            file_histogram.add_counts(window_counts.sum(axis=0))
+
+            for (_, start, end), range_histogram in zip(
+                self.range_list, range_histogram_list
+            ):
+                start = max(start, chunk_offset) - chunk_offset
+                end = min(end, chunk_offset + len(chunk_array)) - chunk_offset
+                if start >= end:
+                    continue
+                # 完全在区间内的窗口直接累加窗口的直方图，只有区间边界处的窗口需要再统计
+                first_window = -(-start // self.window_size)
+                last_window = end // self.window_size
+                if first_window >= last_window:
+                    range_histogram.update(chunk_array[start:end])
+                    continue
+                range_histogram.update(
+                    chunk_array[start : first_window * self.window_size]
+                )
+                range_histogram.add_counts(
+                    window_counts[first_window:last_window].sum(axis=0)
+                )
+                range_histogram.update(
+                    chunk_array[last_window * self.window_size : end]
+                )
+
+        range_result_list = []
+        for (name, start, end), range_histogram in zip(
+            self.range_list, range_histogram_list
+        ):
+            range_result_list.append(
+                {
+                    "name": name,
+                    "offset": start,
+                    "size": range_histogram.total,
+                    "entropy": round(range_histogram.entropy(), 4),
+                }
+            )
+        window_entropies = numpy.concatenate(window_entropy_list or [numpy.zeros(0)])
+        high_entropy_window_num = int(
+            (window_entropies >= Config.entropy_packed_threshold).sum()
+        )
+        if len(window_entropies):
+            max_entropy = float(window_entropies.max())
+            min_entropy = float(window_entropies.min())
+        else:
+            max_entropy = min_entropy = 0.0
+        return {
+            "file": round(file_histogram.entropy(), 4),
+            "ranges": range_result_list,
+            "windows": {
+                "size": self.window_size,
+                "num": len(window_entropies),
+                "max": round(max_entropy, 4),
+                "min": round(min_entropy, 4),
+                "high_entropy_num": high_entropy_window_num,
+            },
+        }
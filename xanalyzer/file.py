@@ -1,73 +1,152 @@
 import io
 import json
+import mmap
 import os
-import re
 from hashlib import md5, sha256
 from pathlib import Path
 from zipfile import ZipFile
 
-import magic
-import yara
-
+from xanalyzer.cache import ResultCache
 from xanalyzer.config import Config
+from xanalyzer.container import ContainerExtractor
+from xanalyzer.file_content import FileContent
 from xanalyzer.file_process.elf import ElfAnalyzer
 from xanalyzer.file_process.pe import PeAnalyzer
-from xanalyzer.utils import log
+from xanalyzer.magic_detector import MagicDetector
+from xanalyzer.profiler import StageProfiler
+from xanalyzer.stages import COST_HIGH, COST_MEDIUM, Stage, StageRegistry
+from xanalyzer.str_scanner import StrScanner
+from xanalyzer.triage import Triage
+from xanalyzer.utils import LogCollector, log
+from xanalyzer.yara_rules import load_yara_rules
 
 
 class FileAnalyzer:
     packer_yara_rules = None
-
-    def __init__(self, file_path, minstrlen=4):
+    user_yara_rules = None
+    result_cache = None
+
+    def __init__(
+        self,
+        file_path,
+        minstrlen=4,
+        data=None,
+        depth=0,
+        recurse_max_size=None,
+        parent_path=None,
+    ):
+        """
+        :param data: 从压缩包、PE资源等提取出的内容，这时file_path只用于显示和命名
+        :param depth: 嵌套的层数，样本本身为0
+        :param recurse_max_size: --recurse时最多提取的内容大小
+        :param parent_path: 子文件所属文件的file_path
+        """
         self.file_path = file_path
-        self.file_size = os.path.getsize(self.file_path)
-        the_file = open(self.file_path, "rb")
-        the_content = the_file.read()
-        the_file.close()
-        self.file_type, self.possible_extension_names = self.guess_type_and_ext(
-            the_content
-        )
-
-        minstrlen_bytes = str(minstrlen).encode()
-        self.str_re = re.compile(rb"[\x20-\x7e]{"+minstrlen_bytes+rb",}")
-        self.wide_str_re = re.compile(rb"(?:[\x20-\x7e]\x00){"+minstrlen_bytes+rb",}")
+        self.parent_path = parent_path
+        # 样本只读取一次，后续各阶段共享
+        self.file_content = FileContent(self.file_path, data)
+        self.depth = depth
+        if recurse_max_size is None:
+            recurse_max_size = Config.recurse_max_total_size
+        self.recurse_max_size = recurse_max_size
+        # --recurse时提取出的文件，[(child_path, data), ...]，由调用方继续分析
+        self.children = []
+        self.file_size = self.file_content.size
+        # 文件类型用到时才识别，命中缓存时不需要调用libmagic
+        self._file_type = None
+        self._possible_extension_names = None
+
+        self.str_scanner = StrScanner(minstrlen)
+        # get_all_strs()的结果，几个get_*_strs共用一次扫描
+        self.all_strs = None
 
         self.packer_list = []
         self.pe_resource_type_list = []
         self.pe_versioninfo = []
+        # analyze()中创建，--recurse提取内嵌PE时复用
+        self.pe_analyzer = None
+        # 结构化的分析结果，run()返回
+        self.result = {}
+        # 各阶段的耗时，--profile时输出
+        self.profiler = StageProfiler()
+        # 要执行的阶段的完整名称，None表示全部执行
+        self.selected_stages = self.get_selected_stages()
 
         self.init_packer_yara_rules()
 
+    @property
+    def file_type(self):
+        if self._file_type is None:
+            self.init_file_type()
+        return self._file_type
+
+    @file_type.setter
+    def file_type(self, file_type):
+        self._file_type = file_type
+
+    @property
+    def possible_extension_names(self):
+        if self._possible_extension_names is None:
+            self.init_file_type()
+        return self._possible_extension_names
+
+    @possible_extension_names.setter
+    def possible_extension_names(self, possible_extension_names):
+        self._possible_extension_names = possible_extension_names
+
+    def init_file_type(self):
+        with self.profiler.stage("file_type"):
+            self._file_type, self._possible_extension_names = self.guess_type_and_ext(
+                self.file_content.data
+            )
+
+    @classmethod
+    def init_result_cache(cls):
+        if cls.result_cache:
+            return
+        cls.result_cache = ResultCache()
+        cls.result_cache.evict()
+
     @classmethod
     def init_packer_yara_rules(cls):
         if cls.packer_yara_rules:
             return
-        yara_filenames = os.listdir(Config.packer_yara_rules_path)
-        yara_dict = {}
-        for yara_filename in yara_filenames:
-            yara_path = os.path.join(Config.packer_yara_rules_path, yara_filename)
-            yara_dict[yara_filename] = yara_path
-        cls.packer_yara_rules = yara.compile(filepaths=yara_dict)
+        cls.packer_yara_rules = load_yara_rules([Config.packer_yara_rules_path])
+
+    @classmethod
+    def init_user_yara_rules(cls):
+        if cls.user_yara_rules or not Config.conf["yara_dir_list"]:
+            return
+        cls.user_yara_rules = load_yara_rules(Config.conf["yara_dir_list"])
 
     def packer_yara_match(self):
-        the_file = open(self.file_path, "rb")
-        the_content = the_file.read()
-        the_file.close()
-        return self.packer_yara_rules.match(data=the_content)
+        return self.packer_yara_rules.match(data=self.file_content.data)
 
-    def guess_type_and_ext(self, the_content):
+    def user_yara_match(self):
+        self.init_user_yara_rules()
+        if not self.user_yara_rules:
+            return []
+        return self.user_yara_rules.match(data=self.file_content.data)
+
+    def guess_type_and_ext(self, the_content, magic_bytes_max=None):
         """
         猜测文件类型和扩展名
+        :param the_content: bytes、mmap或memoryview
+        :param magic_bytes_max: 最多把开头这么多字节交给libmagic
         :return: file_type, possible_extension_names
         """
-        # magic.from_file不能通过中文路径读取文件，暂时使用magic.from_buffer
-        the_file_type = magic.from_buffer(the_content)
+        # magic.from_file不能通过中文路径读取文件，使用from_buffer
+        the_file_type = MagicDetector.from_buffer(the_content, magic_bytes_max)
         the_ext = []
         if the_file_type.startswith("Zip archive data"):
-            the_file = io.BytesIO(the_content)
+            if isinstance(the_content, mmap.mmap):
+                the_file = the_content
+            else:
+                the_file = io.BytesIO(the_content)
             the_zip = ZipFile(the_file)
             zip_namelist = the_zip.namelist()
             the_zip.close()
+            the_file.seek(0)
             if "AndroidManifest.xml" in zip_namelist:
                 the_file_type = f"{the_file_type}, APK(Android application package)"
             elif "[Content_Types].xml" in zip_namelist:
@@ -79,19 +158,22 @@ class FileAnalyzer:
                     the_file_type = "Microsoft PowerPoint 2007+"
 
         if the_file_type.startswith("Composite Document File V2 Document"):
+            if isinstance(the_content, memoryview):
+                # memoryview没有find方法
+                the_content = the_content.tobytes()
             if "MSI Installer" in the_file_type:
                 the_ext = [".msi"]
-            elif "WordDocument".encode("utf_16_le") in the_content:
+            elif the_content.find("WordDocument".encode("utf_16_le")) != -1:
                 if "Name of Creating Application: WPS" in the_file_type:
                     the_ext = [".doc", ".wps"]
                 else:
                     the_ext = [".doc"]
-            elif "Workbook".encode("utf_16_le") in the_content:
+            elif the_content.find("Workbook".encode("utf_16_le")) != -1:
                 if "Name of Creating Application: WPS" in the_file_type:
                     the_ext = [".xls", ".et"]
                 else:
                     the_ext = [".xls"]
-            elif "PowerPoint Document".encode("utf_16_le") in the_content:
+            elif the_content.find("PowerPoint Document".encode("utf_16_le")) != -1:
                 if "Name of Creating Application: WPS" in the_file_type:
                     the_ext = [".ppt", ".dps"]
                 else:
@@ -200,59 +282,49 @@ class FileAnalyzer:
         return f"{formatted_size} {tmp_unit}{bytes_size}"
 
     def get_md5_sha256(self):
-        the_file = open(self.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
-        md5_value = md5(file_content).hexdigest()
-        sha256_value = sha256(file_content).hexdigest()
-        return (md5_value, sha256_value)
+        # 分块计算，超大文件也不会占用过多内存
+        md5_hash = md5()
+        sha256_hash = sha256()
+        for chunk in self.file_content.iter_chunks():
+            md5_hash.update(chunk)
+            sha256_hash.update(chunk)
+        return (md5_hash.hexdigest(), sha256_hash.hexdigest())
+
+    def iter_all_strs(self):
+        """
+        单次扫描得到所有类型的字符串
+        :return: 迭代器，元素为(str_type, offset, the_str)
+        """
+        return self.str_scanner.scan(self.file_content)
+
+    def get_all_strs(self):
+        """
+        各类型的字符串都按在文件中的偏移排列，
+        special_str中base64和hex字符串交错出现，不是先base64后hex
+        """
+        if self.all_strs is None:
+            all_strs = {
+                "str": [],
+                "wide_str": [],
+                "special_str": [],
+                "special_wide_str": [],
+            }
+            for str_type, _, the_str in self.iter_all_strs():
+                all_strs[str_type].append(the_str)
+            self.all_strs = all_strs
+        return self.all_strs
 
     def get_strs(self):
-        the_file = open(self.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
-        all_strs = re.findall(self.str_re, file_content)
-        return all_strs
+        return self.get_all_strs()["str"]
 
     def get_wide_strs(self):
-        the_file = open(self.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
-        all_strs = re.findall(self.wide_str_re, file_content)
-        return all_strs
+        return self.get_all_strs()["wide_str"]
 
     def get_special_strs(self):
-        the_file = open(self.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
-        tmp_base64_strs = re.findall(rb"[A-Za-z0-9+/]{6,}={1,2}", file_content)
-        possible_base64_strs = []
-        for tmp_base64_str in tmp_base64_strs:
-            # 过滤hex字符串
-            if re.match(rb"(?:[A-Fa-f0-9]{2}){4,}", tmp_base64_str):
-                continue
-            possible_base64_strs.append(tmp_base64_str)
-        hex_strs = re.findall(rb"(?:[A-Fa-f0-9]{2}){4,}", file_content)
-        special_strs = possible_base64_strs + hex_strs
-        return special_strs
+        return self.get_all_strs()["special_str"]
 
     def get_special_wide_strs(self):
-        the_file = open(self.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
-        tmp_base64_strs = re.findall(
-            rb"(?:[A-Za-z0-9+/]\x00){6,}(?:=\x00){1,2}",
-            file_content,
-        )
-        possible_base64_strs = []
-        for tmp_base64_str in tmp_base64_strs:
-            # 过滤hex字符串
-            if re.match(rb"(?:(?:[A-Fa-f0-9]\x00){2}){4,}", tmp_base64_str):
-                continue
-            possible_base64_strs.append(tmp_base64_str)
-        hex_strs = re.findall(rb"(?:(?:[A-Fa-f0-9]\x00){2}){4,}", file_content)
-        special_wide_strs = possible_base64_strs + hex_strs
-        return special_wide_strs
+        return self.get_all_strs()["special_wide_str"]
 
     def get_tool_recommendations(self):
         recommended_tool_names = []
@@ -334,86 +406,178 @@ class FileAnalyzer:
             )
         return recommended_tool_info_list
 
+    def save_strs(self, all_strs, output_dict):
+        """
+        边提取边写入文件，不在内存中保存所有字符串
+        :param all_strs: 迭代器，元素为(str_type, offset, the_str)
+        :param output_dict: {str_type: [(文件名后缀, 转换函数), ...]}，转换函数返回写入文件的内容
+        :return: str_num_dict, saved_file_name_dict
+        """
+        str_num_dict = {str_type: 0 for str_type in output_dict}
+        saved_file_name_dict = {str_type: [] for str_type in output_dict}
+        if not Config.conf["save_flag"]:
+            for str_type, _, _ in all_strs:
+                str_num_dict[str_type] += 1
+            return str_num_dict, saved_file_name_dict
+
+        file_dict = {}
+        try:
+            for str_type, output_list in output_dict.items():
+                file_dict[str_type] = []
+                for file_suffix, convert in output_list:
+                    file_name = Path(self.file_path).name + file_suffix
+                    file_path = os.path.join(Config.conf["analyze_data_path"], file_name)
+                    saved_file_name_dict[str_type].append(file_name)
+                    file_dict[str_type].append(
+                        (file_path, open(file_path, "wb"), convert)
+                    )
+
+            for str_type, _, the_str in all_strs:
+                str_num_dict[str_type] += 1
+                for _, the_file, convert in file_dict[str_type]:
+                    the_file.write(convert(the_str))
+        finally:
+            for file_list in file_dict.values():
+                for _, the_file, _ in file_list:
+                    the_file.close()
+
+        # 没有提取到的字符串类型不保留空文件
+        for str_type, str_num in str_num_dict.items():
+            if str_num:
+                continue
+            for file_path, _, _ in file_dict[str_type]:
+                os.remove(file_path)
+            saved_file_name_dict[str_type] = []
+        return str_num_dict, saved_file_name_dict
+
     def str_scan(self):
-        all_strs = self.get_strs()
-        if all_strs:
-            log.info(f"str num: {len(all_strs)}")
-            if Config.conf["save_flag"]:
-                str_file_name = Path(self.file_path).name + "_strings.txt"
-                str_data_path = os.path.join(
-                    Config.conf["analyze_data_path"], str_file_name
-                )
-                with open(str_data_path, "wb") as f:
-                    for a_str in all_strs:
-                        f.write(a_str + b"\n")
-                log.info(f"{str_file_name} saved")
-
-        all_wide_strs = self.get_wide_strs()
-        if all_wide_strs:
-            log.info(f"wide str num: {len(all_wide_strs)}")
-            if Config.conf["save_flag"]:
-                wide_str_file_name = Path(self.file_path).name + "_wide_strings.txt"
-                wide_str_data_path = os.path.join(
-                    Config.conf["analyze_data_path"], wide_str_file_name
-                )
-                with open(wide_str_data_path, "wb") as f:
-                    for a_str in all_wide_strs:
-                        f.write(a_str + b"\n\x00")
-                log.info(f"{wide_str_file_name} saved")
-
-                wide_to_normal_str_file_name = (
-                    Path(self.file_path).name + "_wide_to_normal_strings.txt"
-                )
-                wide_to_normal_str_data_path = os.path.join(
-                    Config.conf["analyze_data_path"], wide_to_normal_str_file_name
-                )
-                with open(wide_to_normal_str_data_path, "wb") as f:
-                    for a_str in all_wide_strs:
-                        normal_str = a_str.replace(b"\x00", b"")
-                        f.write(normal_str + b"\n")
-                log.info(f"{wide_to_normal_str_file_name} saved")
-
-        special_strs = self.get_special_strs()
-        if special_strs:
-            log.info(f"special strs num: {len(special_strs)}")
-            if Config.conf["save_flag"]:
-                special_str_file_name = (
-                    Path(self.file_path).name + "_special_strings.txt"
-                )
-                str_data_path = os.path.join(
-                    Config.conf["analyze_data_path"], special_str_file_name
-                )
-                with open(str_data_path, "wb") as f:
-                    for a_str in special_strs:
-                        f.write(a_str + b"\n")
-                log.info(f"{special_str_file_name} saved")
-
-        special_wide_strs = self.get_special_wide_strs()
-        if special_wide_strs:
-            log.info(f"special wide str num: {len(special_wide_strs)}")
-            if Config.conf["save_flag"]:
-                special_wide_str_file_name = (
-                    Path(self.file_path).name + "_special_wide_strings.txt"
-                )
-                special_wide_str_data_path = os.path.join(
-                    Config.conf["analyze_data_path"], special_wide_str_file_name
-                )
-                with open(special_wide_str_data_path, "wb") as f:
-                    for a_str in special_wide_strs:
-                        f.write(a_str + b"\n\x00")
-                log.info(f"{special_wide_str_file_name} saved")
+        output_dict = {
+            "str": [("_strings.txt", lambda a_str: a_str + b"\n")],
+            "wide_str": [
+                ("_wide_strings.txt", lambda a_str: a_str + b"\n\x00"),
+                (
+                    "_wide_to_normal_strings.txt",
+                    lambda a_str: a_str.replace(b"\x00", b"") + b"\n",
+                ),
+            ],
+            "special_str": [("_special_strings.txt", lambda a_str: a_str + b"\n")],
+            "special_wide_str": [
+                ("_special_wide_strings.txt", lambda a_str: a_str + b"\n\x00")
+            ],
+        }
+        str_num_dict, saved_file_name_dict = self.save_strs(
+            self.iter_all_strs(), output_dict
+        )
+        self.result["str_num"] = str_num_dict
+        for str_type, log_name in [
+            ("str", "str num"),
+            ("wide_str", "wide str num"),
+            ("special_str", "special strs num"),
+            ("special_wide_str", "special wide str num"),
+        ]:
+            if not str_num_dict[str_type]:
+                continue
+            log.info(f"{log_name}: {str_num_dict[str_type]}")
+            for saved_file_name in saved_file_name_dict[str_type]:
+                log.info(f"{saved_file_name} saved")
+
+    def yara_scan(self):
+        """
+        使用用户指定的yara规则扫描
+        """
+        yara_matches = self.user_yara_match()
+        self.result["yara_matches"] = [
+            f"{yara_match.namespace}:{yara_match.rule}" for yara_match in yara_matches
+        ]
+        if yara_matches:
+            log.info(f"yara matches: {self.result['yara_matches']}")
+
+    def pe_scan(self):
+        # 把自身传入，让PeAnalyzer可以使用和修改FileAnalyzer实例(属性和方法)
+        self.pe_analyzer = PeAnalyzer(self)
+        self.result["pe"] = self.pe_analyzer.run()
+
+    def elf_scan(self):
+        elf_analyzer = ElfAnalyzer(self)
+        self.result["elf"] = elf_analyzer.run()
 
     def tool_recommendations_scan(self):
         recommended_tool_info_list = self.get_tool_recommendations()
+        self.result["tool_recommendations"] = recommended_tool_info_list
         if recommended_tool_info_list:
             log.info("recommended tool info:")
             for recommended_tool_info in recommended_tool_info_list:
                 log.info(f"    {recommended_tool_info}")
 
-    def run(self):
-        md5_value, sha256_value = self.get_md5_sha256()
-        log.info("md5: {}".format(md5_value))
-        log.info("sha256: {}".format(sha256_value))
+    # 分析阶段按登记顺序执行，pe/elf按文件类型选择，其中的各项扫描是子阶段
+    stage_registry = StageRegistry(
+        [
+            Stage("strings", str_scan, cost=COST_HIGH, read_content=True),
+            Stage("yara", yara_scan, cost=COST_MEDIUM, read_content=True),
+            Stage(
+                "pe",
+                pe_scan,
+                file_types=["PE", "MS-DOS executable"],
+                read_content=True,
+                sub_registry=PeAnalyzer.stage_registry,
+            ),
+            Stage(
+                "elf",
+                elf_scan,
+                file_types=["ELF"],
+                read_content=True,
+                sub_registry=ElfAnalyzer.stage_registry,
+            ),
+            # 根据类型、壳、资源类型和版本信息推荐工具
+            Stage(
+                "tool_recommendations",
+                tool_recommendations_scan,
+                depends=["pe.packer", "pe.resource", "pe.versioninfo", "elf.packer"],
+            ),
+        ]
+    )
+
+    @classmethod
+    def get_selected_stages(cls):
+        """
+        根据--only/--skip/--max-cost选择要执行的阶段，都没有指定时返回None
+        """
+        only = Config.conf.get("only_stages")
+        skip = Config.conf.get("skip_stages")
+        max_cost = Config.conf.get("max_stage_cost")
+        if not (only or skip or max_cost):
+            return None
+        return cls.stage_registry.select(only, skip, max_cost)
+
+    def dump_result(self, log_records):
+        """
+        需要缓存的分析结果: 分析过程输出的日志和推荐工具用到的属性
+        """
+        return {
+            "logs": [[record.levelno, record.getMessage()] for record in log_records],
+            "file_type": self.file_type,
+            "possible_extension_names": self.possible_extension_names,
+            "packer_list": self.packer_list,
+            "pe_resource_type_list": self.pe_resource_type_list,
+            "pe_versioninfo": self.pe_versioninfo,
+            "result": self.result,
+        }
+
+    def load_result(self, result):
+        self.file_type = result["file_type"]
+        self.possible_extension_names = result["possible_extension_names"]
+        self.packer_list = result["packer_list"]
+        self.pe_resource_type_list = result["pe_resource_type_list"]
+        self.pe_versioninfo = result["pe_versioninfo"]
+        # 同一样本可能在不同路径
+        self.result = dict(result["result"], file_path=str(self.file_path))
+        for levelno, msg in result["logs"]:
+            log.log(levelno, msg)
+
+    def analyze(self):
+        self.result["file_type"] = self.file_type
+        self.result["possible_extension_names"] = self.possible_extension_names
+        self.result["file_size"] = self.file_size
         log.info("file type: {}".format(self.file_type))
         log.info("possible extension names: {}".format(self.possible_extension_names))
         log.info("file size: {}({})".format(self.file_size, hex(self.file_size)))
@@ -423,14 +587,155 @@ class FileAnalyzer:
             )
         )
 
-        self.str_scan()
+        for stage_name, stage in self.stage_registry.iter_selected(
+            self.selected_stages, self.file_type
+        ):
+            bytes_num = self.file_size if stage.read_content else 0
+            with self.profiler.stage(stage_name, bytes_num):
+                stage.func(self)
 
-        if self.file_type.startswith(("PE", "MS-DOS executable")):
-            # 把自身传入，让PeAnalyzer可以使用和修改FileAnalyzer实例(属性和方法)
-            pe_analyzer = PeAnalyzer(self)
-            pe_analyzer.run()
-        elif self.file_type.startswith("ELF"):
-            elf_analyzer = ElfAnalyzer(self)
-            elf_analyzer.run()
+    def run(self):
+        with self.profiler.stage("total", self.file_size):
+            self.run_stages()
+        if Config.conf.get("profile_flag"):
+            self.result["profile"] = self.profiler.get_result()
+            self.profiler.log_summary()
+        return self.result
+
+    def run_stages(self):
+        with self.profiler.stage("hash", self.file_size):
+            md5_value, sha256_value = self.get_md5_sha256()
+        log.info("md5: {}".format(md5_value))
+        log.info("sha256: {}".format(sha256_value))
+        self.result["file_path"] = str(self.file_path)
+        self.result["md5"] = md5_value
+        self.result["sha256"] = sha256_value
+
+        analyzed_flag = True
+        if Config.conf.get("triage_flag"):
+            analyzed_flag = self.triage_scan(sha256_value)
+        elif Config.conf["cache_flag"]:
+            self.analyze_with_cache(sha256_value)
+        else:
+            self.analyze()
+        if self.parent_path is not None:
+            self.result["parent"] = str(self.parent_path)
+        # --triage时没有完整分析的样本不提取子文件
+        if analyzed_flag:
+            with self.profiler.stage("children"):
+                self.children_scan()
+
+    def triage_scan(self, sha256_value):
+        """
+        --triage: 已知样本使用缓存的结果，其他样本先快速检查，命中升级规则时才完整分析
+        :return: 是否完整分析了该样本
+        """
+        if Config.conf["cache_flag"] and self.load_cached_result(sha256_value):
+            self.result["triage"] = {"known": True, "escalated": False, "rules": []}
+            return False
+
+        with self.profiler.stage("triage"):
+            triage = Triage(self)
+            fired_rule_list = triage.run()
+        if not fired_rule_list:
+            self.result["file_type"] = triage.file_type
+            self.result["possible_extension_names"] = triage.possible_extension_names
+            self.result["file_size"] = self.file_size
+            log.info("file type: {}".format(triage.file_type))
+            log.info("file size: {}({})".format(self.file_size, hex(self.file_size)))
+            self.result["triage"] = triage.result
+            return False
+
+        # 完整分析时file_type重新识别，不使用只根据文件头得到的结果
+        if Config.conf["cache_flag"]:
+            self.analyze_and_cache(sha256_value)
+        else:
+            self.analyze()
+        # 缓存的是完整分析的结果，不包括triage的结果
+        self.result["triage"] = triage.result
+        return True
+
+    def get_cache_key(self, sha256_value):
+        self.init_result_cache()
+        return self.result_cache.make_key(
+            sha256_value, self.str_scanner.minstrlen, Config.conf["deep_flag"]
+        )
 
-        self.tool_recommendations_scan()
+    def load_cached_result(self, sha256_value):
+        """
+        :return: 是否命中缓存
+        """
+        cache_key = self.get_cache_key(sha256_value)
+        cached_result = self.result_cache.get(cache_key)
+        if not cached_result:
+            return False
+        log.info("result from cache")
+        self.load_result(cached_result)
+        return True
+
+    def analyze_with_cache(self, sha256_value):
+        if self.load_cached_result(sha256_value):
+            return
+        self.analyze_and_cache(sha256_value)
+
+    def analyze_and_cache(self, sha256_value):
+        log_collector = LogCollector()
+        log.addHandler(log_collector)
+        try:
+            self.analyze()
+        finally:
+            log.removeHandler(log_collector)
+        self.result_cache.put(
+            self.get_cache_key(sha256_value),
+            self.dump_result(log_collector.records),
+        )
+
+    def iter_children(self):
+        """
+        :return: 迭代器，元素为(member_name, data)
+        """
+        container_type = ContainerExtractor.get_container_type(
+            self.file_content.data[:512]
+        )
+        if container_type:
+            log.info(f"extracting {container_type} members")
+            extractor = ContainerExtractor(
+                self.file_content,
+                str(self.file_path),
+                self.recurse_max_size,
+                Config.recurse_max_member_num,
+            )
+            yield from extractor.iter_members()
+            return
+
+        if not self.file_type.startswith(("PE", "MS-DOS executable")):
+            return
+        # 命中缓存时没有执行analyze()
+        if not self.pe_analyzer:
+            self.pe_analyzer = PeAnalyzer(self)
+        remaining_size = self.recurse_max_size
+        for payload_name, data in self.pe_analyzer.get_embedded_payloads():
+            if len(data) > remaining_size:
+                log.warning(f"recurse total size limit reached at {payload_name}")
+                return
+            remaining_size -= len(data)
+            # 子文件可能交给其他进程分析，需要复制出来
+            yield payload_name, bytes(data)
+
+    def children_scan(self):
+        """
+        --recurse时在内存中提取压缩包/容器中的文件、内嵌的PE资源和附加数据
+        子文件由调用方继续分析，同一进程中共用已加载的yara规则和PEiD特征
+        """
+        if not Config.conf["recurse_flag"]:
+            return
+        if self.depth >= Config.recurse_max_depth:
+            if ContainerExtractor.get_container_type(self.file_content.data[:512]):
+                log.warning(f"max recurse depth {Config.recurse_max_depth} reached")
+            return
+        for member_name, data in self.iter_children():
+            self.children.append((f"{self.file_path}!{member_name}", data))
+        if not self.children:
+            return
+        self.result["children"] = [child_path for child_path, _ in self.children]
+        log.info(f"children num: {len(self.children)}")
@@ -0,0 +1,159 @@
+import io
+import mmap
+import os
+
+from xanalyzer.config import Config
+
+
+class FileContent:
+    """
+    样本内容，每个样本只从磁盘读取一次，由FileAnalyzer和各子分析器共享
+    小文件直接读入内存，大文件使用mmap映射，避免多份拷贝
+    注意: mmap不支持 `b"xx" in data` 这种写法，统一使用 data.find(b"xx") != -1
+    """
+
+    file_path = None
+    data = None
+    size = 0
+
+    def __init__(self, file_path=None, data=None):
+        self.file_path = file_path
+        if data is not None:
+            self.data = data
+            self.size = len(data)
+            return
+
+        self.size = os.path.getsize(file_path)
+        with open(file_path, "rb") as the_file:
+            # 空文件不能mmap
+            if self.size and self.size >= Config.mmap_threshold:
+                self.data = mmap.mmap(the_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = the_file.read()
+
+    @property
+    def is_mmap(self):
+        return isinstance(self.data, mmap.mmap)
+
+    def stream(self):
+        """
+        返回一个独立的只读流，供ELFFile、ZipFile等需要文件对象的库使用
+        bytes使用BytesIO(共享同一对象不拷贝)，mmap直接重新打开文件
+        mmap对象不是完整的文件对象(没有seekable等方法)，ZipFile等无法使用
+        调用者负责关闭
+        """
+        if self.is_mmap:
+            return open(self.file_path, "rb")
+        return io.BytesIO(self.data)
+
+    def iter_chunks(self, chunk_size=None, start=0, end=None):
+        """
+        按块读取[start, end)的内容，mmap读完的块通知系统回收，避免整个文件常驻内存
+        """
+        if not chunk_size:
+            chunk_size = Config.stream_chunk_size
+        if end is None:
+            end = self.size
+        if self.is_mmap:
+            release_flag = (
+                hasattr(mmap, "MADV_DONTNEED") and chunk_size % mmap.PAGESIZE == 0
+            )
+            data_view = self.data
+        else:
+            release_flag = False
+            data_view = memoryview(self.data)
+        offset = start
+        while offset < end:
+            # 除第一块外，每块都从chunk_size的整数倍开始，mmap可以按页回收
+            chunk_end = min((offset // chunk_size + 1) * chunk_size, end)
+            chunk = data_view[offset:chunk_end]
+            if release_flag and offset % mmap.PAGESIZE == 0:
+                self.data.madvise(mmap.MADV_DONTNEED, offset, len(chunk))
+            yield chunk
+            offset = chunk_end
+
+    def save_range(self, save_path, start=0, end=None):
+        """
+        把[start, end)的内容保存到save_path，不把这部分内容整体复制到Python内存
+        mmap时优先在内核中复制(copy_file_range/sendfile)，不支持时分块写入
+        """
+        if end is None:
+            end = self.size
+        # 不使用缓冲，内核复制和分块写入都直接作用于同一个文件描述符
+        with open(save_path, "wb", buffering=0) as save_file:
+            if self.is_mmap:
+                start = self.kernel_copy(save_file.fileno(), start, end)
+            for chunk in self.iter_chunks(start=start, end=end):
+                save_file.write(chunk)
+
+    def kernel_copy(self, out_fd, start, end):
+        """
+        :return: 复制到的位置，全部复制完时等于end
+        """
+        if not hasattr(os, "copy_file_range") and not hasattr(os, "sendfile"):
+            return start
+        with open(self.file_path, "rb") as the_file:
+            in_fd = the_file.fileno()
+            try:
+                while start < end:
+                    if hasattr(os, "copy_file_range"):
+                        copied_size = os.copy_file_range(
+                            in_fd, out_fd, end - start, start
+                        )
+                    else:
+                        copied_size = os.sendfile(out_fd, in_fd, start, end - start)
+                    if not copied_size:
+                        break
+                    start += copied_size
+            except OSError:
+                # 跨文件系统、平台不支持等情况，剩余部分由调用方分块写入
+                pass
+        return start
+
+    def iter_regex(self, regex, chunk_size=None):
+        """
+        分块查找正则匹配，效果和regex.finditer相同
+        :return: (buffer_offset, match)，buffer_offset是match所在缓冲区在文件中的偏移
+        """
+        return iter_regex_chunks(regex, self.iter_chunks(chunk_size))
+
+
+def iter_regex_chunks(regex, chunk_iter, pending_re=None):
+    """
+    在分块的内容中查找正则匹配，效果和对整个内容regex.finditer相同
+    靠近块末尾的匹配可能还没结束，和块末尾一部分内容一起留到下一块处理
+    :param pending_re: 匹配块末尾还没结束的内容(如没有结束引号的属性值)，
+        正则的某个分支要等后续内容才能确定，其它分支却已经能在其中匹配时使用，
+        从它开始的内容都留到下一块处理
+    :return: (buffer_offset, match)，buffer_offset是match所在缓冲区在整个内容中的偏移
+    """
+    # 距离块末尾不到guard_size的匹配，视为可能跨块
+    guard_size = 16
+    buffer_offset = 0
+    carry = b""
+    for chunk in chunk_iter:
+        buffer = carry + chunk
+        safe_end = len(buffer) - guard_size
+        carry_start = max(0, len(buffer) - Config.stream_overlap)
+        pending_start = len(buffer)
+        if pending_re:
+            # 超过stream_max_str_len还没结束的内容不再等待，避免无限制占用内存
+            pending_match = pending_re.search(
+                buffer, max(0, len(buffer) - Config.stream_max_str_len)
+            )
+            if pending_match:
+                pending_start = pending_match.start()
+        for match in regex.finditer(buffer):
+            if match.start() >= pending_start or (
+                match.end() > safe_end
+                and match.end() - match.start() < Config.stream_max_str_len
+            ):
+                carry_start = min(carry_start, match.start())
+                break
+            yield buffer_offset, match
+            carry_start = max(carry_start, match.end())
+        carry_start = min(carry_start, pending_start)
+        carry = buffer[carry_start:]
+        buffer_offset += carry_start
+    for match in regex.finditer(carry):
+        yield buffer_offset, match
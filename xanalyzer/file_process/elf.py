@@ -2,6 +2,10 @@ import re
 
 from elftools.elf.elffile import ELFFile
 
+from xanalyzer.config import Config
+from xanalyzer.entropy import EntropyScanner
+from xanalyzer.overlay import Overlay
+from xanalyzer.stages import COST_MEDIUM, Stage, StageRegistry
 from xanalyzer.utils import log
 
 
@@ -10,13 +14,19 @@ class ElfAnalyzer:
 
     def __init__(self, file_analyzer):
         self.file_analyzer = file_analyzer
+        # 各项扫描的结构化结果
+        self.result = {}
+        # 熵只计算一次，entropy_scan和packer_scan共用
+        self.entropy_result = None
+        # 可执行段在range_list中的序号
+        self.executable_segment_indexes = []
 
     def get_elf_size(self):
         """
         计算真实ELF大小
         """
 
-        the_file = open(self.file_analyzer.file_path, "rb")
+        the_file = self.file_analyzer.file_content.stream()
         elf_file = ELFFile(the_file)
         elf_size = (
             elf_file.header.e_shoff
@@ -26,18 +36,63 @@ class ElfAnalyzer:
 
         return elf_size
 
+    def get_entropy_result(self):
+        """
+        单次遍历计算整个文件、各段(segment)和固定窗口的熵
+        """
+        if self.entropy_result is not None:
+            return self.entropy_result
+        range_list = []
+        the_file = self.file_analyzer.file_content.stream()
+        try:
+            elf_file = ELFFile(the_file)
+            for i, segment in enumerate(elf_file.iter_segments()):
+                if not segment["p_filesz"]:
+                    continue
+                # PF_X
+                if segment["p_flags"] & 0x1:
+                    self.executable_segment_indexes.append(len(range_list))
+                start = segment["p_offset"]
+                range_list.append(
+                    (f"{i}:{segment['p_type']}", start, start + segment["p_filesz"])
+                )
+        finally:
+            the_file.close()
+        self.entropy_result = EntropyScanner(
+            self.file_analyzer.file_content, range_list
+        ).run()
+        return self.entropy_result
+
+    def get_high_entropy_segments(self):
+        """
+        熵过高的可执行段，通常是加壳或加密的代码
+        """
+        range_result_list = self.get_entropy_result()["ranges"]
+        high_entropy_segment_names = []
+        for i in self.executable_segment_indexes:
+            range_result = range_result_list[i]
+            if (
+                range_result["size"] >= Config.entropy_min_range_size
+                and range_result["entropy"] >= Config.entropy_packed_threshold
+            ):
+                high_entropy_segment_names.append(range_result["name"])
+        return high_entropy_segment_names
+
     def get_packer_result(self):
-        the_file = open(self.file_analyzer.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
+        file_content = self.file_analyzer.file_content.data
 
         # Check Shc
-        if b"E: neither argv[0] nor $_ works." in file_content:
+        if file_content.find(b"E: neither argv[0] nor $_ works.") != -1:
             matches = ["Shc, Shell script compiler, https://github.com/neurobin/shc"]
             return matches
 
         # Check UPX
-        if b"$Info: This file is packed with the UPX executable packer" in file_content:
+        if (
+            file_content.find(
+                b"$Info: This file is packed with the UPX executable packer"
+            )
+            != -1
+        ):
             upx_ver_s = re.search(rb"\$Id: (UPX .+?) Copyright", file_content)
             if upx_ver_s:
                 matches = [upx_ver_s.group(1).decode()]
@@ -53,20 +108,57 @@ class ElfAnalyzer:
         因为是ELF的特殊情况，不考虑和文件大小放在一起
         """
         elf_size = self.get_elf_size()
+        self.result["elf_size"] = elf_size
         if elf_size and self.file_analyzer.file_size != elf_size:
             log.warning(
                 f"elf weird size: file_size {self.file_analyzer.file_size}({hex(self.file_analyzer.file_size)}), elf_size {elf_size}({hex(elf_size)})"
             )
+            if elf_size < self.file_analyzer.file_size:
+                self.result["overlay"] = Overlay(self.file_analyzer, elf_size).run()
 
     def packer_scan(self):
         """
         查壳
         """
         matches = self.get_packer_result()
+        if not matches:
+            # 没有特征匹配时，根据可执行段的熵判断
+            high_entropy_segment_names = self.get_high_entropy_segments()
+            if high_entropy_segment_names:
+                matches = [
+                    f"unknown packer, high entropy segments: {high_entropy_segment_names}"
+                ]
+        self.result["packer"] = matches
         if matches:
             self.file_analyzer.packer_list.extend(matches)
             log.info("packer: {}".format(matches))
 
+    def entropy_scan(self):
+        """
+        输出整个文件和各段的熵
+        """
+        entropy_result = self.get_entropy_result()
+        self.result["entropy"] = entropy_result
+        log.info(f"file entropy: {entropy_result['file']}")
+        segment_entropy_list = [
+            (range_result["name"], range_result["entropy"])
+            for range_result in entropy_result["ranges"]
+        ]
+        log.info(f"segment entropy: {segment_entropy_list}")
+
+    # 各项扫描按登记顺序执行
+    stage_registry = StageRegistry(
+        [
+            Stage("elf_size", elf_size_scan),
+            Stage("entropy", entropy_scan, cost=COST_MEDIUM),
+            Stage("packer", packer_scan, cost=COST_MEDIUM),
+        ]
+    )
+
     def run(self):
-        self.elf_size_scan()
-        self.packer_scan()
+        for stage_name, stage in self.stage_registry.iter_selected(
+            self.file_analyzer.selected_stages, prefix="elf."
+        ):
+            with self.file_analyzer.profiler.stage(stage_name):
+                stage.func(self)
+        return self.result
@@ -1,35 +1,92 @@
-import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from pathlib import Path
 
 import pefile
-import peutils
 from signify.authenticode.signed_pe import SignedPEFile
 
+from xanalyzer.authenticode import (
+    get_authenticode_hashes,
+    load_trusted_certificates,
+    verify_signed_data,
+)
 from xanalyzer.config import Config
-from xanalyzer.utils import log
+from xanalyzer.entropy import EntropyScanner
+from xanalyzer.overlay import Overlay
+from xanalyzer.peid import PeidSignatures
+from xanalyzer.stages import COST_HIGH, COST_MEDIUM, Stage, StageRegistry
+from xanalyzer.utils import LogHolder, log
 
 
 class PeAnalyzer:
     file_analyzer = None
     pe_file = None
     peid_signatures = None
+    # 签名验证线程池，同一进程中的所有样本共用
+    cert_executor = None
+
+    # 各项扫描用到的数据目录，fast_load后在第一次使用时解析
+    # 证书由signify解析，只需要头部中的DATA_DIRECTORY，不用pefile解析
+    directory_entry_names = {
+        "import": "IMAGE_DIRECTORY_ENTRY_IMPORT",
+        "export": "IMAGE_DIRECTORY_ENTRY_EXPORT",
+        "resource": "IMAGE_DIRECTORY_ENTRY_RESOURCE",
+        "debug": "IMAGE_DIRECTORY_ENTRY_DEBUG",
+    }
+    # 资源中出现这些类型时，说明内嵌了PE
+    embedded_pe_extension_names = [".exe", ".dll", ".sys"]
 
     def __init__(self, file_analyzer):
         self.file_analyzer = file_analyzer
-        self.pe_file = pefile.PE(self.file_analyzer.file_path)
+        # 各项扫描的结构化结果
+        self.result = {}
+        # 复用FileAnalyzer已读取的内容，不再重复读取文件
+        # fast_load只解析头部和节表，数据目录按需解析
+        self.pe_file = pefile.PE(
+            data=self.file_analyzer.file_content.data, fast_load=True
+        )
+        self.parsed_directories = set()
+        # resource_scan的结果，提取内嵌PE时复用
+        self.resource_type_dict = None
+        # 熵只计算一次，entropy_scan和packer_scan共用
+        self.entropy_result = None
+        # submit_verify_cert提交的签名验证
+        self.cert_future = None
 
         self.init_peid_signatures()
 
     def __del__(self):
         self.pe_file.close()
 
+    @classmethod
+    def init_cert_executor(cls):
+        if cls.cert_executor:
+            return
+        load_trusted_certificates()
+        cls.cert_executor = ThreadPoolExecutor(
+            max_workers=Config.cert_verify_concurrency,
+            thread_name_prefix="xanalyzer_cert",
+        )
+
     @classmethod
     def init_peid_signatures(cls):
         if cls.peid_signatures:
             return
-        cls.peid_signatures = peutils.SignatureDatabase(Config.peid_signature_path)
+        cls.peid_signatures = PeidSignatures.load(Config.peid_signature_path)
+
+    def parse_directory(self, directory_name):
+        """
+        解析数据目录，每个目录只解析一次
+        :param directory_name: directory_entry_names中的key
+        """
+        if directory_name in self.parsed_directories:
+            return
+        self.parsed_directories.add(directory_name)
+        directory_index = pefile.DIRECTORY_ENTRY[
+            self.directory_entry_names[directory_name]
+        ]
+        with self.file_analyzer.profiler.stage(f"pe.parse_{directory_name}_directory"):
+            self.pe_file.parse_data_directories(directories=[directory_index])
 
     def get_pe_size(self):
         """
@@ -63,6 +120,8 @@ class PeAnalyzer:
 
         versioninfo = []
 
+        # 版本信息在解析资源目录时一起解析
+        self.parse_directory("resource")
         if not hasattr(self.pe_file, "VS_VERSIONINFO") and not hasattr(
             self.pe_file, "FileInfo"
         ):
@@ -114,6 +173,7 @@ class PeAnalyzer:
         return time_str
 
     def get_pdb_path(self):
+        self.parse_directory("debug")
         for debug_entry in getattr(self.pe_file, "DIRECTORY_ENTRY_DEBUG", []):
             if hasattr(debug_entry.entry, "PdbFileName"):
                 return debug_entry.entry.PdbFileName.strip(b"\x00").decode("utf8")
@@ -122,12 +182,14 @@ class PeAnalyzer:
     def get_dll_name(self):
         if self.file_analyzer.possible_extension_names != [".dll"]:
             return
+        self.parse_directory("export")
         if hasattr(self.pe_file, "DIRECTORY_ENTRY_EXPORT"):
             return self.pe_file.DIRECTORY_ENTRY_EXPORT.name
         return
 
     def get_exe_import_api_list(self, lower_flag=False):
         exe_import_api_list = []
+        self.parse_directory("import")
         if not hasattr(self.pe_file, "DIRECTORY_ENTRY_IMPORT"):
             return []
         directory_entry_import = self.pe_file.DIRECTORY_ENTRY_IMPORT
@@ -159,21 +221,17 @@ class PeAnalyzer:
         if matches:
             for i in range(len(matches)):
                 if matches[i].startswith("UPX"):
-                    the_file = open(self.file_analyzer.file_path, "rb")
-                    file_content = the_file.read()
-                    the_file.close()
+                    file_content = self.file_analyzer.file_content.data
                     upx_ver_s = re.search(rb"(\d+\.\d+)\x00UPX!", file_content)
                     if upx_ver_s:
                         matches[i] = f"UPX {upx_ver_s.group(1).decode()}"
                     break
             return matches
 
-        the_file = open(self.file_analyzer.file_path, "rb")
-        file_content = the_file.read()
-        the_file.close()
+        file_content = self.file_analyzer.file_content.data
 
         # Check PyInstaller
-        if b"PyInstaller: FormatMessageW failed." in file_content:
+        if file_content.find(b"PyInstaller: FormatMessageW failed.") != -1:
             python_ver_info_s = re.search(rb"(python[0-9.]{2,4})\.dll", file_content)
             if python_ver_info_s:
                 python_ver_info = python_ver_info_s.group(1).decode()
@@ -184,15 +242,62 @@ class PeAnalyzer:
 
         return None
 
-    def get_resource_type_dict(self):
-        resource_type_dict = {}
+    def get_entropy_result(self):
+        """
+        单次遍历计算整个文件、各节区和固定窗口的熵
+        """
+        if self.entropy_result is None:
+            range_list = []
+            for section in self.pe_file.sections:
+                section_name = section.Name.strip(b"\x00").decode("latin1")
+                start = section.get_PointerToRawData_adj()
+                range_list.append((section_name, start, start + section.SizeOfRawData))
+            self.entropy_result = EntropyScanner(
+                self.file_analyzer.file_content, range_list
+            ).run()
+        return self.entropy_result
+
+    def get_high_entropy_sections(self):
+        """
+        熵过高的可执行节区，通常是加壳或加密的代码
+        """
+        execute_flag = pefile.SECTION_CHARACTERISTICS["IMAGE_SCN_MEM_EXECUTE"]
+        high_entropy_section_names = []
+        for section, range_result in zip(
+            self.pe_file.sections, self.get_entropy_result()["ranges"]
+        ):
+            if (
+                section.Characteristics & execute_flag
+                and range_result["size"] >= Config.entropy_min_range_size
+                and range_result["entropy"] >= Config.entropy_packed_threshold
+            ):
+                high_entropy_section_names.append(range_result["name"])
+        return high_entropy_section_names
+
+    def get_data_by_rva(self, rva, size):
+        """
+        把RVA转换为文件偏移，直接从文件内容中取数据，返回memoryview，不复制
+        不需要像get_memory_mapped_image那样生成整个内存映像
+        """
+        the_content = memoryview(self.file_analyzer.file_content.data)
+        section = self.pe_file.get_section_by_rva(rva)
+        if not section:
+            # 不在节区中时(如PE头)，RVA和文件偏移相同
+            return the_content[rva : rva + size]
+        offset = section.get_offset_from_rva(rva)
+        # 超出节区文件数据的部分在内存中是0，不在文件中
+        raw_end = section.get_PointerToRawData_adj() + section.SizeOfRawData
+        return the_content[offset : min(offset + size, raw_end)]
+
+    def iter_resources(self):
+        """
+        遍历资源
+        :return: 迭代器，元素为(key, resource_type_id, data)，data为memoryview
+        """
+        self.parse_directory("resource")
         if not hasattr(self.pe_file, "DIRECTORY_ENTRY_RESOURCE"):
-            return resource_type_dict
+            return
 
-        icon_type_id_list = [
-            pefile.RESOURCE_TYPE["RT_ICON"],
-            pefile.RESOURCE_TYPE["RT_GROUP_ICON"],
-        ]
         for resource_entry in self.pe_file.DIRECTORY_ENTRY_RESOURCE.entries:
             resource_entry_id = resource_entry.id
             resource_entry_name = resource_entry.name
@@ -219,35 +324,73 @@ class PeAnalyzer:
 
                     data_rva = dd_entry.data.struct.OffsetToData
                     size = dd_entry.data.struct.Size
-                    data = self.pe_file.get_memory_mapped_image()[
-                        data_rva : data_rva + size
-                    ]
-                    (
-                        data_type,
-                        possible_extension_names,
-                    ) = self.file_analyzer.guess_type_and_ext(data)
-                    if (
-                        data_type == "data"
-                        and not possible_extension_names
-                        and resource_entry_id in icon_type_id_list
-                    ):
-                        data_type = "icon"
-                        possible_extension_names = [".ico"]
-                    resource_type_dict[key] = [data_type, possible_extension_names]
+                    yield key, resource_entry_id, self.get_data_by_rva(data_rva, size)
+
+    def get_resource_type_dict(self):
+        resource_type_dict = {}
+        icon_type_id_list = [
+            pefile.RESOURCE_TYPE["RT_ICON"],
+            pefile.RESOURCE_TYPE["RT_GROUP_ICON"],
+        ]
+        for key, resource_entry_id, data in self.iter_resources():
+            # libmagic只检查资源开头部分
+            (
+                data_type,
+                possible_extension_names,
+            ) = self.file_analyzer.guess_type_and_ext(
+                data, Config.resource_magic_bytes_max
+            )
+            if (
+                data_type == "data"
+                and not possible_extension_names
+                and resource_entry_id in icon_type_id_list
+            ):
+                data_type = "icon"
+                possible_extension_names = [".ico"]
+            resource_type_dict[key] = [data_type, possible_extension_names]
         return resource_type_dict
 
-    def verify_cert(self):
-        cert_info_list = []
+    def get_embedded_payloads(self):
+        """
+        内嵌的PE资源和PE之后的附加数据(overlay)，供--recurse作为子文件继续分析
+        :return: [(name, data), ...]，data为memoryview
+        """
+        payload_list = []
+        if self.resource_type_dict is None:
+            self.resource_type_dict = self.get_resource_type_dict()
+        for key, _, data in self.iter_resources():
+            _, possible_extension_names = self.resource_type_dict[key]
+            if set(possible_extension_names) & set(self.embedded_pe_extension_names):
+                payload_list.append((f"resource_{key}", data))
+
+        pe_size = self.get_pe_size()
+        if pe_size and pe_size < self.file_analyzer.file_size:
+            the_content = memoryview(self.file_analyzer.file_content.data)
+            payload_list.append(("overlay", the_content[pe_size:]))
+        return payload_list
+
+    def has_cert(self):
         security_index = pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_SECURITY"]
         if len(self.pe_file.OPTIONAL_HEADER.DATA_DIRECTORY) <= security_index:
-            return
+            return False
         security_entry = self.pe_file.OPTIONAL_HEADER.DATA_DIRECTORY[security_index]
-        if not security_entry.Size or not security_entry.VirtualAddress:
-            return
-        pe_file = open(self.file_analyzer.file_path, "rb")
+        return bool(security_entry.Size and security_entry.VirtualAddress)
+
+    def get_cert_info_list(self):
+        """
+        解析并验证签名，可以在其他线程中执行，解析出错时抛出异常
+        """
+        cert_info_list = []
+        pe_file = self.file_analyzer.file_content.stream()
         try:
             pe = SignedPEFile(pe_file)
-            for signed_data in pe.signed_datas:
+            signed_data_list = list(pe.signed_datas)
+            try:
+                expected_hashes = get_authenticode_hashes(pe, signed_data_list)
+            except Exception:
+                # 由signify逐个计算，错误作为各签名的验证结果
+                expected_hashes = {}
+            for signed_data in signed_data_list:
                 signer_info = signed_data.signer_info
                 signer_serial_number = signer_info.serial_number._value
                 signer_issuer_dn = signer_info.issuer.dn
@@ -271,16 +414,36 @@ class PeAnalyzer:
                 cert_info["valid_to"] = cert.valid_to
 
                 try:
-                    signed_data.verify()
+                    verify_signed_data(
+                        signed_data,
+                        expected_hashes.get(signed_data.digest_algorithm().name),
+                    )
                     cert_info["verify_result"] = "valid"
                 except Exception as e:
                     cert_info["verify_result"] = "invalid: {}".format(e)
                 cert_info_list.append(cert_info)
+        finally:
+            pe_file.close()
+        return cert_info_list
+
+    def submit_verify_cert(self):
+        """
+        在线程池中验证签名，和其他扫描同时进行，cert_scan中取结果
+        """
+        if not self.has_cert():
+            return
+        self.init_cert_executor()
+        self.cert_future = self.cert_executor.submit(self.get_cert_info_list)
+
+    def verify_cert(self):
+        if not self.has_cert():
+            return
+        try:
+            return self.get_cert_info_list()
         except Exception as e:
             log.error("Error while parsing:")
             log.error("{}".format(e))
-        pe_file.close()
-        return cert_info_list
+            return []
 
     def pe_size_scan(self):
         """
@@ -288,28 +451,20 @@ class PeAnalyzer:
         因为是PE的特殊情况，不考虑和文件大小放在一起
         """
         pe_size = self.get_pe_size()
+        self.result["pe_size"] = pe_size
         if pe_size and self.file_analyzer.file_size != pe_size:
             log.warning(
                 f"pe weird size: file_size {self.file_analyzer.file_size}({hex(self.file_analyzer.file_size)}), pe_size {pe_size}({hex(pe_size)})"
             )
-            if pe_size < self.file_analyzer.file_size and Config.conf["save_flag"]:
-                the_file = open(self.file_analyzer.file_path, "rb")
-                the_content = the_file.read()
-                the_file.close()
-
-                stripped_file_name = Path(self.file_analyzer.file_path).name + "_stripped"
-                stripped_file_path = os.path.join(
-                    Config.conf["analyze_data_path"], stripped_file_name
-                )
-                with open(stripped_file_path, "wb") as f:
-                    f.write(the_content[:pe_size])
-                log.info(f"{stripped_file_name} saved")
+            if pe_size < self.file_analyzer.file_size:
+                self.result["overlay"] = Overlay(self.file_analyzer, pe_size).run()
 
     def compile_time_scan(self):
         """
         查看编译时间
         """
         time_str = self.get_compile_time()
+        self.result["compile_time"] = time_str
         if time_str:
             log.info("compile time: {}".format(time_str))
 
@@ -318,6 +473,7 @@ class PeAnalyzer:
         查看pdb路径
         """
         pdb_path = self.get_pdb_path()
+        self.result["pdb_path"] = pdb_path
         if pdb_path:
             log.info("pdb path: {}".format(pdb_path))
 
@@ -326,6 +482,7 @@ class PeAnalyzer:
         查看pe版本信息
         """
         versioninfo = self.get_versioninfo()
+        self.result["versioninfo"] = versioninfo
         if versioninfo:
             self.file_analyzer.pe_versioninfo = versioninfo
             log.info("versioninfo:")
@@ -339,13 +496,30 @@ class PeAnalyzer:
         section_names = []
         for section in self.pe_file.sections:
             section_names.append(section.Name.strip(b"\x00"))
+        self.result["section_names"] = [
+            section_name.decode("latin1") for section_name in section_names
+        ]
         log.info(f"section names: {section_names}")
 
+    def entropy_scan(self):
+        """
+        输出整个文件和各节区的熵
+        """
+        entropy_result = self.get_entropy_result()
+        self.result["entropy"] = entropy_result
+        log.info(f"file entropy: {entropy_result['file']}")
+        section_entropy_list = [
+            (range_result["name"], range_result["entropy"])
+            for range_result in entropy_result["ranges"]
+        ]
+        log.info(f"section entropy: {section_entropy_list}")
+
     def dll_name_scan(self):
         """
         如果是dll，尝试输出dll名称
         """
         dll_name = self.get_dll_name()
+        self.result["dll_name"] = dll_name.decode("latin1") if dll_name else None
         if dll_name:
             log.info(f"dll name: {dll_name}")
 
@@ -354,15 +528,44 @@ class PeAnalyzer:
         查壳
         """
         matches = self.get_packer_result()
+        if not matches:
+            # 没有特征匹配时，根据可执行节区的熵判断
+            high_entropy_section_names = self.get_high_entropy_sections()
+            if high_entropy_section_names:
+                matches = [
+                    f"unknown packer, high entropy sections: {high_entropy_section_names}"
+                ]
+        self.result["packer"] = matches
         if matches:
             self.file_analyzer.packer_list.extend(matches)
             log.info("packer: {}".format(matches))
 
+        if Config.conf["deep_flag"]:
+            # 深度分析时在所有节区中查找非入口点特征
+            section_matches = self.peid_signatures.match(self.pe_file, ep_only=False)
+            self.result["peid_section_matches"] = section_matches
+            if section_matches:
+                log.info("peid section matches:")
+                for offset, name in section_matches:
+                    log.info(f"    {hex(offset)}: {name}")
+
     def cert_scan(self):
         """
         输出证书信息并验证
         """
-        cert_info_list = self.verify_cert()
+        if self.cert_future:
+            try:
+                cert_info_list = self.cert_future.result()
+            except Exception as e:
+                log.error("Error while parsing:")
+                log.error("{}".format(e))
+                cert_info_list = []
+        else:
+            cert_info_list = self.verify_cert()
+        self.result["certificates"] = [
+            {key: str(value) for key, value in cert_info.items()}
+            for cert_info in cert_info_list or []
+        ]
         if cert_info_list:
             log.info("contains certificates:")
             for cert_info in cert_info_list:
@@ -390,6 +593,7 @@ class PeAnalyzer:
         if self.file_analyzer.possible_extension_names != [".exe"]:
             return
         exe_import_api_list = self.get_exe_import_api_list(lower_flag=True)
+        self.result["exe_import_api_list"] = exe_import_api_list
         api_num = len(exe_import_api_list)
         if api_num == 0:
             log.warning("the exe does not have import api")
@@ -411,27 +615,102 @@ class PeAnalyzer:
         """
         检查资源类型
         """
-        resource_type_dict = self.get_resource_type_dict()
+        self.resource_type_dict = self.get_resource_type_dict()
         resource_type_set = set()
         weird_resource_type_set = set()
-        for data_type, possible_extension_names in resource_type_dict.values():
+        for data_type, possible_extension_names in self.resource_type_dict.values():
             for possible_extension_name in possible_extension_names:
                 resource_type_set.add(possible_extension_name)
-                if possible_extension_name in [".exe", ".dll", ".sys"]:
+                if possible_extension_name in self.embedded_pe_extension_names:
                     weird_resource_type_set.add(possible_extension_name)
         self.file_analyzer.pe_resource_type_list = list(resource_type_set)
         weird_resource_type_list = list(weird_resource_type_set)
+        self.result["resource_types"] = self.file_analyzer.pe_resource_type_list
+        self.result["weird_resource_types"] = weird_resource_type_list
         if weird_resource_type_list:
             log.warning(f"pe weird resource type: {weird_resource_type_list}")
 
+    # 各项扫描按登记顺序执行，--only/--skip/--max-cost时使用名称和耗时级别选择
+    stage_registry = StageRegistry(
+        [
+            Stage("pe_size", pe_size_scan),
+            Stage("compile_time", compile_time_scan),
+            Stage("pdb", pdb_scan),
+            Stage("versioninfo", versioninfo_scan),
+            Stage("cert", cert_scan, cost=COST_HIGH),
+            Stage("section_name", section_name_scan),
+            Stage("entropy", entropy_scan, cost=COST_MEDIUM),
+            Stage("dll_name", dll_name_scan),
+            Stage("packer", packer_scan, cost=COST_MEDIUM),
+            Stage("exe_import_api", exe_import_api_scan),
+            Stage("resource", resource_scan, cost=COST_MEDIUM),
+        ]
+    )
+
+    def run_scan(self, stage_name, scan):
+        """
+        执行一项扫描，耗时记录在profiler中
+        :param scan: 扫描函数，参数是PeAnalyzer实例
+        """
+        with self.file_analyzer.profiler.stage(stage_name):
+            scan(self)
+
+    def log_timings(self):
+        """
+        输出profiler记录的各项扫描耗时
+        profiler中的阶段按开始顺序排列，数据目录的解析耗时列在第一次使用它的扫描下
+        """
+        log.info("pe scan timings:")
+        for stage_name, stage_info in self.file_analyzer.profiler.stages.items():
+            if not stage_name.startswith("pe."):
+                continue
+            stage_time = stage_info["wall"] * 1000
+            scan_name = stage_name[len("pe.") :]
+            if scan_name.startswith("parse_"):
+                log.info(f"        {scan_name.replace('_', ' ')}: {stage_time:.2f}ms")
+            else:
+                log.info(f"    {scan_name}: {stage_time:.2f}ms")
+
+    def run_cert_stage(self, cert_stage, log_holder):
+        """
+        执行推迟的cert_scan，再输出期间暂存的日志
+        """
+        log_holder.stop()
+        self.run_scan("pe.cert", cert_stage.func)
+        log_holder.flush()
+
     def run(self):
-        self.pe_size_scan()
-        self.compile_time_scan()
-        self.pdb_scan()
-        self.versioninfo_scan()
-        self.cert_scan()
-        self.section_name_scan()
-        self.dll_name_scan()
-        self.packer_scan()
-        self.exe_import_api_scan()
-        self.resource_scan()
+        stage_list = list(
+            self.stage_registry.iter_selected(
+                self.file_analyzer.selected_stages, prefix="pe."
+            )
+        )
+        # 签名验证在后台进行，cert_scan时取结果
+        if any(stage_name == "pe.cert" for stage_name, _ in stage_list):
+            self.submit_verify_cert()
+        # 轮到cert_scan时签名验证还没完成，就先执行后面的扫描，验证完成后再执行cert_scan，
+        # 后面扫描的日志暂存到cert_scan之后输出，日志顺序和依次执行相同
+        cert_stage = None
+        log_holder = LogHolder()
+        try:
+            for stage_name, stage in stage_list:
+                if (
+                    stage_name == "pe.cert"
+                    and self.cert_future
+                    and not self.cert_future.done()
+                ):
+                    cert_stage = stage
+                    log_holder.start()
+                    continue
+                self.run_scan(stage_name, stage.func)
+                if cert_stage and self.cert_future.done():
+                    self.run_cert_stage(cert_stage, log_holder)
+                    cert_stage = None
+            if cert_stage:
+                self.run_cert_stage(cert_stage, log_holder)
+        finally:
+            log_holder.stop()
+            log_holder.flush()
+        if Config.conf.get("timing_flag"):
+            self.log_timings()
+        return self.result
@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+
+import magic
+
+from xanalyzer.config import Config
+
+
+class MagicDetector:
+    """
+    使用libmagic识别类型
+    libmagic的句柄不能在线程间共享，每个线程使用自己的magic.Magic
+    默认只识别开头magic_header_size字节，识别结果需要更多内容的格式再加大读取范围
+    开头部分的识别结果按hash缓存，如大量相同的图标资源只识别一次
+    加大读取范围后的内容很少重复，直接交给libmagic，不复制也不计算hash
+    """
+
+    # 这些格式的详细信息在文件后部(如CDF的目录、NSIS安装包的特征在PE之后)
+    deep_type_prefixes = (
+        "Composite Document File",
+        "PE32",
+        "MS-DOS executable",
+    )
+
+    local = threading.local()
+    cache_lock = threading.Lock()
+    # (hash, 长度) -> 识别结果，按最近使用排序
+    cache = OrderedDict()
+
+    @classmethod
+    def get_magic(cls):
+        magic_handle = getattr(cls.local, "magic_handle", None)
+        if magic_handle is None:
+            magic_handle = magic.Magic()
+            cls.local.magic_handle = magic_handle
+        return magic_handle
+
+    @classmethod
+    def detect(cls, buffer):
+        """
+        识别并缓存结果
+        :param buffer: bytes、mmap或memoryview的切片
+        """
+        buffer = bytes(buffer)
+        cache_key = (blake2b(buffer, digest_size=16).digest(), len(buffer))
+        with cls.cache_lock:
+            file_type = cls.cache.get(cache_key)
+            if file_type is not None:
+                cls.cache.move_to_end(cache_key)
+                return file_type
+        file_type = cls.get_magic().from_buffer(buffer)
+        with cls.cache_lock:
+            cls.cache[cache_key] = file_type
+            if len(cls.cache) > Config.magic_cache_size:
+                cls.cache.popitem(last=False)
+        return file_type
+
+    @classmethod
+    def from_buffer(cls, the_content, bytes_max=None):
+        """
+        :param the_content: bytes、mmap或memoryview
+        :param bytes_max: 最多交给libmagic的字节数，默认Config.magic_bytes_max
+        """
+        if bytes_max is None:
+            bytes_max = Config.magic_bytes_max
+        header_size = min(Config.magic_header_size, bytes_max)
+        file_type = cls.detect(the_content[:header_size])
+        # bytes_max不大于header_size时开头部分已经是全部可用的内容，不再重复识别
+        if (
+            len(the_content) > header_size
+            and bytes_max > header_size
+            and file_type.startswith(cls.deep_type_prefixes)
+        ):
+            # bytes和mmap的切片已经是bytes，只有memoryview需要转换，libmagic只接受bytes
+            deep_buffer = the_content[:bytes_max]
+            if isinstance(deep_buffer, memoryview):
+                deep_buffer = deep_buffer.tobytes()
+            file_type = cls.get_magic().from_buffer(deep_buffer)
+        return file_type
@@ -1,15 +1,40 @@
 import argparse
 import os
+import sys
 from pathlib import Path
 
+from xanalyzer.batch import run_batch, run_inline, run_url_batch
 from xanalyzer.config import Config
 from xanalyzer.file import FileAnalyzer
+from xanalyzer.output import ResultWriter
+from xanalyzer.profiler import ProfileAggregator
+from xanalyzer.stages import cost_levels
+from xanalyzer.triage import Triage
 from xanalyzer.url import UrlAnalyzer
 from xanalyzer.utils import init_log, log
 
 file_path_list = []
 
 
+def iter_url_list(url_list_path):
+    """
+    逐行读取url，忽略空行和#开头的注释
+    :param url_list_path: 文件路径，"-"表示标准输入
+    """
+    if url_list_path == "-":
+        url_file = sys.stdin
+    else:
+        url_file = open(url_list_path, "r", encoding="utf8")
+    try:
+        for line in url_file:
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield url
+    finally:
+        if url_file is not sys.stdin:
+            url_file.close()
+
+
 def get_all_path(the_path):
     """获取所有路径，深度优先
 
@@ -28,6 +53,26 @@ def get_all_path(the_path):
         log.warning(f"folder is empty: {the_path}")
 
 
+def split_names(names):
+    """
+    拆分逗号分隔的名称
+    """
+    if not names:
+        return []
+    return [name.strip() for name in names.split(",") if name.strip()]
+
+
+def print_stages():
+    print(f"{'stage':<28}{'cost':<8}{'file types':<28}depends")
+    for full_name, stage in FileAnalyzer.stage_registry.iter_all():
+        if stage.file_types:
+            file_types = ", ".join(stage.file_types)
+        else:
+            # 子阶段的文件类型和父阶段相同
+            file_types = "" if "." in full_name else "all"
+        print(f"{full_name:<28}{stage.cost:<8}{file_types:<28}{', '.join(stage.depends)}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="xanalyzer", description="Process some files and urls. 'xa' can be used instead of 'xanalyzer'"
@@ -39,46 +84,147 @@ def main():
         nargs="+",
         help="analyze one or more files, can be a folder path",
     )
-    group.add_argument("-u", "--url", help="analyze the url")
+    group.add_argument("-u", "--url", help="analyze the url, @PATH analyzes the urls in a file (one per line), @- reads urls from stdin")
     group.add_argument("--version", action="store_true", help="print version info")
+    group.add_argument("--list-stages", action="store_true", help="print the analysis stages that can be used with --only and --skip")
     parser.add_argument("-s", "--save", action="store_true", help="save log and data")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the analysis result cache")
+    parser.add_argument("--yara-dir", action="append", metavar="DIR", help="extra yara rule folder, can be used multiple times")
     parser.add_argument("--deep", action="store_true", help="analyze deeply")
+    parser.add_argument("--timing", action="store_true", help="print the time cost of each pe scan")
+    parser.add_argument("--only", metavar="STAGES", help="only run these comma separated analysis stages (and the stages they depend on), e.g. pe.compile_time,yara")
+    parser.add_argument("--skip", metavar="STAGES", help="skip these comma separated analysis stages, e.g. strings,cert")
+    parser.add_argument("--max-cost", choices=cost_levels, help="only run the analysis stages whose cost is not higher than MAX_COST")
+    parser.add_argument("--triage", action="store_true", help="only compute the hashes, guess the type by the file header and check the pe/elf size first, analyze fully when an escalation rule fires")
+    parser.add_argument("--escalate", metavar="RULES", help=f"comma separated escalation rules of --triage, available: {','.join(Triage.escalate_rules)}, default {','.join(Config.triage_escalate_rules)}")
+    parser.add_argument("--profile", action="store_true", help="print the wall time, cpu time and bytes processed of each analysis stage, the peak rss of the process, and the p50/p95 of each stage over all files")
+    parser.add_argument("--profile-output", metavar="PATH", help="save the profile summary of all files as json to PATH, implies --profile")
+    parser.add_argument("--recurse", action="store_true", help="extract and analyze the files in archives (zip/gzip/tar/7z/rar), pe resources and overlay data recursively, in memory")
     parser.add_argument("--minstrlen", type=int, default=4, help="minimum length of the string to be extracted, default 4, not less than 2")
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument("--json", nargs="?", const="-", metavar="PATH", help="output results as a json array to stdout or PATH")
+    output_group.add_argument("--jsonl", nargs="?", const="-", metavar="PATH", help="output results as json lines to stdout or PATH")
+    parser.add_argument("--crawl-jobs", type=int, help=f"number of concurrent requests when crawling the url with --deep, default {Config.crawl_concurrency}")
+    parser.add_argument("--max-depth", type=int, help=f"maximum link depth when crawling the url with --deep, default {Config.crawl_max_depth}")
+    parser.add_argument("--max-pages", type=int, help=f"maximum number of pages requested when crawling the url with --deep, default {Config.crawl_max_pages}")
+    parser.add_argument("-j", "--jobs", type=int, help=f"number of processes used to analyze files, default 1; number of urls analyzed at the same time with -u @PATH, default {Config.url_batch_jobs}")
     args = parser.parse_args()
 
     if args.version:
         print(Config.VERSION)
         return
+    if args.list_stages:
+        print_stages()
+        return
 
     deep_flag = args.deep
     minstrlen = args.minstrlen
+    url_list_path = None
+    if args.url and args.url.startswith("@"):
+        url_list_path = args.url[1:]
+        if url_list_path != "-" and not os.path.isfile(url_list_path):
+            print(f"{url_list_path} does not exist")
+            return
+    jobs = args.jobs
+    if jobs is None:
+        jobs = Config.url_batch_jobs if url_list_path else 1
 
     if minstrlen < 2:
         print("minstrlen must >= 2")
         return
+    if jobs < 1:
+        print("jobs must >= 1")
+        return
+
+    if args.crawl_jobs is not None:
+        if args.crawl_jobs < 1:
+            print("crawl-jobs must >= 1")
+            return
+        Config.crawl_concurrency = args.crawl_jobs
+    if args.max_depth is not None:
+        if args.max_depth < 0:
+            print("max-depth must >= 0")
+            return
+        Config.crawl_max_depth = args.max_depth
+    if args.max_pages is not None:
+        if args.max_pages < 1:
+            print("max-pages must >= 1")
+            return
+        Config.crawl_max_pages = args.max_pages
+
+    only_stages = split_names(args.only)
+    skip_stages = split_names(args.skip)
+    try:
+        FileAnalyzer.stage_registry.match_names(only_stages + skip_stages)
+    except ValueError as e:
+        print(f"{e}, see --list-stages")
+        return
 
-    Config.init(args.save)
+    triage_escalate_rules = split_names(args.escalate)
+    for rule_name in triage_escalate_rules:
+        if rule_name not in Triage.escalate_rules:
+            print(f"unknown escalation rule: {rule_name}")
+            return
+
+    profile_flag = args.profile or bool(args.profile_output)
+    Config.init(
+        args.save,
+        not args.no_cache,
+        args.yara_dir,
+        deep_flag,
+        args.timing,
+        args.recurse,
+        profile_flag,
+        only_stages,
+        skip_stages,
+        args.max_cost,
+        args.triage,
+        triage_escalate_rules,
+    )
     init_log()
 
     log.info("=" * 80)
 
+    result_writer = None
+    if args.json:
+        result_writer = ResultWriter(args.json, "json")
+    elif args.jsonl:
+        result_writer = ResultWriter(args.jsonl, "jsonl")
+
     if args.file:
         for the_path in args.file:
             if not os.path.exists(the_path):
                 log.warning("{} does not exist!!!".format(the_path))
                 continue
             get_all_path(the_path)
-        for file_path in file_path_list:
-            log.info("processing {}".format(file_path))
-            file_analyzer = FileAnalyzer(file_path, minstrlen)
-            file_analyzer.run()
-            log.info("-" * 80)
-    if args.url:
+        profile_aggregator = ProfileAggregator() if profile_flag else None
+        if jobs > 1:
+            run_batch(
+                file_path_list, minstrlen, jobs, result_writer, profile_aggregator
+            )
+        else:
+            run_inline(file_path_list, minstrlen, result_writer, profile_aggregator)
+        if profile_aggregator:
+            profile_aggregator.log_summary()
+            if args.profile_output:
+                profile_aggregator.save(args.profile_output)
+                log.info(f"profile summary saved to {args.profile_output}")
+    if url_list_path:
+        # 批量分析url时默认每个url输出一行json
+        if not result_writer:
+            result_writer = ResultWriter("-", "jsonl")
+        run_url_batch(iter_url_list(url_list_path), deep_flag, jobs, result_writer)
+    elif args.url:
         log.info("processing {}".format(args.url))
         url_analyzer = UrlAnalyzer(args.url, deep_flag)
-        url_analyzer.run()
+        result = url_analyzer.run()
+        if result_writer:
+            result_writer.write(result)
         log.info("-" * 80)
 
+    if result_writer:
+        result_writer.close()
+
     if Config.conf["save_flag"]:
         log.info(
             "the log and data are saved to {} folder".format(
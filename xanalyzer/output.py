@@ -0,0 +1,66 @@
+import json
+import sys
+
+
+class ResultWriter:
+    """
+    输出结构化的分析结果，每分析完一个样本就输出一条
+    json: 整体是一个数组; jsonl: 每行一个样本
+
+    每条记录是一个dict，只包含实际执行了的阶段的字段(--only/--skip/--triage时会缺少部分字段)，
+    带?的字段只在部分情况下出现
+    文件样本(FileAnalyzer.run):
+        file_path, md5, sha256, file_type, possible_extension_names, file_size
+        parent: --recurse提取出的子文件所属文件的file_path
+        children: --recurse提取出的子文件的file_path列表
+        str_num: {"str", "wide_str", "special_str", "special_wide_str": 数量}
+        yara_matches: ["namespace:rule", ...]
+        tool_recommendations: ["工具名: 说明", ...]
+        triage: --triage时 {"escalated", "rules", "known"?, "real_size"?, "real_size_error"?}
+        profile: --profile时 {"stages": {阶段名: {"wall", "cpu", "bytes"}}, "process_peak_rss"}
+        pe: {
+            pe_size, overlay?, compile_time, pdb_path, versioninfo: [{"name", "value"}],
+            certificates: [{"subject", "issuer", "serial_number", "signing_time",
+                "valid_from", "valid_to", "verify_result"}],
+            section_names, entropy, dll_name, packer: [...], peid_section_matches?,
+            exe_import_api_list, resource_types, weird_resource_types
+        }
+        elf: {elf_size, overlay?, entropy, packer: [...]}
+        pe/elf中的overlay: {"offset", "size", "md5", "sha256", "entropy", "file_type",
+            "possible_extension_names"}
+        pe/elf中的entropy: {"file": 熵, "ranges": [{"name", "offset", "size", "entropy"}],
+            "windows": {"size", "num", "max", "min", "high_entropy_num"}}
+    url样本(UrlAnalyzer.run):
+        url, hostname_type, resolved_ip_list?, status_code, robots_info,
+        links, subdomain_list, subdomain_ip_dict?
+    出错的样本只有 file_path/url 和 error
+    """
+
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        if output_path == "-":
+            self.the_file = sys.stdout
+        else:
+            self.the_file = open(output_path, "w", encoding="utf8")
+        self.result_num = 0
+        if self.output_format == "json":
+            self.the_file.write("[")
+
+    def write(self, result):
+        result_str = json.dumps(result, ensure_ascii=False, default=str)
+        if self.output_format == "json":
+            if self.result_num:
+                self.the_file.write(",")
+            self.the_file.write(f"\n{result_str}")
+        else:
+            self.the_file.write(f"{result_str}\n")
+        self.the_file.flush()
+        self.result_num += 1
+
+    def close(self):
+        if self.output_format == "json":
+            self.the_file.write("\n]\n")
+        if self.the_file is sys.stdout:
+            self.the_file.flush()
+        else:
+            self.the_file.close()
@@ -0,0 +1,85 @@
+import os
+from hashlib import md5, sha256
+from pathlib import Path
+
+from xanalyzer.config import Config
+from xanalyzer.entropy import ByteHistogram
+from xanalyzer.utils import log
+
+
+class Overlay:
+    """
+    PE/ELF结构之后的附加数据(overlay)
+    只通过切片和分块访问样本内容，不把整个文件复制到Python内存
+    """
+
+    def __init__(self, file_analyzer, image_size):
+        """
+        :param image_size: PE/ELF结构本身的大小，也就是附加数据的偏移
+        """
+        self.file_analyzer = file_analyzer
+        self.file_content = file_analyzer.file_content
+        self.offset = image_size
+        self.size = self.file_content.size - image_size
+
+    def iter_chunks(self):
+        return self.file_content.iter_chunks(start=self.offset)
+
+    def get_hashes_and_entropy(self):
+        """
+        一次遍历计算md5、sha256和熵
+        """
+        md5_hash = md5()
+        sha256_hash = sha256()
+        histogram = ByteHistogram()
+        for chunk in self.iter_chunks():
+            md5_hash.update(chunk)
+            sha256_hash.update(chunk)
+            histogram.update(chunk)
+        return md5_hash.hexdigest(), sha256_hash.hexdigest(), histogram.entropy()
+
+    def get_type_and_ext(self):
+        # 只把开头部分交给libmagic
+        overlay_view = memoryview(self.file_content.data)[self.offset :]
+        try:
+            return self.file_analyzer.guess_type_and_ext(
+                overlay_view, Config.resource_magic_bytes_max
+            )
+        finally:
+            overlay_view.release()
+
+    def save(self):
+        """
+        保存去掉附加数据的文件(_stripped)和附加数据本身(_overlay)
+        """
+        file_name = Path(self.file_analyzer.file_path).name
+        for save_suffix, start, end in [
+            ("_stripped", 0, self.offset),
+            ("_overlay", self.offset, None),
+        ]:
+            save_file_name = file_name + save_suffix
+            save_path = os.path.join(Config.conf["analyze_data_path"], save_file_name)
+            self.file_content.save_range(save_path, start, end)
+            log.info(f"{save_file_name} saved")
+
+    def run(self):
+        md5_value, sha256_value, entropy = self.get_hashes_and_entropy()
+        file_type, possible_extension_names = self.get_type_and_ext()
+        result = {
+            "offset": self.offset,
+            "size": self.size,
+            "md5": md5_value,
+            "sha256": sha256_value,
+            "entropy": round(entropy, 4),
+            "file_type": file_type,
+            "possible_extension_names": possible_extension_names,
+        }
+        log.info(
+            f"overlay: offset {self.offset}({hex(self.offset)}), size {self.size}({hex(self.size)})"
+        )
+        log.info(f"overlay sha256: {sha256_value}")
+        log.info(f"overlay entropy: {result['entropy']}")
+        log.info(f"overlay file type: {file_type}")
+        if Config.conf["save_flag"]:
+            self.save()
+        return result
@@ -0,0 +1,197 @@
+import marshal
+import os
+import re
+from hashlib import sha256
+from pathlib import Path
+
+import peutils
+
+from xanalyzer.config import Config
+from xanalyzer.utils import log
+
+
+class PeidSignatures:
+    """
+    PEiD特征索引
+    peutils每次启动都要解析整个UserDB.TXT，并且入口点匹配需要生成整个内存映像
+    这里把特征按第一个字节分组，每条特征转为(长度, 特征值, 掩码)，用整数与运算比较，
+    索引用marshal缓存，之后直接加载
+    """
+
+    # 索引格式变化时修改
+    index_format = 1
+    # 第一个字节是通配符的特征
+    wildcard_key = -1
+
+    def __init__(self, index):
+        self.max_depth = index["max_depth"]
+        self.ep_only_index = index["ep_only"]
+        self.anywhere_index = index["anywhere"]
+        first_bytes = [key for key in self.anywhere_index if key != self.wildcard_key]
+        self.anywhere_first_byte_re = None
+        if first_bytes:
+            self.anywhere_first_byte_re = re.compile(
+                b"[" + b"".join(re.escape(bytes([key])) for key in first_bytes) + b"]"
+            )
+
+    @classmethod
+    def load(cls, signature_path):
+        """
+        优先从缓存加载索引，UserDB.TXT变化后重新生成
+        """
+        with open(signature_path, "rb") as f:
+            signature_hash = sha256(f.read()).hexdigest()
+        index_path = (
+            Path(Config.peid_cache_dir)
+            / f"{signature_hash}_{cls.index_format}.marshal"
+        )
+        if index_path.exists():
+            try:
+                # marshal.load直接读文件对象很慢，先整体读出
+                with open(index_path, "rb") as f:
+                    return cls(marshal.loads(f.read()))
+            except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+                log.warning(f"failed to load peid index {index_path}: {e}")
+
+        index = cls.build_index(signature_path)
+        try:
+            os.makedirs(index_path.parent, exist_ok=True)
+            tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(marshal.dumps(index))
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            log.warning(f"failed to save peid index {index_path}: {e}")
+        return cls(index)
+
+    @classmethod
+    def build_index(cls, signature_path):
+        """
+        使用peutils解析特征文件，保证和peutils识别的特征一致
+        """
+        signature_database = peutils.SignatureDatabase(signature_path)
+        return {
+            "max_depth": signature_database.max_depth,
+            "ep_only": cls.build_tree_index(
+                signature_database.signature_tree_eponly_true
+            ),
+            "anywhere": cls.build_tree_index(
+                signature_database.signature_tree_eponly_false
+            ),
+        }
+
+    @classmethod
+    def build_tree_index(cls, signature_tree):
+        index = {}
+        # 遍历peutils的特征树，得到每条特征的字节序列
+        stack = [(signature_tree, [])]
+        while stack:
+            tree, signature_bytes = stack.pop()
+            for key, sub_tree in tree.items():
+                if sub_tree is None:
+                    # key是特征名
+                    if not signature_bytes:
+                        continue
+                    pattern = bytes(0 if b == "??" else b for b in signature_bytes)
+                    mask = bytes(0 if b == "??" else 0xFF for b in signature_bytes)
+                    if signature_bytes[0] == "??":
+                        first_byte = cls.wildcard_key
+                    else:
+                        first_byte = signature_bytes[0]
+                    index.setdefault(first_byte, []).append(
+                        (
+                            len(signature_bytes),
+                            int.from_bytes(pattern, "big"),
+                            int.from_bytes(mask, "big"),
+                            key,
+                        )
+                    )
+                else:
+                    stack.append((sub_tree, signature_bytes + [key]))
+        for signature_list in index.values():
+            # 保证结果顺序稳定
+            signature_list.sort(key=lambda item: (item[0], item[3]))
+        return index
+
+    def match_index(self, index, data):
+        """
+        匹配data开头，返回最长(最精确)的特征名列表
+        """
+        if not data:
+            return None
+        matched_length = 0
+        matched_names = []
+        data_int_dict = {}
+        for signature in index.get(data[0], []) + index.get(self.wildcard_key, []):
+            length, pattern, mask, name = signature
+            if length > len(data) or length < matched_length:
+                continue
+            data_int = data_int_dict.get(length)
+            if data_int is None:
+                data_int = int.from_bytes(data[:length], "big")
+                data_int_dict[length] = data_int
+            if data_int & mask != pattern:
+                continue
+            if length > matched_length:
+                matched_length = length
+                matched_names = []
+            matched_names.append(name)
+        return matched_names or None
+
+    def get_ep_data(self, pe):
+        """
+        获取入口点开始的数据，和内存映像中一致(超出文件数据的部分补0)，但不生成整个映像
+        """
+        ep = pe.OPTIONAL_HEADER.AddressOfEntryPoint
+        data = pe.get_data(ep, self.max_depth)
+        section = pe.get_section_by_rva(ep)
+        if section and len(data) < self.max_depth:
+            virtual_end = section.VirtualAddress + max(
+                section.Misc_VirtualSize, section.SizeOfRawData
+            )
+            pad_size = min(self.max_depth, virtual_end - ep) - len(data)
+            if pad_size > 0:
+                data += b"\x00" * pad_size
+        return data
+
+    def match(self, pe, ep_only=True):
+        """
+        ep_only为True时返回入口点匹配到的特征名列表，和peutils.SignatureDatabase.match相同
+        ep_only为False时在每个节区中查找非入口点特征，返回[(文件偏移, 特征名), ...]
+        """
+        if ep_only:
+            try:
+                ep_data = self.get_ep_data(pe)
+            except Exception as e:
+                log.warning(f"failed to get entry point data: {e}")
+                return None
+            return self.match_index(self.ep_only_index, ep_data)
+
+        matches = []
+        for section in pe.sections:
+            matches.extend(
+                self.match_anywhere(section.get_data(), section.PointerToRawData)
+            )
+        return matches
+
+    def match_anywhere(self, data, base_offset=0):
+        """
+        在data的每个位置匹配非入口点特征
+        """
+        matches = []
+        if self.wildcard_key in self.anywhere_index:
+            offset_iter = range(len(data))
+        elif not self.anywhere_first_byte_re:
+            return matches
+        else:
+            # 只检查第一个字节可能匹配的位置
+            offset_iter = (
+                match.start() for match in self.anywhere_first_byte_re.finditer(data)
+            )
+        for offset in offset_iter:
+            matched_names = self.match_index(
+                self.anywhere_index, data[offset : offset + self.max_depth]
+            )
+            if matched_names:
+                matches.append((base_offset + offset, matched_names[-1]))
+        return matches
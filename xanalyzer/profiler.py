@@ -0,0 +1,177 @@
+import json
+import math
+import sys
+import time
+from contextlib import contextmanager
+
+from xanalyzer.utils import log
+
+try:
+    import resource
+except ImportError:
+    # Windows没有resource模块，不统计内存峰值
+    resource = None
+
+
+def get_peak_rss():
+    """
+    当前进程的内存峰值(字节)，无法获取时返回None
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位是KB，macOS上是字节
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return peak_rss
+
+
+def get_percentile(value_list, percent):
+    """
+    最近秩法计算百分位数
+    """
+    sorted_list = sorted(value_list)
+    index = max(math.ceil(percent / 100 * len(sorted_list)) - 1, 0)
+    return sorted_list[index]
+
+
+def format_bytes_num(bytes_num):
+    if bytes_num is None:
+        return "-"
+    return f"{bytes_num / 1024 / 1024:.2f}MB"
+
+
+class StageProfiler:
+    """
+    记录一个样本各阶段的耗时和处理的字节数
+    cpu时间是当前线程的cpu时间，不包括后台验证签名的线程
+    阶段可以嵌套(如pe和pe.cert)，各阶段的时间都包含其中的子阶段
+    """
+
+    def __init__(self):
+        # stage_name -> {"wall": 秒, "cpu": 秒, "bytes": 字节数}，按开始顺序排列
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, stage_name, bytes_num=0):
+        stage_info = self.stages.setdefault(
+            stage_name, {"wall": 0.0, "cpu": 0.0, "bytes": 0}
+        )
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            stage_info["wall"] += time.perf_counter() - wall_start
+            stage_info["cpu"] += time.thread_time() - cpu_start
+            stage_info["bytes"] += bytes_num
+
+    def get_result(self):
+        return {
+            "stages": {
+                stage_name: {
+                    "wall": round(stage_info["wall"], 6),
+                    "cpu": round(stage_info["cpu"], 6),
+                    "bytes": stage_info["bytes"],
+                }
+                for stage_name, stage_info in self.stages.items()
+            },
+            "process_peak_rss": get_peak_rss(),
+        }
+
+    def log_summary(self):
+        log.info("profile:")
+        log.info(f"    {'stage':<32}{'wall(ms)':>12}{'cpu(ms)':>12}{'bytes':>16}")
+        for stage_name, stage_info in self.stages.items():
+            log.info(
+                f"    {stage_name:<32}{stage_info['wall'] * 1000:>12.2f}"
+                f"{stage_info['cpu'] * 1000:>12.2f}{stage_info['bytes']:>16}"
+            )
+        # ru_maxrss是整个进程的峰值，不能归到某个阶段
+        log.info(f"    process peak rss: {format_bytes_num(get_peak_rss())}")
+
+
+class ProfileAggregator:
+    """
+    汇总一批样本的profile，计算各阶段耗时的p50/p95
+    多进程分析时每个进程的内存峰值不同，汇总结果取最大值
+    """
+
+    def __init__(self):
+        self.sample_num = 0
+        self.process_peak_rss = None
+        # stage_name -> {"wall": [...], "cpu": [...], "bytes": 总字节数}
+        self.stage_values = {}
+
+    def add(self, profile):
+        """
+        :param profile: StageProfiler.get_result()的结果
+        """
+        self.sample_num += 1
+        if profile["process_peak_rss"] is not None:
+            self.process_peak_rss = max(
+                self.process_peak_rss or 0, profile["process_peak_rss"]
+            )
+        for stage_name, stage_info in profile["stages"].items():
+            stage_values = self.stage_values.setdefault(
+                stage_name, {"wall": [], "cpu": [], "bytes": 0}
+            )
+            stage_values["wall"].append(stage_info["wall"])
+            stage_values["cpu"].append(stage_info["cpu"])
+            stage_values["bytes"] += stage_info["bytes"]
+
+    def get_result(self):
+        stages = {}
+        for stage_name, stage_values in self.stage_values.items():
+            wall_total = sum(stage_values["wall"])
+            stage_result = {"count": len(stage_values["wall"])}
+            for time_type in ["wall", "cpu"]:
+                stage_result[f"{time_type}_total"] = round(
+                    sum(stage_values[time_type]), 6
+                )
+                for percent in [50, 95]:
+                    stage_result[f"{time_type}_p{percent}"] = get_percentile(
+                        stage_values[time_type], percent
+                    )
+            stage_result["bytes"] = stage_values["bytes"]
+            # 吞吐量，字节/秒
+            stage_result["throughput"] = (
+                round(stage_values["bytes"] / wall_total)
+                if stage_values["bytes"] and wall_total
+                else None
+            )
+            stages[stage_name] = stage_result
+        return {
+            "sample_num": self.sample_num,
+            "process_peak_rss": self.process_peak_rss,
+            "stages": stages,
+        }
+
+    def log_summary(self):
+        result = self.get_result()
+        log.info(f"profile summary of {result['sample_num']} samples:")
+        log.info(
+            f"    {'stage':<32}{'count':>8}{'wall p50':>12}{'wall p95':>12}"
+            f"{'cpu p50':>12}{'cpu p95':>12}{'wall total':>12}{'MB/s':>10}"
+        )
+        for stage_name, stage_result in result["stages"].items():
+            throughput = stage_result["throughput"]
+            throughput_str = (
+                f"{throughput / 1024 / 1024:.1f}" if throughput is not None else "-"
+            )
+            log.info(
+                f"    {stage_name:<32}{stage_result['count']:>8}"
+                f"{stage_result['wall_p50'] * 1000:>10.2f}ms"
+                f"{stage_result['wall_p95'] * 1000:>10.2f}ms"
+                f"{stage_result['cpu_p50'] * 1000:>10.2f}ms"
+                f"{stage_result['cpu_p95'] * 1000:>10.2f}ms"
+                f"{stage_result['wall_total']:>11.2f}s"
+                f"{throughput_str:>10}"
+            )
+        log.info(
+            f"    process peak rss: {format_bytes_num(result['process_peak_rss'])}"
+        )
+
+    def save(self, output_path):
+        with open(output_path, "w", encoding="utf8") as f:
+            json.dump(self.get_result(), f, ensure_ascii=False, indent=2)
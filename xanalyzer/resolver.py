@@ -0,0 +1,79 @@
+import contextvars
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from xanalyzer.config import Config
+
+
+def gethostbyname(domain):
+    """
+    使用系统的解析器解析域名
+    :return: ip列表，解析失败返回None
+    """
+    try:
+        _, _, ip_list = socket.gethostbyname_ex(domain)
+    except (OSError, UnicodeError):
+        return None
+    return ip_list
+
+
+class DnsResolver:
+    """
+    域名解析，在线程池中并发执行，结果在内存中缓存ttl秒(解析失败的结果也缓存)
+    同一域名正在解析时再次请求，直接复用同一个Future
+    """
+
+    def __init__(self, resolve_func=None, ttl=None, concurrency=None):
+        # resolve_func(domain)返回ip列表或None，测试时可以替换
+        self.resolve_func = resolve_func or gethostbyname
+        self.ttl = Config.dns_ttl if ttl is None else ttl
+        self.concurrency = concurrency or Config.dns_concurrency
+        self.executor = None
+        self.lock = threading.Lock()
+        # domain -> (过期时间, Future)
+        self.cache = {}
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def submit(self, domain):
+        """
+        开始解析域名，不等待结果
+        :return: Future，结果为ip列表或None
+        """
+        domain = domain.lower()
+        with self.lock:
+            cur_time = time.monotonic()
+            cache_item = self.cache.get(domain)
+            if cache_item and cache_item[0] > cur_time:
+                return cache_item[1]
+            if not self.executor:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="xanalyzer_dns"
+                )
+            # 在提交时的上下文中执行，resolve_func的日志归属提交它的url
+            future = self.executor.submit(
+                contextvars.copy_context().run, self.resolve_func, domain
+            )
+            self.cache[domain] = (cur_time + self.ttl, future)
+            # 顺便清理过期的结果，避免缓存无限增长
+            if len(self.cache) > Config.dns_cache_size:
+                for cached_domain, (expire_time, _) in list(self.cache.items()):
+                    if expire_time <= cur_time:
+                        del self.cache[cached_domain]
+            return future
+
+    def resolve(self, domain):
+        return self.submit(domain).result()
+
+    def resolve_many(self, domain_list):
+        """
+        并发解析多个域名
+        :return: {domain: ip列表或None}，顺序和domain_list相同
+        """
+        future_dict = {domain: self.submit(domain) for domain in domain_list}
+        return {domain: future.result() for domain, future in future_dict.items()}
@@ -0,0 +1,154 @@
+COST_LOW = "low"
+COST_MEDIUM = "medium"
+COST_HIGH = "high"
+# 从低到高
+cost_levels = [COST_LOW, COST_MEDIUM, COST_HIGH]
+
+
+class Stage:
+    """
+    一个分析阶段
+    """
+
+    def __init__(
+        self,
+        name,
+        func,
+        file_types=None,
+        depends=(),
+        cost=COST_LOW,
+        read_content=False,
+        sub_registry=None,
+    ):
+        """
+        :param func: 执行该阶段的函数，参数是所属的分析器实例(FileAnalyzer、PeAnalyzer等)
+        :param file_types: 适用的文件类型，libmagic描述的前缀，None表示所有类型
+        :param depends: 使用其结果的阶段的完整名称(如pe.packer)，--only时一起执行
+        :param cost: 耗时级别，low/medium/high
+        :param read_content: 是否读取整个样本，--profile统计处理的字节数
+        :param sub_registry: 该阶段又分为多个子阶段时(如pe)，子阶段的StageRegistry
+        """
+        if cost not in cost_levels:
+            raise ValueError(f"unknown cost {cost} of stage {name}")
+        self.name = name
+        self.func = func
+        self.file_types = tuple(file_types) if file_types else None
+        self.depends = list(depends)
+        self.cost = cost
+        self.read_content = read_content
+        self.sub_registry = sub_registry
+
+    def match_file_type(self, file_type):
+        return self.file_types is None or file_type.startswith(self.file_types)
+
+
+class StageRegistry:
+    """
+    按顺序登记的分析阶段，可以通过--only/--skip/--max-cost选择要执行的阶段
+    子阶段的完整名称是"父阶段.子阶段"，选择时也可以只写子阶段的名称(如cert表示pe.cert)
+    """
+
+    def __init__(self, stage_list=None):
+        # name -> Stage，按执行顺序排列
+        self.stages = {}
+        for stage in stage_list or []:
+            self.register(stage)
+
+    def register(self, stage):
+        """
+        登记一个阶段，排在已登记的阶段之后执行
+        """
+        if stage.name in self.stages:
+            raise ValueError(f"stage {stage.name} is already registered")
+        self.stages[stage.name] = stage
+
+    def iter_all(self, prefix=""):
+        """
+        :return: 迭代器，元素为(完整名称, stage)，父阶段在子阶段之前
+        """
+        for stage in self.stages.values():
+            full_name = prefix + stage.name
+            yield full_name, stage
+            if stage.sub_registry:
+                yield from stage.sub_registry.iter_all(f"{full_name}.")
+
+    def match_names(self, name_list):
+        """
+        :param name_list: 完整名称或子阶段的名称
+        :return: 对应的完整名称集合，名称不存在时抛出ValueError
+        """
+        full_name_list = [full_name for full_name, _ in self.iter_all()]
+        matched_names = set()
+        for name in name_list:
+            names = [
+                full_name
+                for full_name in full_name_list
+                if full_name == name or full_name.endswith(f".{name}")
+            ]
+            if not names:
+                raise ValueError(f"unknown stage: {name}")
+            matched_names.update(names)
+        return matched_names
+
+    def select(self, only=None, skip=None, max_cost=None):
+        """
+        选择要执行的阶段
+        选中父阶段时包括所有子阶段，选中子阶段时父阶段也执行，依赖的阶段总是执行(不受max_cost限制)
+        skip优先，跳过的阶段及其子阶段都不执行
+        :return: 要执行的阶段的完整名称集合
+        """
+        all_stages = dict(self.iter_all())
+
+        def with_sub_stages(names):
+            return {
+                full_name
+                for full_name in all_stages
+                if any(
+                    full_name == name or full_name.startswith(f"{name}.")
+                    for name in names
+                )
+            }
+
+        skipped_names = with_sub_stages(self.match_names(skip or []))
+        if only:
+            candidate_names = with_sub_stages(self.match_names(only))
+        else:
+            candidate_names = set(all_stages)
+        if max_cost:
+            max_level = cost_levels.index(max_cost)
+            candidate_names = {
+                full_name
+                for full_name in candidate_names
+                if cost_levels.index(all_stages[full_name].cost) <= max_level
+            }
+
+        selected_names = set()
+        pending_names = list(candidate_names)
+        while pending_names:
+            full_name = pending_names.pop()
+            if full_name in selected_names or full_name in skipped_names:
+                continue
+            selected_names.add(full_name)
+            if "." in full_name:
+                pending_names.append(full_name.rsplit(".", 1)[0])
+            for depend_name in all_stages[full_name].depends:
+                if depend_name not in all_stages:
+                    raise ValueError(
+                        f"unknown stage {depend_name} in depends of {full_name}"
+                    )
+                pending_names.append(depend_name)
+        return selected_names
+
+    def iter_selected(self, selected_names, file_type=None, prefix=""):
+        """
+        :param selected_names: select()的结果，None表示全部执行
+        :param file_type: 只返回适用于该类型的阶段，None时不检查
+        :return: 迭代器，元素为(完整名称, stage)，按登记顺序
+        """
+        for stage in self.stages.values():
+            full_name = prefix + stage.name
+            if selected_names is not None and full_name not in selected_names:
+                continue
+            if file_type is not None and not stage.match_file_type(file_type):
+                continue
+            yield full_name, stage
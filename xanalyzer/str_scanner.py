@@ -0,0 +1,85 @@
+import re
+
+
+class StrScanner:
+    """
+    单次扫描提取所有字符串
+    先用一个正则同时找出ASCII和宽字符可打印串，再只在这些串内部查找base64和hex字符串，
+    结果和分别对整个文件做re.findall相同，同时给出每个字符串在文件中的偏移
+    所有字符串按偏移输出，base64和hex字符串不再分开，而是按出现的位置交错排列
+    """
+
+    # base64字符串最短7个字符(6个字符加"=")，hex字符串最短8个字符
+    special_str_minlen = 7
+
+    base64_str_re = re.compile(rb"[A-Za-z0-9+/]{6,}={1,2}")
+    hex_str_re = re.compile(rb"(?:[A-Fa-f0-9]{2}){4,}")
+    wide_base64_str_re = re.compile(rb"(?:[A-Za-z0-9+/]\x00){6,}(?:=\x00){1,2}")
+    wide_hex_str_re = re.compile(rb"(?:(?:[A-Fa-f0-9]\x00){2}){4,}")
+
+    def __init__(self, minstrlen=4):
+        self.minstrlen = minstrlen
+        run_minlen = min(minstrlen, self.special_str_minlen)
+        # 宽字符串可能从ASCII串的最后一个字符开始，如 b"ab\x00c\x00"，
+        # 这种情况ASCII串先不包含最后一个字符(str_w)，留给宽字符串继续匹配
+        self.run_re = re.compile(
+            rb"(?P<str_w>[\x20-\x7e]{%d,})(?=[\x20-\x7e]\x00)"
+            rb"|(?P<str>[\x20-\x7e]{%d,})"
+            rb"|(?P<wide_str>(?:[\x20-\x7e]\x00){%d,})"
+            % (run_minlen - 1, run_minlen, run_minlen)
+        )
+
+    def scan(self, file_content, chunk_size=None):
+        """
+        :return: 迭代器，元素为(str_type, offset, the_str)
+            str_type: "str", "wide_str", "special_str", "special_wide_str"
+        """
+        for buffer_offset, match in file_content.iter_regex(self.run_re, chunk_size):
+            offset = buffer_offset + match.start()
+            str_type = match.lastgroup
+            if str_type == "wide_str":
+                the_str = match.group()
+                if len(the_str) >= self.minstrlen * 2:
+                    yield "wide_str", offset, the_str
+                if len(the_str) >= self.special_str_minlen * 2:
+                    yield from self.scan_special_strs(
+                        the_str,
+                        offset,
+                        "special_wide_str",
+                        self.wide_base64_str_re,
+                        self.wide_hex_str_re,
+                        b"=\x00",
+                    )
+                continue
+
+            if str_type == "str_w":
+                the_str = match.string[match.start() : match.end() + 1]
+            else:
+                the_str = match.group()
+            if len(the_str) >= self.minstrlen:
+                yield "str", offset, the_str
+            if len(the_str) >= self.special_str_minlen:
+                yield from self.scan_special_strs(
+                    the_str,
+                    offset,
+                    "special_str",
+                    self.base64_str_re,
+                    self.hex_str_re,
+                    b"=",
+                )
+
+    @staticmethod
+    def scan_special_strs(the_str, offset, str_type, base64_re, hex_re, padding):
+        special_str_list = []
+        # 没有"="就不可能有base64字符串，省去一次匹配
+        if padding in the_str:
+            for match in base64_re.finditer(the_str):
+                # 过滤hex字符串
+                if hex_re.match(match.group()):
+                    continue
+                special_str_list.append((match.start(), match.group()))
+        for match in hex_re.finditer(the_str):
+            special_str_list.append((match.start(), match.group()))
+        special_str_list.sort(key=lambda item: item[0])
+        for start, special_str in special_str_list:
+            yield str_type, offset + start, special_str
@@ -0,0 +1,106 @@
+from xanalyzer.config import Config
+from xanalyzer.container import ContainerExtractor
+from xanalyzer.file_process.elf import ElfAnalyzer
+from xanalyzer.file_process.pe import PeAnalyzer
+from xanalyzer.utils import log
+
+
+class Triage:
+    """
+    --triage时的快速检查: 只用文件头识别类型，检查PE/ELF头部记录的大小和文件大小是否一致
+    命中升级规则(Config.conf["triage_escalate_rules"])时才完整分析
+    """
+
+    def __init__(self, file_analyzer):
+        self.file_analyzer = file_analyzer
+        # 只把开头triage_header_size字节交给libmagic
+        self.file_type, self.possible_extension_names = (
+            file_analyzer.guess_type_and_ext(
+                file_analyzer.file_content.data, Config.triage_header_size
+            )
+        )
+        self._real_size = None
+        self.real_size_checked = False
+        self.real_size_error = None
+        self.result = {}
+
+    @property
+    def real_size(self):
+        """
+        PE/ELF头部记录的大小，其他类型或解析失败时为None
+        """
+        if not self.real_size_checked:
+            self.real_size_checked = True
+            try:
+                if self.file_type.startswith(("PE", "MS-DOS executable")):
+                    self._real_size = PeAnalyzer(self.file_analyzer).get_pe_size()
+                elif self.file_type.startswith("ELF"):
+                    self._real_size = ElfAnalyzer(self.file_analyzer).get_elf_size()
+            except Exception as e:
+                self.real_size_error = str(e)
+        return self._real_size
+
+    def rule_size_anomaly(self):
+        """
+        有附加数据、文件被截断或头部无法解析
+        """
+        real_size = self.real_size
+        if self.real_size_error:
+            return True
+        return bool(real_size) and real_size != self.file_analyzer.file_size
+
+    def rule_unknown_type(self):
+        return self.file_type == "data"
+
+    def rule_executable(self):
+        return self.file_type.startswith(("PE", "MS-DOS executable", "ELF"))
+
+    def rule_script(self):
+        return "script" in self.file_type
+
+    def rule_archive(self):
+        return bool(
+            ContainerExtractor.get_container_type(
+                self.file_analyzer.file_content.data[:512]
+            )
+        )
+
+    def rule_user_yara(self):
+        """
+        用户指定的yara规则有匹配，需要读取整个文件
+        """
+        return bool(self.file_analyzer.user_yara_match())
+
+    # 规则名 -> 判断函数，参数是Triage实例
+    escalate_rules = {
+        "size_anomaly": rule_size_anomaly,
+        "unknown_type": rule_unknown_type,
+        "executable": rule_executable,
+        "script": rule_script,
+        "archive": rule_archive,
+        "user_yara": rule_user_yara,
+    }
+
+    def run(self):
+        """
+        :return: 命中的升级规则列表，为空时不需要完整分析
+        """
+        fired_rule_list = [
+            rule_name
+            for rule_name in Config.conf["triage_escalate_rules"]
+            if self.escalate_rules[rule_name](self)
+        ]
+        self.result = {
+            "escalated": bool(fired_rule_list),
+            "rules": fired_rule_list,
+        }
+        if self._real_size is not None:
+            self.result["real_size"] = self._real_size
+        if self.real_size_error:
+            self.result["real_size_error"] = self.real_size_error
+            log.warning(f"failed to get real size: {self.real_size_error}")
+        if fired_rule_list:
+            log.info(f"triage escalated by: {fired_rule_list}")
+        else:
+            log.info("triage: not escalated")
+        return fired_rule_list
@@ -1,11 +1,11 @@
 import os
 import re
-import socket
 from urllib.parse import urljoin, urlparse
 
-import requests
 
 from xanalyzer.config import Config
+from xanalyzer.crawler import Crawler, LinkExtractor, normalize_url
+from xanalyzer.resolver import DnsResolver
 from xanalyzer.utils import log
 
 
@@ -15,17 +15,33 @@ class UrlAnalyzer:
     main_url = None
     hostname = None
     hostname_type = None
-    resolved_ip_list = []
-    links = []
     basic_domain = None
-    subdomain_list = []
+    # 所有UrlAnalyzer共用，复用连接和域名解析结果
+    crawler = None
+    resolver = None
+    crawl_headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; WOW64; rv:54.0) Gecko/20100101 Firefox/54.0",
+        "Referer": "http://www.google.com",
+    }
 
     def __init__(self, url, deep_flag):
         self.url = url
         self.deep_flag = deep_flag
+        # 每个实例单独保存，多个UrlAnalyzer可以在同一进程中使用
+        self.resolved_ip_list = []
+        self.links = []
+        self.subdomain_list = []
+        # 和列表内容相同，用于O(1)判断是否重复
+        self.link_set = set()
+        self.subdomain_set = set()
+        # 结构化的分析结果，run()返回
+        self.result = {"url": url}
         self.parsed_url = urlparse(url)
         self.hostname = self.parsed_url.hostname
         self.main_url = f"{self.parsed_url.scheme}://{self.hostname}"
+        if self.parsed_url.port:
+            # 保留非默认端口
+            self.main_url += f":{self.parsed_url.port}"
         hostname_type_match = re.match(
             r"^(?:(?P<domain>(?:[-a-zA-Z0-9]+\.)+[a-zA-Z]+)|(?P<ipv4>(?:\d{1,3}\.){3}\d{1,3}))$",
             self.hostname,
@@ -35,30 +51,42 @@ class UrlAnalyzer:
         else:
             self.hostname_type = "other"
         if self.hostname_type == "domain":
-            self.resolved_ip_list = self.get_ip_list_by_domain(self.hostname)
             self.basic_domain = re.search(
                 r"[-a-zA-Z0-9]+\.[a-zA-Z]+$", self.hostname
             ).group()
 
-    @staticmethod
-    def get_ip_list_by_domain(domain):
-        try:
-            _, _, ip_list = socket.gethostbyname_ex(domain)
-        except:
-            ip_list = None
-        return ip_list
+        self.init_crawler()
+        self.init_resolver()
+
+    @classmethod
+    def init_crawler(cls, pool_size=None):
+        """
+        :param pool_size: 连接池大小，同时分析多个url时需要调大
+        """
+        if cls.crawler:
+            return
+        cls.crawler = Crawler(headers=cls.crawl_headers, pool_size=pool_size)
+
+    @classmethod
+    def init_resolver(cls):
+        if cls.resolver:
+            return
+        cls.resolver = DnsResolver()
+
+    def get_ip_list_by_domain(self, domain):
+        return self.resolver.resolve(domain)
 
     def get_basic_info(self):
         """
         获取状态码和robots.txt信息
         """
         basic_info = {}
-        res = requests.get(self.url)
+        res = self.crawler.get(self.url)
         status_code = res.status_code
         basic_info["status_code"] = status_code
         if status_code:
             robots_url = f"{self.main_url}/robots.txt"
-            robots_res = requests.get(robots_url)
+            robots_res = self.crawler.get(robots_url)
             if robots_res.status_code == 200:
                 basic_info["robots_info"] = robots_res.content
         return basic_info
@@ -67,13 +95,23 @@ class UrlAnalyzer:
         """
         基本扫描，包括解析ip、url请求返回状态码、可能的robots.txt内容
         """
+        self.result["hostname_type"] = self.hostname_type
         if self.hostname_type == "domain":
+            # 解析域名和请求url同时进行
+            resolve_future = self.resolver.submit(self.hostname)
+        basic_info = self.get_basic_info()
+        if self.hostname_type == "domain":
+            self.resolved_ip_list = resolve_future.result()
+            self.result["resolved_ip_list"] = self.resolved_ip_list
             if self.resolved_ip_list:
                 log.info(f"resolved_ip_list: {self.resolved_ip_list}")
             else:
                 log.warning("unable to resolve to ip")
-        basic_info = self.get_basic_info()
         url_status_code = basic_info.get("status_code", 0)
+        self.result["status_code"] = url_status_code
+        self.result["robots_info"] = basic_info.get("robots_info", b"").decode(
+            "utf8", errors="replace"
+        )
         if url_status_code:
             log.info(f"url status code: {url_status_code}")
             robots_info = basic_info.get("robots_info", "")
@@ -95,6 +133,16 @@ class UrlAnalyzer:
                         f.write(robots_info)
                     log.info("robots.txt saved")
 
+    def add_link(self, link):
+        """
+        :return: 是否是新链接
+        """
+        if link in self.link_set:
+            return False
+        self.link_set.add(link)
+        self.links.append(link)
+        return True
+
     def link_and_subdomain_scan(self):
         """
         扫描url下所有链接和子域名
@@ -135,69 +183,75 @@ class UrlAnalyzer:
         ) and "/" in path_limit:
             path_limit = path_limit.rsplit("/", maxsplit=1)[0] + "/"
 
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; WOW64; rv:54.0) Gecko/20100101 Firefox/54.0",
-            "Referer": "http://www.google.com",
-        }
+        self.add_link(normalize_url(self.main_url))
 
-        self.links.append(self.main_url)
-        links_to_req = [self.main_url]
+        def parse_response(res):
+            """
+            在crawler的工作线程中执行，只处理文本形式的响应，边下载边提取
+            """
+            if "text/" not in res.headers.get("Content-Type", ""):
+                return None
+            return LinkExtractor.extract(self.crawler.iter_body(res))
 
-        for link in links_to_req:
+        def handle_response(link, res, parsed):
+            """
+            记录页面中的链接和子域名，返回需要继续请求的链接
+            """
             log.info(f"request: {link}")
-            try:
-                res = requests.get(link, headers=headers)
-            except Exception as e:
-                log.error(f"{e.__class__} {link}")
-                continue
+            if isinstance(res, Exception):
+                log.error(f"{res.__class__} {link}")
+                return []
+            if parsed is None:
+                return []
 
-            # 只处理文本形式的响应
-            if "text/" not in res.headers.get("Content-Type", ""):
-                continue
-
-            half_links = re.findall(rb'(?:href|src|action)\s?=\s?"(.*?)"', res.content)
-            half_links.extend(
-                re.findall(rb"(?:href|src|action)\s?=\s?\'(.*?)\'", res.content)
-            )
+            half_links, possible_subdomain_list = parsed
             if self.hostname_type == "domain":
-                possible_subdomain_list = re.findall(
-                    rb"https?://((?:[-a-zA-Z0-9]+\.){2,}[a-zA-Z]+)", res.content
-                )
                 for possible_subdomain in possible_subdomain_list:
                     possible_subdomain = possible_subdomain.decode()
                     if (
                         possible_subdomain.endswith(self.basic_domain)
-                        and possible_subdomain not in self.subdomain_list
+                        and possible_subdomain not in self.subdomain_set
                     ):
+                        self.subdomain_set.add(possible_subdomain)
                         self.subdomain_list.append(possible_subdomain)
 
+            new_links_to_req = []
             for half_link in half_links:
                 half_link = half_link.decode()
-                joined_link = urljoin(res.url, half_link)
-                joined_link_rstrip = joined_link.rstrip("/")
-                if (
-                    not joined_link_rstrip.startswith("javascript:")
-                    and joined_link_rstrip not in self.links
+                joined_link = normalize_url(urljoin(res.url, half_link))
+                if not joined_link.startswith("javascript:") and self.add_link(
+                    joined_link
                 ):
-                    self.links.append(joined_link_rstrip)
                     if Config.conf["save_flag"]:
                         with open(links_file_path, "a") as f:
-                            f.write(f"{joined_link_rstrip}\n")
-                # 链接在本站下、在同一父path下、不是资源链接、不在待请求列表里，则添加到待请求列表
-                parsed_joined_link_rstrip = urlparse(joined_link_rstrip)
+                            f.write(f"{joined_link}\n")
+                # 链接在本站下、在同一父path下、不是资源链接，则添加到待请求列表，由crawler去重
+                parsed_joined_link = urlparse(joined_link)
                 if (
-                    self.hostname == parsed_joined_link_rstrip.hostname
-                    and parsed_joined_link_rstrip.path.startswith(path_limit)
-                    and not joined_link_rstrip.endswith(ignore_tails)
-                    and joined_link_rstrip not in links_to_req
+                    self.hostname == parsed_joined_link.hostname
+                    and parsed_joined_link.path.startswith(path_limit)
+                    and not joined_link.endswith(ignore_tails)
                 ):
-                    links_to_req.append(joined_link_rstrip)
+                    new_links_to_req.append(joined_link)
+            return new_links_to_req
+
+        # 同一层的链接并发请求，按顺序处理，结果和逐个请求相同
+        self.crawler.crawl([self.main_url], handle_response, parse_response)
 
+        self.result["links"] = self.links
+        self.result["subdomain_list"] = self.subdomain_list
         log.info(f"link num: {len(self.links)}")
         if self.hostname_type == "domain" and self.subdomain_list:
             log.info(f"subdomain_list: {self.subdomain_list}")
+            # 并发解析所有子域名
+            subdomain_ip_dict = self.resolver.resolve_many(self.subdomain_list)
+            self.result["subdomain_ip_dict"] = subdomain_ip_dict
+            log.info("subdomain resolved ip:")
+            for subdomain, ip_list in subdomain_ip_dict.items():
+                log.info(f"    {subdomain}: {ip_list}")
 
     def run(self):
         self.basic_scan()
         if self.deep_flag:
             self.link_and_subdomain_scan()
+        return self.result
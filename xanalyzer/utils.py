@@ -21,3 +21,59 @@ def init_log():
         file_formatter = logging.Formatter(basic_fmt)
         file_handler.setFormatter(file_formatter)  # 可以通过setFormatter指定输出格式
         log.addHandler(file_handler)
+
+
+class LogCollector(logging.Handler):
+    """
+    收集日志记录，用于多进程回传和结果缓存
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # 保证LogRecord可以被pickle和序列化
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+
+class LogHolder:
+    """
+    暂存xanalyzer的日志，之后按原顺序输出，用于调整部分扫描的执行顺序而不改变日志顺序
+    """
+
+    def __init__(self):
+        self.log_collector = LogCollector()
+        self.old_handlers = None
+        self.old_propagate = None
+
+    @property
+    def holding(self):
+        return self.old_handlers is not None
+
+    def start(self):
+        self.old_handlers = log.handlers
+        self.old_propagate = log.propagate
+        log.handlers = [self.log_collector]
+        log.propagate = False
+
+    def stop(self):
+        if not self.holding:
+            return
+        log.handlers = self.old_handlers
+        log.propagate = self.old_propagate
+        self.old_handlers = None
+
+    def flush(self):
+        """
+        输出暂存的日志
+        """
+        records = self.log_collector.records
+        self.log_collector.records = []
+        for record in records:
+            log.handle(record)
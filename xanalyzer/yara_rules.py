@@ -0,0 +1,67 @@
+import os
+from hashlib import sha256
+from pathlib import Path
+
+import yara
+
+from xanalyzer.config import Config
+from xanalyzer.utils import log
+
+
+def get_yara_filepaths(rule_dir_list):
+    """
+    获取目录下所有yara规则文件，key为规则文件的相对路径，作为yara的namespace
+    """
+    yara_filepaths = {}
+    for rule_dir in rule_dir_list:
+        rule_dir = Path(rule_dir)
+        for dir_path, _, filenames in os.walk(rule_dir):
+            for filename in filenames:
+                if not filename.endswith((".yar", ".yara")):
+                    continue
+                yara_path = Path(dir_path) / filename
+                namespace = yara_path.relative_to(rule_dir).as_posix()
+                if len(rule_dir_list) > 1:
+                    namespace = f"{rule_dir.name}/{namespace}"
+                yara_filepaths[namespace] = str(yara_path)
+    return dict(sorted(yara_filepaths.items()))
+
+
+def get_yara_source_hash(yara_filepaths):
+    """
+    规则内容和yara版本的hash，任一变化时重新编译
+    """
+    sha256_hash = sha256(yara.__version__.encode())
+    for namespace, yara_path in yara_filepaths.items():
+        sha256_hash.update(namespace.encode() + b"\x00")
+        with open(yara_path, "rb") as f:
+            sha256_hash.update(sha256(f.read()).digest())
+    return sha256_hash.hexdigest()
+
+
+def load_yara_rules(rule_dir_list):
+    """
+    加载yara规则，编译结果按规则hash缓存，下次直接yara.load
+    """
+    yara_filepaths = get_yara_filepaths(rule_dir_list)
+    source_hash = get_yara_source_hash(yara_filepaths)
+    compiled_path = Path(Config.yara_cache_dir) / f"{source_hash}.yarc"
+    # 使用文件对象读写，避免yara处理中文路径出错
+    if compiled_path.exists():
+        try:
+            with open(compiled_path, "rb") as f:
+                return yara.load(file=f)
+        except (OSError, yara.Error) as e:
+            log.warning(f"failed to load compiled yara rules {compiled_path}: {e}")
+
+    yara_rules = yara.compile(filepaths=yara_filepaths)
+    try:
+        os.makedirs(compiled_path.parent, exist_ok=True)
+        # 先写临时文件再替换，多进程同时编译时不会读到不完整的文件
+        tmp_path = compiled_path.with_name(f"{compiled_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            yara_rules.save(file=f)
+        os.replace(tmp_path, compiled_path)
+    except (OSError, yara.Error) as e:
+        log.warning(f"failed to save compiled yara rules {compiled_path}: {e}")
+    return yara_rules